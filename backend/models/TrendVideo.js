@@ -121,14 +121,24 @@ const TrendVideoSchema = new mongoose.Schema({
   },
   transcript: {
     /**
-     * YouTube transcript in SRT format for voice-over and subtitle generation
-     * Automatically fetched for YouTube videos after successful download
+     * Legacy inline SRT. The scraper now stores segments in `trendtranscripts`
+     * and moves existing values there at startup; read the SRT through
+     * GET /api/shorts-reels/videos/:id/transcript on the scraper service.
      */
     srt: {
       type: String,
       default: null,
       select: false,  // Exclude from default queries due to size
     },
+    ref: {
+      type: mongoose.Schema.Types.ObjectId,
+      default: null,
+      description: 'trendtranscripts document holding the compressed segments',
+    },
+    segmentCount: Number,
+    durationSec: Number,
+    chars: Number,
+    preview: String,
     language: {
       type: String,
       enum: ['vi', 'en', 'mixed', 'auto', null],
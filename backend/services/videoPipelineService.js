@@ -87,7 +87,7 @@ async function shouldUseCapCutCaptions({ productionConfig = {}, queueItem = {},
   if (sourceVideoId) {
     const video = await TrendVideo.findById(sourceVideoId).select('+transcript.srt').lean();
     const transcript = video?.transcript || {};
-    transcriptMissing = !transcript.srt && (transcript.fetchedAt || transcript.fetchError);
+    transcriptMissing = !hasStoredTranscript(transcript) && (transcript.fetchedAt || transcript.fetchError);
   }
 
   if (forceCapCut) return true;
@@ -540,6 +540,27 @@ function resolveBackendPath(candidate = '') {
   return backendPath;
 }
 
+// The scraper keeps transcripts in `trendtranscripts`: the video only has a summary with `ref`.
+// Documents written before that change may still carry the SRT inline.
+function hasStoredTranscript(transcript = {}) {
+  return Boolean(transcript.ref || transcript.srt);
+}
+
+async function fetchTranscriptSrt(videoId, transcript = {}) {
+  if (transcript.srt) return transcript.srt;
+  if (!transcript.ref) return null;
+  try {
+    const response = await axios.get(`${PY_SERVICE_BASE}/api/shorts-reels/videos/${videoId}/transcript`, {
+      params: { format: 'srt' },
+      timeout: 30000,
+    });
+    return response?.data?.transcript || null;
+  } catch (error) {
+    if (error.response?.status === 404) return null;
+    throw new Error(`Scraper service transcript request failed: ${error.response?.data?.detail || error.message}`);
+  }
+}
+
 async function triggerPythonRedownload(videoId) {
   if (!videoId) return { success: false, error: 'Missing videoId' };
   try {
@@ -4171,18 +4192,21 @@ class VideoPipelineService {
       }
 
       const transcript = video.transcript || {};
+      const srt = await fetchTranscriptSrt(video._id, transcript);
       return {
         success: true,
         videoId: video._id,
         title: video.title,
         platform: video.platform,
         transcript: {
-          srt: transcript.srt || null,
+          srt,
           language: transcript.language || 'unknown',
           fetchedAt: transcript.fetchedAt || null,
           fetchError: transcript.fetchError || null,
+          segmentCount: transcript.segmentCount ?? null,
+          durationSec: transcript.durationSec ?? null,
         },
-        hasMissedTranscript: !transcript.srt && transcript.fetchedAt,
+        hasMissedTranscript: !srt && transcript.fetchedAt,
       };
     } catch (error) {
       return {
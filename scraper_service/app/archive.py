@@ -0,0 +1,145 @@
+"""
+Archival tiering for finished videos.
+
+`trendvideos` used to keep every done and failed record forever, so the
+`downloadStatus` / `discoveredAt` indexes and the startup scans kept
+growing. The archive job moves videos whose status has an
+ARCHIVE_AFTER_DAYS_BY_STATUS entry, and that were discovered longer ago
+than that many days, into `trendvideos_archive` (same `_id`, plus
+`archivedAt`).
+
+A compact tombstone `(platform, videoId)` in `trendvideotombstones` keeps
+dedup working: `upsert_video()` checks it and returns None for an archived
+video, so rediscovering one neither re-inserts, re-downloads nor counts it.
+`restore_videos()` moves documents back and removes their tombstones.
+
+Per batch, the order is copy to the archive, then delete from the hot
+collection (re-checking the archive filter), then write the tombstones for
+what was actually deleted. A video re-queued in between stays hot and its
+archive copy is dropped. Transcripts (app/transcripts.py) are keyed by the
+video `_id` and stay where they are.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from .config import ARCHIVE_AFTER_DAYS_BY_STATUS, ARCHIVE_BATCH, ARCHIVE_MAX_PER_RUN
+from .db import videos, videos_archive, video_tombstones
+from .video_state import video_state
+
+# Never archive a video the download queue still owns
+ACTIVE_QUEUE_STATES = ['queued', 'downloading']
+
+
+def archive_filter(now: datetime) -> Optional[Dict]:
+    rules = [
+        {'downloadStatus': status, 'discoveredAt': {'$lt': now - timedelta(days=days)}}
+        for status, days in ARCHIVE_AFTER_DAYS_BY_STATUS.items()
+        if days > 0
+    ]
+    if not rules:
+        return None
+    return {'$or': rules, 'queueState': {'$nin': ACTIVE_QUEUE_STATES}}
+
+
+async def is_archived(platform: str, video_id: str) -> Optional[Dict]:
+    """The tombstone of an archived (platform, videoId), if any."""
+    return await video_tombstones.find_one({'platform': platform, 'videoId': video_id})
+
+
+async def _archive_batch(query: Dict, now: datetime) -> int:
+    batch = await videos.find(query).limit(ARCHIVE_BATCH).to_list()
+    if not batch:
+        return 0
+    ids = [doc['_id'] for doc in batch]
+    await videos_archive.bulk_write(
+        [ReplaceOne({'_id': doc['_id']}, {**doc, 'archivedAt': now}, upsert=True) for doc in batch],
+        ordered=False,
+    )
+    await videos.delete_many({'_id': {'$in': ids}, **query})
+
+    still_hot = {doc['_id'] for doc in await videos.find({'_id': {'$in': ids}}, {'_id': 1}).to_list()}
+    if still_hot:
+        await videos_archive.delete_many({'_id': {'$in': list(still_hot)}})
+    archived = [doc for doc in batch if doc['_id'] not in still_hot]
+    if archived:
+        await video_tombstones.bulk_write(
+            [
+                UpdateOne(
+                    {'platform': doc.get('platform'), 'videoId': doc.get('videoId')},
+                    {'$set': {'downloadStatus': doc.get('downloadStatus'), 'archivedAt': now}, '$setOnInsert': {'_id': doc['_id']}},
+                    upsert=True,
+                )
+                for doc in archived
+            ],
+            ordered=False,
+        )
+    return len(archived)
+
+
+async def archive_videos(limit: int = ARCHIVE_MAX_PER_RUN) -> Dict:
+    """Move videos matching the archive rules out of the hot collection, at most `limit` per run."""
+    from .store import log_job
+
+    # Archive from the current states, not ones still buffered
+    await video_state.flush()
+    now = datetime.utcnow()
+    query = archive_filter(now)
+    if query is None:
+        return {'archived': 0, 'disabled': True}
+    started = datetime.utcnow()
+    archived = 0
+    while archived < limit:
+        moved = await _archive_batch(query, now)
+        archived += moved
+        if moved == 0:
+            break
+    if archived:
+        print(f'[archive] moved {archived} videos to {videos_archive.name}')
+    await log_job('archive', 'success', itemsFound=archived, duration=(datetime.utcnow() - started).total_seconds())
+    return {'archived': archived}
+
+
+async def restore_videos(ids: Optional[List] = None, keys: Optional[List[Dict]] = None) -> Dict:
+    """
+    Move archived videos back into the hot collection, by `_id` or by
+    {'platform', 'videoId'} keys. Restored documents keep their status.
+    """
+    clauses = []
+    if ids:
+        clauses.append({'_id': {'$in': list(ids)}})
+    if keys:
+        clauses.extend({'platform': key['platform'], 'videoId': key['videoId']} for key in keys)
+    if not clauses:
+        return {'restored': 0, 'missing': 0}
+    docs = await videos_archive.find({'$or': clauses}).to_list()
+
+    restored_ids = []
+    keys_by_id = {doc['_id']: {'platform': doc.get('platform'), 'videoId': doc.get('videoId')} for doc in docs}
+    if docs:
+        for doc in docs:
+            doc.pop('archivedAt', None)
+        try:
+            result = await videos.insert_many(docs, ordered=False)
+            restored_ids = list(result.inserted_ids)
+        except BulkWriteError as e:
+            # Already back in the hot collection (a restore raced this one): treat as restored
+            failed = {err['index'] for err in e.details.get('writeErrors', []) if err.get('code') != 11000}
+            restored_ids = [doc['_id'] for i, doc in enumerate(docs) if i not in failed]
+    if restored_ids:
+        await videos_archive.delete_many({'_id': {'$in': restored_ids}})
+        await video_tombstones.delete_many({'$or': [keys_by_id[_id] for _id in restored_ids]})
+    requested = len(ids or []) + len(keys or [])
+    return {'restored': len(restored_ids), 'missing': max(requested - len(docs), 0)}
+
+
+async def archive_stats() -> Dict:
+    return {
+        'archived': await video_tombstones.estimated_document_count(),
+        'rules': ARCHIVE_AFTER_DAYS_BY_STATUS,
+        'batch': ARCHIVE_BATCH,
+        'maxPerRun': ARCHIVE_MAX_PER_RUN,
+    }
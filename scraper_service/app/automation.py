@@ -1,18 +1,18 @@
 import asyncio
+import inspect
 import json
 import os
 import random
 import re
 import sys
 import time
+from contextlib import AsyncExitStack
 from datetime import datetime
-from typing import Dict, List
-from urllib.parse import parse_qs, urlparse, urljoin, quote
-from urllib.request import Request, urlopen
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse, urljoin, quote, quote_plus
 
 from bson import ObjectId
 from playwright.async_api import TimeoutError as PlaywrightTimeoutError
-from playwright.async_api import async_playwright
 
 try:
     import nodriver as nd
@@ -31,18 +31,31 @@ from .config import (
     KUAISHOU_MAX_ITEMS,
     KUAISHOU_SCROLL_TIMES,
     KUAISHOU_STORAGE_STATE,
+    DOUYIN_STORAGE_STATE,
     SCRAPER_ENGINE,
     SCRAPER_HEADLESS,
     SCRAPER_LOCALE,
     SCRAPER_TIMEZONE,
-    SCRAPER_PROXY,
-    SCRAPER_PROXIES,
+    PLAYBOARD_HEDGE_ENABLED,
+    PLAYBOARD_HEDGE_DELAY_SEC,
+    PLAYBOARD_HEDGE_MAX_ATTEMPTS,
 )
-from .db import channels, videos
-from .store import get_or_create_settings, upsert_channel, upsert_video, update_video_transcript, update_video_transcript_error, log_job
+from .db import channels, videos, stats as stats_collection
+from .transcripts import transcript_store
+from .store import get_or_create_settings, upsert_channel, upsert_video, transcript_fields, transcript_error_fields, log_job
+from .video_state import video_state, DOWNLOAD_STATUS
 from .transcriptService import fetch_transcript_for_video, TranscriptService
 from .simple_upload import upload_video_after_download
-from .utils import TOPICS, parse_views, extract_youtube_id, extract_reel_id, extract_douyin_id, match_topic
+from .http_client import fetch_text, download_to_file
+from .playboard_sessions import PlayboardSession, playboard_login, playboard_sessions
+from .browser_pool import browser_pool
+from .proxy_manager import proxy_manager, mask_proxy, proxy_url
+from .browser_watchdog import browser_watchdog
+from .captcha_pauses import captcha_pauses
+from .hedging import EngineStats, hedged_stream
+from .extractors import extract_cards, extraction_expression
+from .discovery_runs import DiscoveryRun, schedule_window_start
+from .utils import TOPICS, normalize_text, parse_views, extract_youtube_id, extract_reel_id, extract_douyin_id, match_topic, classify_topics, primary_topic
 
 UA = [
     'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36',
@@ -54,10 +67,14 @@ running_jobs = 0
 worker_tasks = []
 queued_video_ids = set()
 processing_video_ids = set()
-_proxy_index = 0
 FAIL_FAST_TIMEOUTS_MS = [18000, 30000, 50000]
+PLAYBOARD_HOST = 'playboard.co'
+playboard_engine_stats = EngineStats()
 YOUTUBE_VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+# trendstats document holding how far cleanup_invalid_youtube_records has checked
+CLEANUP_WATERMARK_ID = 'cleanup-invalid-youtube'
 YTDLP_TIMEOUT_SEC = 180
+DISCOVERY_PIPELINE_MAX_BATCHES = 4
 DAILYHAHA_HOME = "https://www.dailyhaha.com/videos/"
 DAILYHAHA_CHANNEL_ID = "dailyhaha-videos"
 DOUYIN_SEARCH_BASE = "https://www.douyin.com/jingxuan/search/{keyword}?type=general"
@@ -292,68 +309,22 @@ except Exception:
 
 
 def _proxy_pool() -> List[str]:
-    pool = [x for x in SCRAPER_PROXIES if x]
-    if not pool and SCRAPER_PROXY:
-        pool = [SCRAPER_PROXY]
-    return pool
+    return proxy_manager.pool()
 
 
-def _mask_proxy(proxy: str) -> str:
-    if not proxy:
-        return ''
-    parsed = urlparse(proxy if '://' in proxy else f'http://{proxy}')
-    host = parsed.hostname or 'unknown'
-    port = parsed.port or ''
-    return f'{host}:{port}'
-
-
-def _next_proxy() -> str | None:
-    global _proxy_index
-    pool = _proxy_pool()
-    if not pool:
-        return None
-    proxy = pool[_proxy_index % len(pool)]
-    _proxy_index += 1
-    print(f"[DEBUG] Proxy selected: {_mask_proxy(proxy)}")
-    return proxy
-
-
-async def _is_proxy_healthy(proxy: str | None, timeout_sec: float = 2.5) -> bool:
-    if not proxy:
-        return True
-    parsed = urlparse(proxy if '://' in proxy else f'http://{proxy}')
-    host = parsed.hostname
-    port = parsed.port
-    if not host or not port:
-        return False
+async def _goto(page, url: str, proxy: str | None, **kwargs):
+    """page.goto that reports the outcome and latency for `proxy` on the target host to proxy_manager."""
+    host = urlparse(url).hostname
+    started = time.time()
     try:
-        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout=timeout_sec)
-        writer.close()
-        await writer.wait_closed()
-        return True
-    except Exception:
-        return False
-
-
-async def _next_healthy_proxy() -> str | None:
-    pool = _proxy_pool()
-    if not pool:
-        return None
-
-    checked = set()
-    while len(checked) < len(pool):
-        proxy = _next_proxy()
-        if not proxy:
-            return None
-        if proxy in checked:
-            continue
-        checked.add(proxy)
-        ok = await _is_proxy_healthy(proxy)
-        if ok:
-            print(f"[DEBUG] Proxy health-check OK: {_mask_proxy(proxy)}")
-            return proxy
-        print(f"[DEBUG] Proxy health-check FAIL: {_mask_proxy(proxy)}")
-    return None
+        response = await page.goto(url, **kwargs)
+    except Exception as e:
+        proxy_manager.record(proxy, host, False, error=str(e) or type(e).__name__)
+        raise
+    status = response.status if response else 0
+    # 403 / 429 from the target usually means the exit IP is blocked or rate limited
+    proxy_manager.record(proxy, host, not status or status < 400, (time.time() - started) * 1000, error=f'HTTP {status}')
+    return response
 
 
 def _extract_playboard_link_info(href: str | None) -> Dict[str, str]:
@@ -451,98 +422,172 @@ def build_playboard_url(config: Dict) -> str:
 
 
 async def human_scroll(page, times: int = 8):
-    for _ in range(times):
+    async for _ in human_scroll_steps(page, times):
+        pass
+
+
+async def human_scroll_steps(page, times: int = 8):
+    """Same wheel/sleep rhythm as human_scroll, yielding after each step so callers can extract incrementally."""
+    for step in range(times):
         await page.mouse.wheel(0, random.randint(700, 1400))
         await asyncio.sleep(random.uniform(2.0, 4.0))
+        yield step
+
+
+async def _drain(stream) -> List[Dict]:
+    out: List[Dict] = []
+    async for batch in stream:
+        out.extend(batch)
+    return out
 
 
-async def _playboard_login(page) -> bool:
+async def _run_discovery_pipeline(label: str, stream, handle_batch) -> int:
     """
-    Detect and login to Playboard if needed
-    Returns True if login was successful or not needed, False if login failed
+    Streaming discovery: the collector (producer) keeps scrolling while each
+    extracted batch is upserted + enqueued by `handle_batch` (consumer), so the
+    first downloads start long before the page is fully scrolled.
+    Returns the sum of `handle_batch` results.
     """
+    started = time.time()
+    batches: asyncio.Queue = asyncio.Queue(maxsize=DISCOVERY_PIPELINE_MAX_BATCHES)
+    done = object()
+
+    async def produce():
+        try:
+            async for batch in stream:
+                if batch:
+                    await batches.put(batch)
+        finally:
+            await batches.put(done)
+
+    producer = asyncio.create_task(produce())
+    total = 0
+    first_batch_at = None
     try:
-        print('[DEBUG] Checking if Playboard login is needed...')
-        
-        # Check for "Too many requests" error
-        too_many_requests = await page.locator('text=Too many requests').count()
-        if too_many_requests > 0:
-            print('[DEBUG] Detected "Too many requests" error, need to sign in')
-        
-        # Check for Sign in link/button (on error page it's an <a> tag)
-        sign_in_link = await page.locator('a[href*="/account/signin"], a:has-text("Sign in"), button:has-text("Sign in")').count()
-        
-        if too_many_requests == 0 and sign_in_link == 0:
-            print('[DEBUG] No login needed, page loaded successfully')
-            return True
-        
-        if not PLAYBOARD_USER_EMAIL or not PLAYBOARD_USER_PASSWORD:
-            print('[ERROR] Playboard credentials not configured in .env (PLAYBOARD_USER_EMAIL, PLAYBOARD_USER_PASSWORD)')
-            return False
-        
-        print(f'[DEBUG] Playboard login required, attempting login as {PLAYBOARD_USER_EMAIL}...')
-        
-        # Click sign in link/button (prioritize the <a> link from error page)
-        sign_in_element = page.locator('a[href*="/account/signin"]').first
-        if await sign_in_element.count() == 0:
-            sign_in_element = page.locator('a:has-text("Sign in"), button:has-text("Sign in")').first
-        
-        await sign_in_element.click(timeout=5000)
-        print('[DEBUG] Clicked Sign in button/link')
-        await asyncio.sleep(3)
-        
-        # Wait for login form to appear
-        await page.wait_for_selector('input[name="email"], input[name="password"]', timeout=10000)
+        while True:
+            batch = await batches.get()
+            if batch is done:
+                break
+            if first_batch_at is None:
+                first_batch_at = time.time() - started
+                print(f'[pipeline {label}] first batch ({len(batch)} cards) after {first_batch_at:.1f}s')
+            total += int(await handle_batch(batch) or 0)
+    finally:
+        if not producer.done():
+            producer.cancel()
+            try:
+                await producer
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    # Surface collector errors the same way the list-returning collectors did
+    producer.result()
+    print(f'[pipeline {label}] done in {time.time() - started:.1f}s -> {total}')
+    return total
+
+
+async def _playboard_login(page, session: PlayboardSession | None = None) -> bool:
+    if session is None:
+        return await playboard_login(page)
+    ok = await playboard_login(page, session.email, session.account['password'], session.account['cookiesFile'])
+    if not ok:
+        session.invalidate()
+    return ok
+
+
+def _playboard_rows_from_cards(raw_cards: List[Dict]) -> List[Dict]:
+    rows = []
+    for item in raw_cards or []:
+        if not isinstance(item, dict):
+            continue
+        link_info = _extract_playboard_link_info(item.get('url') or '')
+        video_id = link_info.get('video_id') or str(item.get('key') or '')
+        if not video_id:
+            continue
+        views = item.get('views') if isinstance(item.get('views'), (int, float)) else 0
+        views = max(int(views), parse_views(str(item.get('views_text') or '').strip()))
+        title = str(item.get('title') or '').strip()
+        rows.append({
+            'title': (title or f'Playboard video {video_id}')[:180],
+            'views': views,
+            'url': link_info.get('youtube_url') or f'https://www.youtube.com/watch?v={video_id}',
+            'youtube_url': link_info.get('youtube_url') or f'https://www.youtube.com/watch?v={video_id}',
+            'video_id': video_id,
+            'channel_name': str(item.get('channel_name') or '').strip()[:40],
+            'channel_id': link_info.get('channel_id') or str(item.get('channel_id') or ''),
+        })
+    return rows
+
+
+async def _stream_playboard_page(page, url: str, timeout_ms: int, session: PlayboardSession | None = None, proxy: str | None = None):
+    await _goto(page, url, proxy, wait_until='domcontentloaded', timeout=timeout_ms)
+    await asyncio.sleep(5)
+
+    # 💫 Check if login is needed and perform login if necessary
+    login_ok = await _playboard_login(page, session)
+    if not login_ok:
+        print('[DEBUG] Login check returned false, returning empty results')
+        return
+
+    # ⏳ Wait for content and scroll first
+    print('[DEBUG] Waiting for content to settle...')
+    await asyncio.sleep(2)
+
+    # Aggressive scrolling to trigger lazy loading
+    print('[DEBUG] Scrolling page to load all content...')
+    for i in range(3):
+        height = await page.evaluate('document.body.scrollHeight')
+        await page.evaluate(f'window.scrollTo(0, {height})')
         await asyncio.sleep(1)
-        
-        # Fill email field - use input[name="email"]
-        email_field = page.locator('input[name="email"]')
-        if await email_field.count() > 0:
-            await email_field.fill(PLAYBOARD_USER_EMAIL)
-            print(f'[DEBUG] Entered email: {PLAYBOARD_USER_EMAIL}')
-            await asyncio.sleep(0.5)
-        
-        # Fill password field - use input[name="password"]
-        password_field = page.locator('input[name="password"]')
-        if await password_field.count() > 0:
-            await password_field.fill(PLAYBOARD_USER_PASSWORD)
-            print('[DEBUG] Entered password')
-            await asyncio.sleep(0.5)
-        
-        # Click submit button - button[type="submit"]
-        submit_button = page.locator('button[type="submit"]')
-        if await submit_button.count() > 0:
-            await submit_button.click(timeout=5000)
-            print('[DEBUG] Clicked submit button')
-            await asyncio.sleep(3)
-        
-        # Wait for page to fully load after login
-        try:
-            await page.wait_for_load_state('networkidle', timeout=15000)
-        except:
-            await asyncio.sleep(2)
-        
-        print('[DEBUG] Playboard login completed successfully')
-        
-        # 💾 SAVE COOKIES for next time!
+
+    # Wait for table to appear
+    print('[DEBUG] Waiting for table...')
+    try:
+        # Try to wait for video links to appear (more reliable than table)
+        await page.wait_for_selector('a[href*="/en/video/"]', timeout=5000)
+        print('[DEBUG] Found video links on page')
+    except:
+        print('[DEBUG] Video links not found by wait_for_selector, continuing anyway')
+
+    # 🚀 Extract all video data via JavaScript after every scroll step, yielding only new rows
+    seen = set()
+    async for step in human_scroll_steps(page, 8):
+        results = _playboard_rows_from_cards(await extract_cards(page, 'playboard', skip=seen))
+        batch = [r for r in results if r['views'] > 50000 and r['video_id'] not in seen]
+        seen.update(r['video_id'] for r in batch)
+        if batch:
+            print(f'[DEBUG] Scroll step {step + 1}/8: {len(batch)} new videos (total {len(seen)})')
+            yield batch
+
+
+async def _stream_playwright_pooled(url: str, timeout_ms: int):
+    """Run one Playboard config on a warm, already-authenticated context from the session pool."""
+    async with playboard_sessions.lease() as (context, session):
+        print(f'[DEBUG] Using pooled Playboard session {session.email}')
+        page = await context.new_page()
         try:
-            if PLAYBOARD_COOKIES_FILE:
-                cookies = await page.context.cookies()
-                os.makedirs(os.path.dirname(PLAYBOARD_COOKIES_FILE), exist_ok=True)
-                with open(PLAYBOARD_COOKIES_FILE, 'w', encoding='utf-8') as f:
-                    json.dump(cookies, f, indent=2)
-                print(f'[DEBUG] Saved {len(cookies)} cookies to {PLAYBOARD_COOKIES_FILE}')
-        except Exception as cookie_err:
-            print(f'[DEBUG] Warning: Could not save cookies: {cookie_err}')
-        
-        return True
-        
-    except Exception as e:
-        print(f'[DEBUG] Playboard login failed: {e}')
-        return False
+            async for batch in _stream_playboard_page(page, url, timeout_ms, session):
+                yield batch
+        finally:
+            try:
+                await page.close()
+            except Exception as e:
+                print(f'[WARNING] Error closing page: {e}')
 
 
 async def _collect_playwright(url: str, proxy: str | None, timeout_ms: int) -> List[Dict]:
+    return await _drain(_stream_playwright(url, proxy, timeout_ms))
+
+
+async def _stream_playwright(url: str, proxy: str | None, timeout_ms: int):
+    if playboard_sessions.enabled:
+        # Pooled sessions share one proxy-less browser; callers should not pick a proxy for this path
+        if proxy:
+            print(f'[DEBUG] Session pool on: ignoring proxy {mask_proxy(proxy)} for Playwright')
+        async for batch in _stream_playwright_pooled(url, timeout_ms):
+            yield batch
+        return
+
     # 💡 Skip proxy if we have valid cookies (session is already authenticated)
     cookies_exist = False
     if PLAYBOARD_COOKIES_FILE:
@@ -553,26 +598,21 @@ async def _collect_playwright(url: str, proxy: str | None, timeout_ms: int) -> L
             print(f'[DEBUG] Cookies file found ({cookies_path}), skipping proxy')
     
     proxy_cfg = _proxy_for_playwright(proxy)
-    async with async_playwright() as p:
-        browser = None
-        context = None
+    if proxy_cfg:
+        print(f'[DEBUG] Using proxy: {proxy_cfg.get("server")}')
+    else:
+        print(f'[DEBUG] No proxy (direct connection)')
+
+    async with browser_pool.lease(
+        proxy_cfg,
+        source='playboard',
+        user_agent=random.choice(UA),
+        locale=SCRAPER_LOCALE,
+        timezone_id=SCRAPER_TIMEZONE,
+        viewport={'width': 1280 + random.randint(-80, 120), 'height': 900 + random.randint(-60, 80)},
+    ) as context:
         page = None
         try:
-            launch_args = ['--no-default-browser-check']
-            launch_kwargs = {'headless': SCRAPER_HEADLESS, 'args': launch_args}
-            if proxy_cfg:
-                launch_kwargs['proxy'] = proxy_cfg
-                print(f'[DEBUG] Using proxy: {proxy_cfg.get("server")}')
-            else:
-                print(f'[DEBUG] No proxy (direct connection)')
-
-            browser = await p.chromium.launch(**launch_kwargs)
-            context = await browser.new_context(
-                user_agent=random.choice(UA),
-                locale=SCRAPER_LOCALE,
-                timezone_id=SCRAPER_TIMEZONE,
-                viewport={'width': 1280 + random.randint(-80, 120), 'height': 900 + random.randint(-60, 80)},
-            )
             page = await context.new_page()
             await page.add_init_script(
                 """
@@ -587,147 +627,19 @@ async def _collect_playwright(url: str, proxy: str | None, timeout_ms: int) -> L
             print(f'[DEBUG] Random delay {delay:.1f}s before request to avoid rate limiting...')
             await asyncio.sleep(delay)
 
-            await page.goto(url, wait_until='domcontentloaded', timeout=timeout_ms)
-            await asyncio.sleep(5)
-            
-            # 💫 Check if login is needed and perform login if necessary
-            login_ok = await _playboard_login(page)
-            if not login_ok:
-                print('[DEBUG] Login check returned false, returning empty results')
-                return []
-            
-            # ⏳ Wait for content and scroll first
-            print('[DEBUG] Waiting for content to settle...')
-            await asyncio.sleep(2)
-            
-            # Aggressive scrolling to trigger lazy loading
-            print('[DEBUG] Scrolling page to load all content...')
-            for i in range(3):
-                height = await page.evaluate('document.body.scrollHeight')
-                await page.evaluate(f'window.scrollTo(0, {height})')
-                await asyncio.sleep(1)
-            
-            # Wait for table to appear
-            print('[DEBUG] Waiting for table...')
-            try:
-                # Try to wait for video links to appear (more reliable than table)
-                await page.wait_for_selector('a[href*="/en/video/"]', timeout=5000)
-                print('[DEBUG] Found video links on page')
-            except:
-                print('[DEBUG] Video links not found by wait_for_selector, continuing anyway')
-            
-            await human_scroll(page, 8)
-
-            # 🚀 Extract all video data via JavaScript (faster & more reliable)
-            extract_script = """
-            () => {
-                const videos = [];
-                
-                // Try multiple selector strategies
-                // Strategy 1: Look for tbody tr (table structure)
-                let rows = Array.from(document.querySelectorAll('tbody tr'));
-                
-                // Strategy 2: If no tbody, look for div-based rows
-                if (rows.length === 0) {
-                    rows = Array.from(document.querySelectorAll('[class*="row"][class*="video"], tr[data-video], [role="row"]'));
-                }
-                
-                // Strategy 3: If still nothing, find all video links and work backwards
-                if (rows.length === 0) {
-                    const videoLinks = Array.from(document.querySelectorAll('a[href*="/en/video/"]'));
-                    rows = videoLinks.map(link => link.closest('[class*="table__row"]') || link.closest('tr') || link.closest('div[class*="item"]')).filter(Boolean);
-                }
-                
-                for (let i = 0; i < rows.length && i < 100; i++) {
-                    const row = rows[i];
-                    
-                    // Try to find video link with /en/video/ href
-                    const videoLink = row.querySelector('a[href*="/en/video/"]');
-                    if (!videoLink) continue;
-                    
-                    const href = videoLink.getAttribute('href') || '';
-                    
-                    // Extract video ID from /en/video/{ID}?channelId={CHANNEL_ID}
-                    const videoMatch = href.match(/\\/en\\/video\\/([a-zA-Z0-9_-]+)/);
-                    if (!videoMatch) continue;
-                    
-                    const videoId = videoMatch[1];
-                    
-                    // Extract channel ID from query param
-                    const channelMatch = href.match(/channelId=([a-zA-Z0-9_-]+)/);
-                    const channelId = channelMatch ? channelMatch[1] : '';
-                    
-                    // Try to find title - multiple selectors
-                    let title = '';
-                    const titleSelector = row.querySelector('a.title__label h3, [class*="title"] h3, h3, a[class*="title"]');
-                    if (titleSelector) {
-                        title = titleSelector.innerText || titleSelector.textContent || '';
-                    }
-                    
-                    // Try to find views - look for numbers
-                    let views = 0;
-                    const cellsOrText = Array.from(row.querySelectorAll('td, div[class*="cell"], span, strong'));
-                    for (const elem of cellsOrText) {
-                        const text = elem.innerText || elem.textContent || '';
-                        const numMatch = text.match(/(\\d{1,3}(?:,\\d{3})*)/);
-                        if (numMatch) {
-                            const num = parseInt(numMatch[0].replace(/,/g, ''));
-                            if (num > views) views = num;  // Take the largest number (views)
-                        }
-                    }
-                    
-                    // Find channel name
-                    let channelName = '';
-                    const channelLinkElem = row.querySelector('a[href*="/channel/"], [class*="channel"] a, a[class*="channel"]');
-                    if (channelLinkElem) {
-                        channelName = channelLinkElem.getAttribute('title') || channelLinkElem.innerText || channelLinkElem.textContent || '';
-                    }
-                    
-                    if (videoId && views >= 50000) {
-                        videos.push({
-                            rank: (i + 1).toString(),
-                            title: title.substring(0, 100),
-                            views: views,
-                            viewsFormatted: views.toLocaleString(),
-                            channel_name: channelName.substring(0, 40),
-                            channel_id: channelId,
-                            video_id: videoId,
-                            youtube_url: `https://www.youtube.com/watch?v=${videoId}`,
-                            url: `https://www.youtube.com/watch?v=${videoId}`
-                        });
-                    }
-                }
-                
-                return videos;
-            }
-            """
-            
-            results = await page.evaluate(extract_script)
-            print(f'[DEBUG] JavaScript extraction found {len(results)} videos (all filters: {[r.get("video_id") for r in results[:3]]})')
-            
-            return [r for r in results if r['views'] > 50000 and r.get('video_id')]
+            async for batch in _stream_playboard_page(page, url, timeout_ms, proxy=proxy):
+                yield batch
 
-            
         except Exception as e:
             print(f'[ERROR] Playwright collection error: {e}')
             raise
         finally:
-            # ✅ Ensure proper cleanup even if errors occur
+            # ✅ Page is closed here; the pool closes the context and keeps the browser warm
             try:
                 if page:
                     await page.close()
             except Exception as e:
                 print(f'[WARNING] Error closing page: {e}')
-            try:
-                if context:
-                    await context.close()
-            except Exception as e:
-                print(f'[WARNING] Error closing context: {e}')
-            try:
-                if browser:
-                    await browser.close()
-            except Exception as e:
-                print(f'[WARNING] Error closing browser: {e}')
 
 
 async def _collect_nodriver(url: str, proxy: str | None, timeout_ms: int) -> List[Dict]:
@@ -738,11 +650,21 @@ async def _collect_nodriver(url: str, proxy: str | None, timeout_ms: int) -> Lis
     if nd is None:
         return await _collect_playwright(url, proxy, timeout_ms)
 
+    rows = await _collect_nodriver_session(url, proxy, timeout_ms)
+    if rows is None:
+        # Only start Playwright once the nodriver Chromium has fully exited
+        return await _collect_playwright(url, proxy, timeout_ms)
+    return rows
+
+
+async def _collect_nodriver_session(url: str, proxy: str | None, timeout_ms: int) -> List[Dict] | None:
+    """One nodriver browser session; returns None when the caller should fall back to Playwright."""
     browser = None
+    watchdog_tag = browser_watchdog.register('nodriver')
     try:
         # Configure browser launch arguments
         proxy_server = _proxy_server_only(proxy)
-        browser_args = ['--no-default-browser-check', '--lang=vi-VN']
+        browser_args = ['--no-default-browser-check', '--lang=vi-VN', watchdog_tag]
         if proxy_server:
             browser_args.append(f'--proxy-server={proxy_server}')
 
@@ -763,12 +685,7 @@ async def _collect_nodriver(url: str, proxy: str | None, timeout_ms: int) -> Lis
         # ✅ CRITICAL FIX: Check if tab is None
         if tab is None:
             print('[ERROR] nodriver: browser.get() returned None - fallback to Playwright')
-            if browser:
-                try:
-                    await browser.stop()
-                except Exception:
-                    pass
-            return await _collect_playwright(url, proxy, timeout_ms)
+            return None
 
         print('[DEBUG] Tab created successfully')
 
@@ -870,60 +787,18 @@ async def _collect_nodriver(url: str, proxy: str | None, timeout_ms: int) -> Lis
 
         # Extract data with proper error handling
         print('[DEBUG] Extracting table data...')
-        js = """
-          (() => {
-            const rows = Array.from(document.querySelectorAll('#app table tbody tr, table tbody tr, tr')).slice(0, 45);
-            return rows.map((r) => {
-              const linkEl = r.querySelector('td.thumbnail a, td:nth-child(1) a, td:nth-child(2) a');
-              const titleEl = r.querySelector('td.title h3, td.title a.title__label h3, td.title a');
-              const viewsEl = r.querySelector('td.score, td.score span, td:nth-child(4), td.views');
-              const channelEl = r.querySelector('td.channel span.name, td.channel a .name, td:nth-child(5) a');
-              return {
-                title: titleEl ? (titleEl.innerText || '').trim() : '',
-                views_text: viewsEl ? (viewsEl.innerText || '').trim() : '',
-                href: linkEl ? (linkEl.getAttribute('href') || '') : '',
-                channel_name: channelEl ? (channelEl.innerText || '').trim() : '',
-              }
-            })
-          })()
-        """
-
         rows = None
         try:
             rows = await asyncio.wait_for(
-                tab.evaluate(js),
+                tab.evaluate(extraction_expression('playboard')),
                 timeout=10
             )
         except Exception as eval_err:
             print(f'[WARNING] Data extraction failed: {eval_err}')
             rows = None
 
-        # Process results
-        out = []
-        if rows:
-            print(f'[DEBUG] Extracted {len(rows)} rows from table')
-            for r in rows:
-                if not isinstance(r, dict):
-                    continue
-
-                href = (r.get('href') or '').strip()
-                if not href:
-                    continue
-
-                link_info = _extract_playboard_link_info(href)
-                video_id = link_info.get('video_id', '')
-                if not video_id:
-                    continue
-
-                out.append({
-                    'title': ((r.get('title') or f'Playboard video {video_id}').strip())[:180],
-                    'views': parse_views((r.get('views_text') or '').strip()),
-                    'url': link_info.get('youtube_url') or f'https://www.youtube.com/watch?v={video_id}',
-                    'video_id': video_id,
-                    'channel_name': (r.get('channel_name') or '').strip(),
-                    'channel_id': link_info.get('channel_id') or '',
-                })
-        else:
+        out = _playboard_rows_from_cards(rows if isinstance(rows, list) else [])
+        if not out:
             print('[WARNING] No rows extracted - page may not have loaded properly')
 
         print(f'[DEBUG] nodriver extraction complete: {len(out)} videos found')
@@ -931,16 +806,19 @@ async def _collect_nodriver(url: str, proxy: str | None, timeout_ms: int) -> Lis
 
     except Exception as e:
         print(f'[ERROR] nodriver collection failed: {type(e).__name__}: {str(e)[:200]}')
-        # Don't raise - let it fall back to Playwright
-        return await _collect_playwright(url, proxy, timeout_ms)
+        # Don't raise - let it fall back to Playwright (after the browser below is gone)
+        return None
     finally:
-        # Clean up browser
+        # Clean up browser; the watchdog kills the process tree if stop() leaves it running
         if browser:
             try:
-                await asyncio.wait_for(browser.stop(), timeout=10)
+                stopped = browser.stop()
+                if inspect.isawaitable(stopped):
+                    await asyncio.wait_for(stopped, timeout=10)
                 print('[DEBUG] nodriver browser stopped')
             except Exception as stop_err:
                 print(f'[WARNING] Could not stop nodriver browser: {stop_err}')
+        await browser_watchdog.reap(watchdog_tag)
 
 
 async def _nodriver_login(tab) -> bool:
@@ -1016,16 +894,81 @@ async def _nodriver_login(tab) -> bool:
         return False
 
 
-async def _collect_playboard_cards(url: str) -> List[Dict]:
+def _playboard_engine_candidates(url: str):
+    """(engine, label, factory) attempts for hedged_stream, best-ranked engine first, rotating proxies."""
+    engines = playboard_engine_stats.rank(['playwright', 'nodriver'] if nd is not None else ['playwright'])
+    pool = _proxy_pool()
+    candidates = []
+    in_use: List[str] = []  # parallel attempts go out through different proxies
+    # With the session pool, Playwright runs on the pooled (proxy-less) browser: a second attempt only helps
+    # when it can lease another account instead of queueing behind the first
+    pooled = playboard_sessions.enabled
+    playwright_slots = max(1, playboard_sessions.idle_sessions()) if pooled else PLAYBOARD_HEDGE_MAX_ATTEMPTS
+
+    for i in range(max(1, PLAYBOARD_HEDGE_MAX_ATTEMPTS)):
+        engine = engines[i % len(engines)]
+        if engine == 'playwright' and playwright_slots <= 0:
+            if len(engines) == 1:
+                break
+            engine = next(e for e in engines if e != 'playwright')
+        if engine == 'playwright':
+            playwright_slots -= 1
+        timeout_ms = FAIL_FAST_TIMEOUTS_MS[min(len(candidates), len(FAIL_FAST_TIMEOUTS_MS) - 1)]
+
+        async def attempt(engine=engine, timeout_ms=timeout_ms):
+            if engine == 'playwright' and pooled:
+                async for batch in _stream_playwright_pooled(url, timeout_ms):
+                    yield batch
+                return
+            # Only the first proxied attempt keeps the sticky session; parallel ones must not rebind it
+            session = None if in_use else 'playboard'
+            proxy = (proxy_manager.pick(PLAYBOARD_HOST, exclude=in_use, session=session) or proxy_manager.pick(PLAYBOARD_HOST)) if pool else None
+            if pool and not proxy:
+                raise RuntimeError('no healthy proxy available')
+            in_use.append(proxy)
+            if engine == 'nodriver':
+                started = time.time()
+                rows = await _collect_nodriver_session(url, proxy, timeout_ms)
+                proxy_manager.record(proxy, PLAYBOARD_HOST, rows is not None, (time.time() - started) * 1000, error='nodriver could not load the chart')
+                if rows is None:
+                    raise RuntimeError('nodriver could not load the chart')
+                yield rows
+                return
+            async for batch in _stream_playwright(url, proxy, timeout_ms):
+                yield batch
+
+        candidates.append((engine, f'{engine} timeout={timeout_ms}ms', attempt))
+    return candidates
+
+
+async def _stream_playboard_cards(url: str):
+    if not PLAYBOARD_HEDGE_ENABLED:
+        async for batch in _stream_playboard_cards_sequential(url):
+            yield batch
+        return
+
+    print(f'[DEBUG] Scraping Playboard (hedged) -> {url}')
+    seen = set()
+    async for batch in hedged_stream('playboard', _playboard_engine_candidates(url), PLAYBOARD_HEDGE_DELAY_SEC, playboard_engine_stats):
+        batch = [r for r in batch if r.get('video_id') not in seen]
+        seen.update(r.get('video_id') for r in batch)
+        if batch:
+            yield batch
+
+
+async def _stream_playboard_cards_sequential(url: str):
     print(f'[DEBUG] Scraping Playboard -> {url}')
 
     pool = _proxy_pool()
     attempts = max(len(pool), 1)
     last_error = None
+    seen = set()
 
+    tried = []
     for i in range(attempts):
         timeout_ms = FAIL_FAST_TIMEOUTS_MS[min(i, len(FAIL_FAST_TIMEOUTS_MS) - 1)]
-        proxy = await _next_healthy_proxy() if pool else None
+        proxy = proxy_manager.pick(PLAYBOARD_HOST, exclude=tried, session='playboard') if pool else None
+        tried.append(proxy)
         if pool and not proxy:
             print('[DEBUG] No healthy proxy available, stop retry')
             break
@@ -1033,52 +976,89 @@ async def _collect_playboard_cards(url: str) -> List[Dict]:
         try:
             # 💫 PRIMARY: Always try Playwright first (more stable)
             try:
-                return await _collect_playwright(url, proxy, timeout_ms)
+                # The session pool's browser has no proxy; the picked one is still used by the nodriver fallback
+                playwright_proxy = None if playboard_sessions.enabled else proxy
+                async for batch in _stream_playwright(url, playwright_proxy, timeout_ms):
+                    batch = [r for r in batch if r.get('video_id') not in seen]
+                    seen.update(r.get('video_id') for r in batch)
+                    if batch:
+                        yield batch
+                return
             except PlaywrightTimeoutError as e:
                 last_error = e
-                print(f'[DEBUG] Playwright timeout {timeout_ms}ms with proxy {_mask_proxy(proxy)} -> retry next proxy')
+                if seen:
+                    # Rows already streamed downstream; a retry would only rescrape the same chart
+                    print(f'[DEBUG] Playwright timeout after {len(seen)} rows, keeping partial result')
+                    return
+                print(f'[DEBUG] Playwright timeout {timeout_ms}ms with proxy {mask_proxy(proxy)} -> retry next proxy')
                 continue
             except Exception as e:
                 print(f'[DEBUG] Playwright failed: {e}')
-                
+                if seen:
+                    print(f'[DEBUG] Keeping {len(seen)} rows already streamed')
+                    return
+
                 # 💫 FALLBACK: Try nodriver if Playwright fails
                 if nd is not None:
                     try:
-                        print(f'[DEBUG] Attempting nodriver as fallback with proxy {_mask_proxy(proxy)}...')
-                        return await _collect_nodriver(url, proxy, timeout_ms)
+                        print(f'[DEBUG] Attempting nodriver as fallback with proxy {mask_proxy(proxy)}...')
+                        rows = await _collect_nodriver(url, proxy, timeout_ms)
+                        rows = [r for r in rows if r.get('video_id') not in seen]
+                        seen.update(r.get('video_id') for r in rows)
+                        if rows:
+                            yield rows
+                        return
                     except Exception as nodriver_err:
                         print(f'[nodriver fallback also failed] {nodriver_err}')
                         last_error = nodriver_err
                 else:
                     last_error = e
-                
+
                 continue
-                
+
         except asyncio.TimeoutError as e:
             last_error = e
-            print(f'[DEBUG] Collection timeout {timeout_ms}ms with proxy {_mask_proxy(proxy)} -> retry next proxy')
+            print(f'[DEBUG] Collection timeout {timeout_ms}ms with proxy {mask_proxy(proxy)} -> retry next proxy')
             continue
         except Exception as e:
             last_error = e
-            print(f'[DEBUG] Unexpected error with proxy {_mask_proxy(proxy)}: {e}')
+            print(f'[DEBUG] Unexpected error with proxy {mask_proxy(proxy)}: {e}')
             continue
 
+    if seen:
+        return
+    # Raise so run_step leaves the step incomplete instead of saving a failed collect as 0 items
     if last_error:
-        print(f'[DEBUG] Playboard collect failed after all retries: {last_error}')
-    return []
+        raise RuntimeError(f'Playboard collect failed after all retries: {last_error}')
+    raise RuntimeError('Playboard collect failed: no healthy proxy available')
+
 
+def _build_youtube_fanout_query(topics: List[str], keywords_by_topic: Dict) -> str:
+    # YouTube search supports `|` as OR, so one results page can cover every topic
+    terms = []
+    for topic in topics:
+        keywords = keywords_by_topic.get(topic) or [topic]
+        term = str(keywords[0] or topic).strip()
+        if term and term not in terms:
+            terms.append(term)
+    return f"{' | '.join(terms)} shorts"
 
-async def _collect_youtube_cards(topic: str, keywords: List[str]) -> List[Dict]:
-    query = f"{(keywords[0] if keywords else topic)} shorts"
-    url = f"https://www.youtube.com/results?search_query={query.replace(' ', '+')}&sp=EgIYAQ%253D%253D"
+
+async def _stream_youtube_cards(topic: str, keywords: List[str], query: str | None = None):
+    query = query or f"{(keywords[0] if keywords else topic)} shorts"
+    url = f"https://www.youtube.com/results?search_query={quote_plus(query)}&sp=EgIYAQ%253D%253D"
     print(f'[DEBUG] YouTube search → {url}')
 
     pool = _proxy_pool()
     attempts = max(len(pool), 1)
+    last_error = None
+    seen = set()
 
+    tried = []
     for i in range(attempts):
         timeout_ms = FAIL_FAST_TIMEOUTS_MS[min(i, len(FAIL_FAST_TIMEOUTS_MS) - 1)]
-        proxy = await _next_healthy_proxy() if pool else None
+        proxy = proxy_manager.pick('www.youtube.com', exclude=tried, session='youtube-search') if pool else None
+        tried.append(proxy)
         if pool and not proxy:
             print('[DEBUG] No healthy proxy for YouTube collect')
             break
@@ -1086,19 +1066,14 @@ async def _collect_youtube_cards(topic: str, keywords: List[str]) -> List[Dict]:
         proxy_cfg = _proxy_for_playwright(proxy)
 
         try:
-            async with async_playwright() as p:
-                launch_args = ['--no-default-browser-check']
-                launch_kwargs = {'headless': SCRAPER_HEADLESS, 'args': launch_args}
-                if proxy_cfg:
-                    launch_kwargs['proxy'] = proxy_cfg
-
-                browser = await p.chromium.launch(**launch_kwargs)
-                context = await browser.new_context(
-                    user_agent=random.choice(UA),
-                    locale=SCRAPER_LOCALE,
-                    timezone_id=SCRAPER_TIMEZONE,
-                    viewport={'width': 1280 + random.randint(-80, 120), 'height': 900 + random.randint(-60, 80)},
-                )
+            async with browser_pool.lease(
+                proxy_cfg,
+                source='youtube',
+                user_agent=random.choice(UA),
+                locale=SCRAPER_LOCALE,
+                timezone_id=SCRAPER_TIMEZONE,
+                viewport={'width': 1280 + random.randint(-80, 120), 'height': 900 + random.randint(-60, 80)},
+            ) as context:
                 page = await context.new_page()
                 await page.add_init_script(
                     """
@@ -1107,36 +1082,20 @@ async def _collect_youtube_cards(topic: str, keywords: List[str]) -> List[Dict]:
                     """
                 )
 
-                await page.goto(url, wait_until='domcontentloaded', timeout=timeout_ms)
+                await _goto(page, url, proxy, wait_until='domcontentloaded', timeout=timeout_ms)
                 await asyncio.sleep(4)
-                await human_scroll(page, 8)
-
-                links = page.locator('a[href*="/shorts/"]')
-                count = await links.count()
-                print(f'[DEBUG] Found {count} shorts links')
 
-                seen = set()
-                out = []
-                for j in range(min(count, 60)):
-                    link = links.nth(j)
-                    try:
-                        href = await link.get_attribute('href')
-                        if not href:
-                            continue
-                        full = href if href.startswith('http') else f'https://www.youtube.com{href}'
+                async for _ in human_scroll_steps(page, 8):
+                    if len(seen) >= 60:
+                        break
+                    out = []
+                    for item in await extract_cards(page, 'youtube-shorts', limit=60 - len(seen), skip=seen):
+                        full = item.get('url') or ''
                         video_id = extract_youtube_id(full)
                         if not video_id or video_id in seen:
                             continue
                         seen.add(video_id)
-
-                        title = ''
-                        try:
-                            title = (await link.inner_text(timeout=1000)).strip()
-                        except Exception:
-                            pass
-                        if not title:
-                            title = f'Shorts {video_id}'
-
+                        title = str(item.get('title') or '').strip() or f'Shorts {video_id}'
                         out.append(
                             {
                                 'title': title[:180],
@@ -1146,30 +1105,33 @@ async def _collect_youtube_cards(topic: str, keywords: List[str]) -> List[Dict]:
                                 'channel_id': f'yt-{video_id[:8]}',
                             }
                         )
-                    except Exception:
-                        continue
+                    if out:
+                        yield out
 
-                await context.close()
-                await browser.close()
-                return out
+                print(f'[DEBUG] Found {len(seen)} shorts links')
+                return
 
-        except PlaywrightTimeoutError:
-            print(f'[DEBUG] YouTube goto timeout {timeout_ms}ms with proxy {_mask_proxy(proxy)} -> retry next proxy')
+        except PlaywrightTimeoutError as e:
+            if seen:
+                return
+            last_error = e
+            print(f'[DEBUG] YouTube goto timeout {timeout_ms}ms with proxy {mask_proxy(proxy)} -> retry next proxy')
             continue
         except Exception as e:
-            print(f'[DEBUG] YouTube collect failed with proxy {_mask_proxy(proxy)}: {e}')
+            if seen:
+                return
+            last_error = e
+            print(f'[DEBUG] YouTube collect failed with proxy {mask_proxy(proxy)}: {e}')
             continue
 
-    return []
-
+    # Every attempt failed before a link was found; raise so run_step retries the step on resume
+    if last_error:
+        raise RuntimeError(f'YouTube collect failed after all retries: {last_error}')
+    raise RuntimeError('YouTube collect failed: no healthy proxy available')
 
-async def _fetch_html(url: str, timeout_sec: int = 25) -> str:
-    def _do_fetch() -> str:
-        req = Request(url, headers={'User-Agent': random.choice(UA)})
-        with urlopen(req, timeout=timeout_sec) as resp:
-            return resp.read().decode('utf-8', errors='ignore')
 
-    return await asyncio.to_thread(_do_fetch)
+async def _fetch_html(url: str, timeout_sec: int = 25, use_cache: bool = True) -> str:
+    return await fetch_text(url, timeout_sec=timeout_sec, headers={'User-Agent': random.choice(UA)}, use_cache=use_cache)
 
 
 async def _resolve_dailyhaha_youtube_url(video_page_url: str) -> str:
@@ -1288,20 +1250,8 @@ def _extract_kuaishou_cover(photo: Dict) -> str:
     return ''
 
 
-def _normalize_text(value: str) -> str:
-    try:
-        import unicodedata
-
-        text = (value or '').lower()
-        text = unicodedata.normalize('NFKD', text)
-        text = ''.join([c for c in text if not unicodedata.combining(c)])
-        return text
-    except Exception:
-        return (value or '').lower()
-
-
 def _score_category(text: str) -> str:
-    normalized = _normalize_text(text)
+    normalized = normalize_text(text)
     best = 'misc'
     best_score = 0
     for category, keywords in PEXELS_CATEGORY_KEYWORDS.items():
@@ -1427,20 +1377,22 @@ async def _enrich_pexels_card(card: Dict) -> Dict:
     return card
 
 
-async def _collect_pexels_cards() -> List[Dict]:
-    setting = get_or_create_settings()
+async def _stream_pexels_cards():
+    setting = await get_or_create_settings()
     pexels_cfg = setting.get('pexelsSettings', {}) or {}
     start_url = (pexels_cfg.get('startUrl') or PEXELS_START_URL or 'https://www.pexels.com/vi-vn/video/').strip()
     max_items = int(pexels_cfg.get('maxItems') or PEXELS_MAX_ITEMS or 60)
     scroll_times = int(pexels_cfg.get('scrollTimes') or PEXELS_SCROLL_TIMES or 6)
 
-    cards: List[Dict] = []
+    seen = set()
     pool = _proxy_pool()
     attempts = max(len(pool), 1)
 
+    tried = []
     for i in range(attempts):
         timeout_ms = FAIL_FAST_TIMEOUTS_MS[min(i, len(FAIL_FAST_TIMEOUTS_MS) - 1)]
-        proxy = await _next_healthy_proxy() if pool else None
+        proxy = proxy_manager.pick(urlparse(start_url).hostname, exclude=tried, session='pexels') if pool else None
+        tried.append(proxy)
         if pool and not proxy:
             print('[pexels] no healthy proxy available')
             break
@@ -1448,80 +1400,30 @@ async def _collect_pexels_cards() -> List[Dict]:
         proxy_cfg = _proxy_for_playwright(proxy) if proxy else None
 
         try:
-            async with async_playwright() as p:
-                launch_kwargs = {'headless': SCRAPER_HEADLESS, 'args': ['--no-default-browser-check']}
-                if proxy_cfg:
-                    launch_kwargs['proxy'] = proxy_cfg
-
-                browser = await p.chromium.launch(**launch_kwargs)
-                context = await browser.new_context(
-                    user_agent=random.choice(UA),
-                    locale=SCRAPER_LOCALE,
-                    timezone_id=SCRAPER_TIMEZONE,
-                    viewport={'width': 1366, 'height': 920},
-                )
+            async with browser_pool.lease(
+                proxy_cfg,
+                source='pexels',
+                user_agent=random.choice(UA),
+                locale=SCRAPER_LOCALE,
+                timezone_id=SCRAPER_TIMEZONE,
+                viewport={'width': 1366, 'height': 920},
+            ) as context:
                 page = await context.new_page()
 
-                try:
-                    await page.goto(start_url, wait_until='domcontentloaded', timeout=timeout_ms)
-                    await asyncio.sleep(2)
-
-                    await human_scroll(page, max(1, scroll_times))
-
-                    raw_cards = await page.evaluate(
-                        f"""() => {{
-                            const normalize = (href) => {{
-                                if (!href) return '';
-                                if (href.startsWith('http')) return href;
-                                return `https://www.pexels.com${{href}}`;
-                            }};
-
-                            const out = [];
-                            const seen = new Set();
-                            const links = Array.from(document.querySelectorAll('a[href*=\"/video/\"]'));
-
-                            for (const link of links) {{
-                                const href = link.getAttribute('href') || '';
-                                if (!href.includes('/video/')) continue;
-                                const full = normalize(href);
-                                const match = full.match(/-([0-9]+)(?:\\/|\\?|$)/);
-                                if (!match) continue;
-                                const id = match[1];
-                                if (seen.has(id)) continue;
-                                seen.add(id);
-
-                                const card = link.closest('article, li, div');
-                                const img = card?.querySelector('img');
-                                const title =
-                                    (link.getAttribute('aria-label')
-                                        || link.getAttribute('title')
-                                        || img?.getAttribute('alt')
-                                        || card?.textContent
-                                        || '')
-                                        .trim();
-                                const thumb = img?.getAttribute('src') || img?.getAttribute('data-src') || '';
-
-                                out.push({{
-                                    video_id: id,
-                                    page_url: full,
-                                    title: title.slice(0, 180),
-                                    thumbnail: thumb,
-                                }});
-
-                                if (out.length >= {max_items}) break;
-                            }}
-
-                            return out;
-                        }}"""
-                    )
+                await _goto(page, start_url, proxy, wait_until='domcontentloaded', timeout=timeout_ms)
+                await asyncio.sleep(2)
 
-                    for item in raw_cards or []:
-                        page_url = str(item.get('page_url') or '').strip()
+                async for _ in human_scroll_steps(page, max(1, scroll_times)):
+                    raw_cards = await extract_cards(page, 'pexels', limit=max_items, skip=seen)
+                    batch = []
+                    for item in raw_cards:
+                        page_url = str(item.get('url') or '').strip()
                         video_id = _extract_pexels_video_id(page_url)
-                        if not video_id:
+                        if not video_id or video_id in seen:
                             continue
+                        seen.add(video_id)
 
-                        cards.append({
+                        batch.append({
                             'video_id': video_id,
                             'url': f'https://www.pexels.com/download/video/{video_id}/',
                             'page_url': page_url,
@@ -1530,24 +1432,27 @@ async def _collect_pexels_cards() -> List[Dict]:
                             'thumbnail': str(item.get('thumbnail') or '').strip(),
                             'category': 'misc',
                         })
+                    if batch:
+                        yield batch
+                    if len(seen) >= max_items:
+                        break
 
-                    print(f'[pexels] collected {len(cards)} cards from {start_url}')
-                finally:
-                    await context.close()
-                    await browser.close()
+                print(f'[pexels] collected {len(seen)} cards from {start_url}')
 
-                if cards:
+                if seen:
                     break
 
         except PlaywrightTimeoutError:
-            print(f'[pexels] goto timeout {timeout_ms}ms with proxy {_mask_proxy(proxy)} -> retry next proxy')
+            if seen:
+                break
+            print(f'[pexels] goto timeout {timeout_ms}ms with proxy {mask_proxy(proxy)} -> retry next proxy')
             continue
         except Exception as e:
-            print(f'[pexels] scrape failed with proxy {_mask_proxy(proxy)}: {e}')
+            if seen:
+                break
+            print(f'[pexels] scrape failed with proxy {mask_proxy(proxy)}: {e}')
             continue
 
-    return cards
-
 
 async def _fetch_kuaishou_page(page, pcursor: str = '') -> Dict:
     variables = {
@@ -1574,6 +1479,16 @@ async def _fetch_kuaishou_page(page, pcursor: str = '') -> Dict:
     )
 
 
+class CaptchaPaused(Exception):
+    """Raised inside a collector session when a captcha stops it; `state` is where to continue from."""
+
+    def __init__(self, url: str = '', state: Dict | None = None, reason: str = ''):
+        super().__init__(reason or url)
+        self.url = url
+        self.state = state or {}
+        self.reason = reason or 'captcha detected'
+
+
 async def _kuaishou_has_captcha(page) -> bool:
     try:
         detected = await page.evaluate(
@@ -1596,8 +1511,8 @@ async def _kuaishou_has_captcha(page) -> bool:
         return False
 
 
-def _log_kuaishou_captcha_event(url: str, reason: str = '') -> None:
-    log_job(
+async def _log_kuaishou_captcha_event(url: str, reason: str = '', resume_state: Dict | None = None):
+    return await log_job(
         'captcha',
         'paused_captcha',
         platform='kuaishou',
@@ -1605,24 +1520,119 @@ def _log_kuaishou_captcha_event(url: str, reason: str = '') -> None:
         error=reason or 'kuaishou captcha detected',
         source='kuaishou-brilliant',
         targetUrl=url,
+        resumeState=resume_state or {},
         resolved=False,
         resolvedAt=None,
     )
 
 
-async def _collect_kuaishou_cards() -> List[Dict]:
-    setting = get_or_create_settings()
+async def _stream_kuaishou_feed(page, start_url: str, state: Dict, scroll_times: int, max_items: int):
+    """
+    Yield one batch per GraphQL page starting at `state` ({pcursor, pages, items}).
+    Raises CaptchaPaused carrying the position to continue from.
+    """
+    pcursor = str(state.get('pcursor') or '')
+    pages_done = int(state.get('pages') or 0)
+    collected = int(state.get('items') or 0)
+
+    for page_no in range(pages_done + 1, max(pages_done + 1, scroll_times) + 1):
+        data = await _fetch_kuaishou_page(page, pcursor)
+        if await _kuaishou_has_captcha(page):
+            raise CaptchaPaused(start_url, {'pcursor': pcursor, 'pages': page_no - 1, 'items': collected}, 'captcha detected during pagination')
+
+        payload = (data or {}).get('data', {}).get('brilliantTypeData', {}) or {}
+        feeds = payload.get('feeds') or []
+        pcursor = str(payload.get('pcursor') or '').strip()
+
+        cards: List[Dict] = []
+        for feed in feeds:
+            photo = feed.get('photo') or {}
+            video_id = str(photo.get('id') or '').strip()
+            if not video_id:
+                continue
+            url = _extract_kuaishou_video_url(photo)
+            if not url:
+                continue
+
+            caption = str(photo.get('caption') or photo.get('originCaption') or '').strip()
+            tags = [str(t.get('name') or '').strip() for t in (feed.get('tags') or []) if t.get('name')]
+            cards.append({
+                'video_id': video_id,
+                'url': url,
+                'page_url': f'https://www.kuaishou.com/short-video/{video_id}',
+                'title': caption or f'Kuaishou video {video_id}',
+                'views': int(photo.get('viewCount') or photo.get('likeCount') or 0),
+                'thumbnail': _extract_kuaishou_cover(photo),
+                'tags': tags,
+                'category': tags[0] if tags else 'brilliant',
+                # Checkpoint: where to continue once this page is processed
+                'pcursor': pcursor,
+                'page': page_no,
+            })
+
+            if collected + len(cards) >= max_items:
+                break
+
+        if cards:
+            collected += len(cards)
+            yield cards
+
+        if collected >= max_items or not pcursor:
+            break
+
+        await asyncio.sleep(2.5)
+
+    print(f'[kuaishou] collected {collected} cards from {start_url}')
+
+
+async def _hold_kuaishou_captcha(paused: CaptchaPaused, stack: AsyncExitStack, context, page, on_resume, scroll_times: int, max_items: int, on_resumed=None):
+    job_id = await _log_kuaishou_captcha_event(paused.url, paused.reason, paused.state)
+    print(f'[kuaishou] {paused.reason}; waiting for manual resolve')
+    if on_resume is None:
+        return job_id
+
+    async def continuation() -> int:
+        stream = _stream_kuaishou_feed(page, paused.url, paused.state, scroll_times, max_items)
+        found = await _run_discovery_pipeline('kuaishou (after captcha)', stream, on_resume)
+        if on_resumed is not None:
+            await on_resumed(found)
+        return found
+
+    await captcha_pauses.hold(job_id, 'kuaishou', stack, context, continuation, KUAISHOU_STORAGE_STATE)
+    return job_id
+
+
+async def _stream_kuaishou_cards(resume: Dict | None = None, on_resume=None, on_paused=None, on_resumed=None):
+    """
+    Yield one batch per GraphQL page; `resume` ({pcursor, pages, items}) continues a checkpointed run.
+    On a captcha the browser lease is handed to captcha_pauses and `on_resume` handles the batches
+    collected after the job is resolved; `on_paused(job_id)` is called when the pause starts and
+    `on_resumed(found)` when the live continuation ends.
+    """
+    setting = await get_or_create_settings()
     kuaishou_cfg = setting.get('kuaishouSettings', {}) or {}
     start_url = (kuaishou_cfg.get('startUrl') or KUAISHOU_START_URL or 'https://www.kuaishou.com/brilliant').strip()
     max_items = int(kuaishou_cfg.get('maxItems') or KUAISHOU_MAX_ITEMS or 60)
     scroll_times = int(kuaishou_cfg.get('scrollTimes') or KUAISHOU_SCROLL_TIMES or 4)
 
-    cards: List[Dict] = []
+    resume = resume or {}
+    state = {
+        'pcursor': str(resume.get('pcursor') or ''),
+        'pages': int(resume.get('pages') or 0),
+        'items': int(resume.get('items') or 0),
+    }
+    if state['pcursor']:
+        print(f"[kuaishou] resuming at pcursor={state['pcursor']} after {state['pages']} pages / {state['items']} items")
+
     pool = _proxy_pool()
     attempts = max(len(pool), 1)
+    last_error = None
+    yielded = False
 
+    tried = []
     for _ in range(attempts):
-        proxy = await _next_healthy_proxy() if pool else None
+        proxy = proxy_manager.pick(urlparse(start_url).hostname, exclude=tried, session='kuaishou') if pool else None
+        tried.append(proxy)
         if pool and not proxy:
             print('[kuaishou] no healthy proxy available')
             break
@@ -1630,92 +1640,58 @@ async def _collect_kuaishou_cards() -> List[Dict]:
         proxy_cfg = _proxy_for_playwright(proxy) if proxy else None
 
         try:
-            async with async_playwright() as p:
-                launch_kwargs = {'headless': SCRAPER_HEADLESS, 'args': ['--no-default-browser-check']}
-                if proxy_cfg:
-                    launch_kwargs['proxy'] = proxy_cfg
-
-                browser = await p.chromium.launch(**launch_kwargs)
-                context_kwargs = {
-                    'user_agent': random.choice(UA),
-                    'locale': SCRAPER_LOCALE,
-                    'timezone_id': SCRAPER_TIMEZONE,
-                    'viewport': {'width': 1366, 'height': 920},
-                }
-                if KUAISHOU_STORAGE_STATE and os.path.exists(KUAISHOU_STORAGE_STATE):
-                    context_kwargs['storage_state'] = KUAISHOU_STORAGE_STATE
-                context = await browser.new_context(**context_kwargs)
+            context_kwargs = {
+                'user_agent': random.choice(UA),
+                'locale': SCRAPER_LOCALE,
+                'timezone_id': SCRAPER_TIMEZONE,
+                'viewport': {'width': 1366, 'height': 920},
+            }
+            if KUAISHOU_STORAGE_STATE and os.path.exists(KUAISHOU_STORAGE_STATE):
+                context_kwargs['storage_state'] = KUAISHOU_STORAGE_STATE
+            async with AsyncExitStack() as stack:
+                context = await stack.enter_async_context(browser_pool.lease(proxy_cfg, source='kuaishou', **context_kwargs))
                 page = await context.new_page()
 
                 try:
-                    await page.goto(start_url, wait_until='domcontentloaded', timeout=45000)
+                    await _goto(page, start_url, proxy, wait_until='domcontentloaded', timeout=45000)
                     await asyncio.sleep(3)
 
                     if await _kuaishou_has_captcha(page):
-                        _log_kuaishou_captcha_event(start_url, 'captcha detected at page load')
-                        print('[kuaishou] captcha detected at page load; waiting for manual resolve')
-                        return []
-
-                    pcursor = ''
-                    for _ in range(max(1, scroll_times)):
-                        data = await _fetch_kuaishou_page(page, pcursor)
-                        payload = (data or {}).get('data', {}).get('brilliantTypeData', {}) or {}
-                        feeds = payload.get('feeds') or []
-                        pcursor = str(payload.get('pcursor') or '').strip()
-
-                        if await _kuaishou_has_captcha(page):
-                            _log_kuaishou_captcha_event(start_url, 'captcha detected during pagination')
-                            print('[kuaishou] captcha detected during pagination; waiting for manual resolve')
-                            break
-
-                        for feed in feeds:
-                            photo = feed.get('photo') or {}
-                            video_id = str(photo.get('id') or '').strip()
-                            if not video_id:
-                                continue
-                            url = _extract_kuaishou_video_url(photo)
-                            if not url:
-                                continue
-
-                            caption = str(photo.get('caption') or photo.get('originCaption') or '').strip()
-                            tags = [str(t.get('name') or '').strip() for t in (feed.get('tags') or []) if t.get('name')]
-                            cards.append({
-                                'video_id': video_id,
-                                'url': url,
-                                'page_url': f'https://www.kuaishou.com/short-video/{video_id}',
-                                'title': caption or f'Kuaishou video {video_id}',
-                                'views': int(photo.get('viewCount') or photo.get('likeCount') or 0),
-                                'thumbnail': _extract_kuaishou_cover(photo),
-                                'tags': tags,
-                                'category': tags[0] if tags else 'brilliant',
-                            })
-
-                            if len(cards) >= max_items:
-                                break
-
-                        if len(cards) >= max_items or not pcursor:
-                            break
-
-                        await asyncio.sleep(2.5)
-
-                    print(f'[kuaishou] collected {len(cards)} cards from {start_url}')
-                finally:
-                    await context.close()
-                    await browser.close()
-            break
-        except PlaywrightTimeoutError:
-            print(f'[kuaishou] goto timeout with proxy {_mask_proxy(proxy)} -> retry next proxy')
+                        raise CaptchaPaused(start_url, dict(state), 'captcha detected at page load')
+
+                    async for cards in _stream_kuaishou_feed(page, start_url, state, scroll_times, max_items):
+                        state = {'pcursor': cards[-1]['pcursor'], 'pages': cards[-1]['page'], 'items': state['items'] + len(cards)}
+                        yielded = True
+                        yield cards
+                except CaptchaPaused as paused:
+                    proxy_manager.record(proxy, urlparse(start_url).hostname, False, error='captcha')
+                    # Keep the context (cookies, page, cursor) open until the captcha job is resolved
+                    job_id = await _hold_kuaishou_captcha(paused, stack, context, page, on_resume, scroll_times, max_items, on_resumed)
+                    if on_paused is not None:
+                        on_paused(job_id)
+            return
+        except PlaywrightTimeoutError as e:
+            if yielded:
+                return
+            last_error = e
+            print(f'[kuaishou] goto timeout with proxy {mask_proxy(proxy)} -> retry next proxy')
             continue
         except Exception as e:
-            print(f'[kuaishou] scrape failed with proxy {_mask_proxy(proxy)}: {e}')
+            if yielded:
+                return
+            last_error = e
+            print(f'[kuaishou] scrape failed with proxy {mask_proxy(proxy)}: {e}')
             continue
 
-    return cards
+    # Raise so run_step leaves the step incomplete instead of saving a failed collect as 0 items
+    if last_error:
+        raise RuntimeError(f'Kuaishou collect failed after all retries: {last_error}')
+    raise RuntimeError('Kuaishou collect failed: no healthy proxy available')
 
 
 async def discover_pexels():
     started = time.time()
-    setting = get_or_create_settings()
+    setting = await get_or_create_settings()
     discover_sources = setting.get('discoverSources', {}) or {}
     if not discover_sources.get('pexels', True):
         return {'skipped': True}
@@ -1723,52 +1699,56 @@ async def discover_pexels():
     if not pexels_cfg.get('isEnabled', True):
         return {'skipped': True}
 
-    cards = await _collect_pexels_cards()
-    found = 0
+    async def handle(cards: List[Dict]) -> int:
+        found = 0
+        for card in cards:
+            video_id = card.get('video_id', '')
+            if not video_id:
+                continue
 
-    for card in cards:
-        video_id = card.get('video_id', '')
-        if not video_id:
-            continue
+            existing = await videos.find_one({'platform': 'pexels', 'videoId': video_id})
+            if existing:
+                continue
 
-        existing = videos.find_one({'platform': 'pexels', 'videoId': video_id})
-        if existing:
-            continue
+            if not card.get('tags') or not card.get('category') or card.get('category') == 'misc':
+                card = await _enrich_pexels_card(card)
 
-        if not card.get('tags') or not card.get('category') or card.get('category') == 'misc':
-            card = await _enrich_pexels_card(card)
+            channel = await upsert_channel('pexels', PEXELS_CHANNEL_ID, 'Pexels', 'sub-video')
+            category = card.get('category') or 'misc'
+            tags = card.get('tags') or []
+            v = await upsert_video(
+                {
+                    'platform': 'pexels',
+                    'videoId': video_id,
+                    'title': card.get('title', f'Pexels video {video_id}')[:200],
+                    'views': int(card.get('views', 0) or 0),
+                    'url': card.get('url'),
+                    'topic': category,
+                    'thumbnail': card.get('thumbnail') or '',
+                    'channelId': channel['_id'],
+                    'category': category,
+                    'tags': tags,
+                    'detailUrl': card.get('detail_url') or card.get('page_url'),
+                }
+            )
+            if v is None:
+                continue
+            await enqueue(v['_id'], 5)
+            found += 1
+        return found
 
-        channel = upsert_channel('pexels', PEXELS_CHANNEL_ID, 'Pexels', 'sub-video')
-        category = card.get('category') or 'misc'
-        tags = card.get('tags') or []
-        v = upsert_video(
-            {
-                'platform': 'pexels',
-                'videoId': video_id,
-                'title': card.get('title', f'Pexels video {video_id}')[:200],
-                'views': int(card.get('views', 0) or 0),
-                'url': card.get('url'),
-                'topic': category,
-                'thumbnail': card.get('thumbnail') or '',
-                'channelId': channel['_id'],
-                'category': category,
-                'tags': tags,
-                'detailUrl': card.get('detail_url') or card.get('page_url'),
-            }
-        )
-        await enqueue(v['_id'], 5)
-        found += 1
+    found = await _run_discovery_pipeline('pexels', _stream_pexels_cards(), handle)
 
     duration = int((time.time() - started) * 1000)
-    log_job('discover', 'success', platform='pexels', itemsFound=found, duration=duration)
+    await log_job('discover', 'success', platform='pexels', itemsFound=found, duration=duration)
 
     print(f'[Pexels] -> queued {found} videos')
     return {'success': True, 'itemsFound': found}
 
 
-async def discover_kuaishou():
+async def discover_kuaishou(run: DiscoveryRun | None = None, resume: Dict | None = None):
     started = time.time()
-    setting = get_or_create_settings()
+    setting = await get_or_create_settings()
     discover_sources = setting.get('discoverSources', {}) or {}
     if not discover_sources.get('kuaishou', True):
         return {'skipped': True}
@@ -1776,50 +1756,74 @@ async def discover_kuaishou():
     if not kuaishou_cfg.get('isEnabled', True):
         return {'skipped': True}
 
-    cards = await _collect_kuaishou_cards()
-    found = 0
-
-    for card in cards:
-        video_id = card.get('video_id', '')
-        if not video_id:
-            continue
+    async def handle(cards: List[Dict]) -> int:
+        found = 0
+        for card in cards:
+            video_id = card.get('video_id', '')
+            if not video_id:
+                continue
 
-        existing = videos.find_one({'platform': 'kuaishou', 'videoId': video_id})
-        if existing:
-            continue
+            existing = await videos.find_one({'platform': 'kuaishou', 'videoId': video_id})
+            if existing:
+                continue
 
-        channel = upsert_channel('kuaishou', KUAISHOU_CHANNEL_ID, 'Kuaishou Brilliant', 'kuaishou')
-        tags = card.get('tags') or []
-        category = card.get('category') or 'brilliant'
-        topic = tags[0] if tags else 'kuaishou'
+            channel = await upsert_channel('kuaishou', KUAISHOU_CHANNEL_ID, 'Kuaishou Brilliant', 'kuaishou')
+            tags = card.get('tags') or []
+            category = card.get('category') or 'brilliant'
+            topic = tags[0] if tags else 'kuaishou'
 
-        v = upsert_video(
-            {
-                'platform': 'kuaishou',
-                'videoId': video_id,
-                'title': card.get('title', f'Kuaishou video {video_id}')[:200],
-                'views': int(card.get('views', 0) or 0),
-                'url': card.get('url'),
-                'topic': topic,
-                'thumbnail': card.get('thumbnail') or '',
-                'channelId': channel['_id'],
-                'category': category,
-                'tags': tags,
-                'detailUrl': card.get('page_url'),
-            }
-        )
-        await enqueue(v['_id'], 5)
-        found += 1
+            v = await upsert_video(
+                {
+                    'platform': 'kuaishou',
+                    'videoId': video_id,
+                    'title': card.get('title', f'Kuaishou video {video_id}')[:200],
+                    'views': int(card.get('views', 0) or 0),
+                    'url': card.get('url'),
+                    'topic': topic,
+                    'thumbnail': card.get('thumbnail') or '',
+                    'channelId': channel['_id'],
+                    'category': category,
+                    'tags': tags,
+                    'detailUrl': card.get('page_url'),
+                }
+            )
+            if v is None:
+                continue
+            await enqueue(v['_id'], 5)
+            found += 1
+
+        if run and cards:
+            # Only checkpoint pages whose cards are already saved + queued
+            progress['items'] += len(cards)
+            progress['found'] += found
+            await run.save_state('kuaishou', {**progress, 'pcursor': cards[-1].get('pcursor', ''), 'pages': cards[-1].get('page', 0)})
+        return found
+
+    paused_jobs = []
+
+    async def on_resumed(found_after: int) -> None:
+        # The step was left open while the captcha job was pending; the continuation closes it
+        if run:
+            await run.complete('kuaishou', progress['found'])
+            print(f"[Kuaishou] captcha continuation queued {found_after} videos; step completed in run {run.id}")
+
+    # `resume` is a cursor stored on a captcha job (see captcha_pauses)
+    resume = run.state('kuaishou') if run else (resume or {})
+    progress = {'items': int(resume.get('items') or 0), 'found': int(resume.get('found') or 0)}
+    stream = _stream_kuaishou_cards(resume, on_resume=handle, on_paused=paused_jobs.append, on_resumed=on_resumed)
+    found = await _run_discovery_pipeline('kuaishou', stream, handle)
+    # Include items queued before an interruption of this run
+    found += int(resume.get('found') or 0)
 
     duration = int((time.time() - started) * 1000)
-    log_job('discover', 'success', platform='kuaishou', itemsFound=found, duration=duration)
+    await log_job('discover', 'success', platform='kuaishou', itemsFound=found, duration=duration)
 
     print(f'[Kuaishou] -> queued {found} videos')
+    if paused_jobs:
+        return {'success': True, 'itemsFound': found, 'captchaJobId': str(paused_jobs[-1])}
     return {'success': True, 'itemsFound': found}
 
 async def discover_dailyhaha(topic: str):
-    setting = get_or_create_settings()
-    keywords = setting.get('keywords', {}).get(topic, [topic])
     # Dailyhaha: lấy tất, không filter theo views/topic nữa
     cards = await _collect_dailyhaha_cards()
     found = 0
@@ -1838,7 +1842,7 @@ async def discover_dailyhaha(topic: str):
             continue
 
 
-        existing = videos.find_one({'platform': 'dailyhaha', 'videoId': video_slug})
+        existing = await videos.find_one({'platform': 'dailyhaha', 'videoId': video_slug})
         if existing:
             continue
 
@@ -1850,8 +1854,8 @@ async def discover_dailyhaha(topic: str):
         if not youtube_id or not YOUTUBE_VIDEO_ID_RE.match(youtube_id):
             continue
 
-        channel = upsert_channel('dailyhaha', DAILYHAHA_CHANNEL_ID, 'DailyHaha', topic)
-        v = upsert_video(
+        channel = await upsert_channel('dailyhaha', DAILYHAHA_CHANNEL_ID, 'DailyHaha', topic)
+        v = await upsert_video(
             {
                 'platform': 'dailyhaha',
                 'videoId': video_slug,
@@ -1863,6 +1867,8 @@ async def discover_dailyhaha(topic: str):
                 'channelId': channel['_id'],
             }
         )
+        if v is None:
+            continue
         await enqueue(v['_id'], 1 if views > 1_000_000 else 5)
         found += 1
 
@@ -1893,8 +1899,8 @@ async def _douyin_has_captcha(page) -> bool:
         return False
 
 
-def _log_douyin_captcha_event(topic: str, url: str, reason: str = '') -> None:
-    log_job(
+async def _log_douyin_captcha_event(topic: str, url: str, reason: str = '', resume_state: Dict | None = None):
+    return await log_job(
         'captcha',
         'paused_captcha',
         platform='douyin',
@@ -1902,219 +1908,253 @@ def _log_douyin_captcha_event(topic: str, url: str, reason: str = '') -> None:
         error=reason or 'douyin captcha detected',
         source='douyin-search',
         targetUrl=url,
+        resumeState=resume_state or {},
         resolved=False,
         resolvedAt=None,
     )
 
 
-async def _collect_douyin_cards(topic: str) -> List[Dict]:
+def _douyin_cards_from_raw(raw_cards: List[Dict], topic: str, seen: set) -> List[Dict]:
+    cards: List[Dict] = []
+    for item in raw_cards or []:
+        url = str(item.get('url') or '').strip()
+        video_id = extract_douyin_id(url)
+        if not url or not video_id.isdigit() or video_id in seen:
+            continue
+        seen.add(video_id)
+
+        channel_url = str(item.get('channel_url') or '').strip()
+        channel_match = re.search(r'/user/([^/?]+)', channel_url)
+        channel_id = channel_match.group(1) if channel_match else f'dy-{video_id[:8]}'
+
+        title = str(item.get('title') or '').strip()
+        cards.append({
+            'video_id': video_id,
+            'url': f'https://www.douyin.com/video/{video_id}',
+            'title': title[:180] if title else f'Douyin video {video_id}',
+            'views': 100001,
+            'channel_id': channel_id,
+            'channel_name': str(item.get('channel_name') or '').strip() or f'douyin-{channel_id[:12]}',
+            'thumbnail': '',
+            'search_topic': topic,
+        })
+    return cards
+
+
+async def _stream_douyin_search_page(page, topic: str, timeout_ms: int, seen: set, navigate: bool = True, proxy: str | None = None):
+    """Scrape one Douyin search page, yielding new cards after each scroll step (navigate=False continues in place)."""
     keyword = DOUYIN_TOPIC_KEYWORDS.get(topic, topic)
     search_url = DOUYIN_SEARCH_BASE.format(keyword=quote(keyword))
-    print(f'[douyin] search topic={topic} keyword={keyword} url={search_url}')
 
-    cards: List[Dict] = []
+    if navigate:
+        print(f'[douyin] search topic={topic} keyword={keyword} url={search_url}')
+        await _goto(page, search_url, proxy, wait_until='domcontentloaded', timeout=timeout_ms)
+        await asyncio.sleep(3)
+
+        if await _douyin_has_captcha(page):
+            raise CaptchaPaused(search_url, {'topic': topic}, 'captcha detected at page load')
+
+    found = 0
+    async for _ in human_scroll_steps(page, 8):
+        if await _douyin_has_captcha(page):
+            raise CaptchaPaused(search_url, {'topic': topic}, 'captcha detected after scroll')
+
+        cards = _douyin_cards_from_raw(await extract_cards(page, 'douyin-search', skip=seen), topic, seen)
+        if cards:
+            found += len(cards)
+            yield cards
+
+    print(f'[douyin] collected {found} cards for topic={topic}')
+
+
+async def _stream_douyin_topics(page, topics: List[str], timeout_ms: int, seen: set, navigate_first: bool = True, proxy: str | None = None):
+    """Search `topics` one after another on the same page; CaptchaPaused.state['topics'] lists what is left."""
+    for index, topic in enumerate(topics):
+        if index:
+            await asyncio.sleep(2 + random.random() * 2)
+        try:
+            async for cards in _stream_douyin_search_page(page, topic, timeout_ms, seen, navigate=navigate_first or index > 0, proxy=proxy):
+                yield cards
+        except CaptchaPaused as paused:
+            paused.state['topics'] = list(topics[index:])
+            raise
+
+
+async def _hold_douyin_captcha(paused: CaptchaPaused, stack: AsyncExitStack, context, page, timeout_ms: int, seen: set, on_resume, proxy: str | None = None) -> None:
+    topics = paused.state.get('topics') or []
+    job_id = await _log_douyin_captcha_event(topics[0] if topics else '', paused.url, paused.reason, paused.state)
+    print(f'[douyin] {paused.reason}; waiting for manual resolve')
+    if on_resume is None:
+        return
+
+    async def continuation() -> int:
+        # Same page: the current topic keeps its scroll position, the remaining topics follow
+        stream = _stream_douyin_topics(page, topics, timeout_ms, seen, navigate_first=False, proxy=proxy)
+        return await _run_discovery_pipeline('douyin (after captcha)', stream, on_resume)
+
+    await captcha_pauses.hold(job_id, 'douyin', stack, context, continuation, DOUYIN_STORAGE_STATE)
+
+
+async def _stream_douyin_cards_for_topics(topics: List[str], on_resume=None):
+    """
+    Run every topic search inside one browser session, deduplicating cards by video id.
+    On a captcha the browser lease is handed to captcha_pauses and `on_resume` handles the batches
+    collected after the job is resolved.
+    """
+    seen = set()
     pool = _proxy_pool()
     attempts = max(len(pool), 1)
+    last_error = None
+    paused = False
 
+    tried = []
     for i in range(attempts):
         timeout_ms = FAIL_FAST_TIMEOUTS_MS[min(i, len(FAIL_FAST_TIMEOUTS_MS) - 1)]
-        proxy = await _next_healthy_proxy() if pool else None
+        proxy = proxy_manager.pick('www.douyin.com', exclude=tried, session='douyin') if pool else None
+        tried.append(proxy)
         if pool and not proxy:
             print('[douyin] no healthy proxy available')
             break
 
         proxy_cfg = _proxy_for_playwright(proxy) if proxy else None
+        context_kwargs = {
+            'user_agent': random.choice(UA),
+            'locale': SCRAPER_LOCALE,
+            'timezone_id': SCRAPER_TIMEZONE,
+            'viewport': {'width': 1366, 'height': 920},
+        }
+        if DOUYIN_STORAGE_STATE and os.path.exists(DOUYIN_STORAGE_STATE):
+            context_kwargs['storage_state'] = DOUYIN_STORAGE_STATE
 
         try:
-            async with async_playwright() as p:
-                launch_kwargs = {'headless': SCRAPER_HEADLESS, 'args': ['--no-default-browser-check']}
-                if proxy_cfg:
-                    launch_kwargs['proxy'] = proxy_cfg
-
-                browser = await p.chromium.launch(**launch_kwargs)
-                context = await browser.new_context(
-                    user_agent=random.choice(UA),
-                    locale=SCRAPER_LOCALE,
-                    timezone_id=SCRAPER_TIMEZONE,
-                    viewport={'width': 1366, 'height': 920},
-                )
+            async with AsyncExitStack() as stack:
+                context = await stack.enter_async_context(browser_pool.lease(proxy_cfg, source='douyin', **context_kwargs))
                 page = await context.new_page()
 
                 try:
-                    await page.goto(search_url, wait_until='domcontentloaded', timeout=timeout_ms)
-                    await asyncio.sleep(3)
-
-                    if await _douyin_has_captcha(page):
-                        _log_douyin_captcha_event(topic, search_url, 'captcha detected at page load')
-                        print('[douyin] captcha detected at page load; waiting for manual resolve')
-                        return []
-
-                    await human_scroll(page, 8)
-
-                    if await _douyin_has_captcha(page):
-                        _log_douyin_captcha_event(topic, search_url, 'captcha detected after scroll')
-                        print('[douyin] captcha detected after scroll; waiting for manual resolve')
-                        return []
-
-                    raw_cards = await page.evaluate(
-                        """() => {
-                            const normalize = (href) => {
-                                if (!href) return '';
-                                if (href.startsWith('http')) return href;
-                                if (href.startsWith('//')) return `https:${href}`;
-                                return `https://www.douyin.com${href}`;
-                            };
-
-                            const links = Array.from(document.querySelectorAll('a[href*="/video/"]'));
-                            const out = [];
-                            const seen = new Set();
-
-                            for (const link of links) {
-                                const videoUrl = normalize(link.getAttribute('href'));
-                                if (!videoUrl || seen.has(videoUrl)) continue;
-                                seen.add(videoUrl);
-
-                                const card = link.closest('li, article, div');
-                                const titleNode = card?.querySelector('h3, h4, [data-e2e*="desc"], [data-e2e*="title"]');
-                                const title = (titleNode?.textContent || link.textContent || '').trim();
-
-                                const channelLink = card?.querySelector('a[href*="/user/"]');
-                                const channelUrl = normalize(channelLink?.getAttribute('href') || '');
-                                const channelName = (channelLink?.textContent || '').trim();
-
-                                out.push({
-                                    url: videoUrl,
-                                    title,
-                                    channel_url: channelUrl,
-                                    channel_name: channelName,
-                                });
-
-                                if (out.length >= 80) break;
-                            }
-
-                            return out;
-
-                        }"""
-                    )
-
-                    for item in raw_cards or []:
-                        url = str(item.get('url') or '').strip()
-                        video_id = extract_douyin_id(url)
-                        if not url or not video_id.isdigit():
-                            continue
-
-                        channel_url = str(item.get('channel_url') or '').strip()
-                        channel_match = re.search(r'/user/([^/?]+)', channel_url)
-                        channel_id = channel_match.group(1) if channel_match else f'dy-{video_id[:8]}'
-
-                        title = str(item.get('title') or '').strip()
-                        cards.append({
-                            'video_id': video_id,
-                            'url': f'https://www.douyin.com/video/{video_id}',
-                            'title': title[:180] if title else f'Douyin video {video_id}',
-                            'views': 100001,
-                            'channel_id': channel_id,
-                            'channel_name': str(item.get('channel_name') or '').strip() or f'douyin-{channel_id[:12]}',
-                            'thumbnail': '',
-                        })
-
-                    print(f'[douyin] collected {len(cards)} cards for topic={topic}')
-                finally:
-                    await context.close()
-                    await browser.close()
+                    async for cards in _stream_douyin_topics(page, topics, timeout_ms, seen, proxy=proxy):
+                        yield cards
+                except CaptchaPaused as captcha:
+                    proxy_manager.record(proxy, 'www.douyin.com', False, error='captcha')
+                    # Keep the context (cookies, page, scroll position) open until the captcha job is resolved
+                    await _hold_douyin_captcha(captcha, stack, context, page, timeout_ms, seen, on_resume, proxy)
+                    paused = True
+                    break
 
-                if cards:
+                if seen:
                     break
 
-        except PlaywrightTimeoutError:
-            print(f'[douyin] timeout {timeout_ms}ms with proxy {_mask_proxy(proxy)}')
+        except PlaywrightTimeoutError as ex:
+            if seen:
+                break
+            last_error = ex
+            print(f'[douyin] timeout {timeout_ms}ms with proxy {mask_proxy(proxy)}')
             continue
         except Exception as ex:
-            print(f'[douyin] collect failed with proxy {_mask_proxy(proxy)}: {ex}')
+            if seen:
+                break
+            last_error = ex
+            print(f'[douyin] collect failed with proxy {mask_proxy(proxy)}: {ex}')
             continue
 
-    return cards
+    if seen or paused:
+        return
+    # Raise so run_step leaves the step incomplete instead of saving a failed collect as 0 items
+    if last_error:
+        raise RuntimeError(f'Douyin collect failed after all retries: {last_error}')
+    if pool and not any(tried):
+        raise RuntimeError('Douyin collect failed: no healthy proxy available')
 
 
 async def discover_douyin(topic: str):
-    setting = get_or_create_settings()
+    setting = await get_or_create_settings()
     keywords = setting.get('keywords', {}).get(topic, [topic])
-    cards = await _collect_douyin_cards(topic)
-    found = 0
+    async def handle(cards: List[Dict]) -> int:
+        found = 0
+        for card in cards:
+            title = card.get('title', '')
+            if not match_topic(title, topic, keywords) and topic != 'funny':
+                # Topic Chinese keyword đã lọc theo query; vẫn giữ check title cho đồng nhất
+                continue
 
-    for card in cards:
-        title = card.get('title', '')
-        if not match_topic(title, topic, keywords) and topic != 'funny':
-            # Topic Chinese keyword đã lọc theo query; vẫn giữ check title cho đồng nhất
-            continue
+            video_id = card.get('video_id', '')
+            if not video_id:
+                continue
 
-        video_id = card.get('video_id', '')
-        if not video_id:
-            continue
+            existing = await videos.find_one({'platform': 'douyin', 'videoId': video_id})
+            if existing:
+                continue
 
-        existing = videos.find_one({'platform': 'douyin', 'videoId': video_id})
-        if existing:
-            continue
+            channel = await upsert_channel('douyin', card.get('channel_id') or f'dy-{video_id[:8]}', card.get('channel_name') or 'douyin-channel', topic)
+            v = await upsert_video(
+                {
+                    'platform': 'douyin',
+                    'videoId': video_id,
+                    'title': title,
+                    'views': int(card.get('views', 100001) or 100001),
+                    'url': card.get('url') or f'https://www.douyin.com/video/{video_id}',
+                    'topic': topic,
+                    'thumbnail': card.get('thumbnail') or f'https://p3-dy.byteimg.com/obj/bytedance-obj/dybase/img/{video_id}',
+                    'channelId': channel['_id'],
+                }
+            )
+            if v is None:
+                continue
+            await enqueue(v['_id'], 5)
+            found += 1
+        return found
 
-        channel = upsert_channel('douyin', card.get('channel_id') or f'dy-{video_id[:8]}', card.get('channel_name') or 'douyin-channel', topic)
-        v = upsert_video(
-            {
-                'platform': 'douyin',
-                'videoId': video_id,
-                'title': title,
-                'views': int(card.get('views', 100001) or 100001),
-                'url': card.get('url') or f'https://www.douyin.com/video/{video_id}',
-                'topic': topic,
-                'thumbnail': card.get('thumbnail') or f'https://p3-dy.byteimg.com/obj/bytedance-obj/dybase/img/{video_id}',
-                'channelId': channel['_id'],
-            }
-        )
-        await enqueue(v['_id'], 5)
-        found += 1
+    found = await _run_discovery_pipeline(f'douyin {topic}', _stream_douyin_cards_for_topics([topic], on_resume=handle), handle)
 
     print(f'[Douyin {topic}] -> queued {found} videos')
     return found
 
 
 async def discover_playboard(config: Dict, topic: str):
-    setting = get_or_create_settings()
+    setting = await get_or_create_settings()
     # Giảm default minViews cho Playboard xuống 200k như yêu cầu
     min_views = int(setting.get('minViewsFilter', 200000) or 200000)
-    topic_keywords = setting.get('keywords', {}).get(topic, [topic])
 
     url = build_playboard_url(config)
     print(f"[discover_playboard] Collecting cards from {url[:80]}...")
-    cards = await _collect_playboard_cards(url)
-    print(f"[discover_playboard] Collected {len(cards) if cards else 0} cards from Playboard")
-
-    # Filter ONLY by views + valid url (không bắt buộc match topic cho Playboard)
-    filtered_cards = []
-    for i, card in enumerate(cards or []):
-        title = card.get('title', '')
-        views = card.get('views', 0)
-        video_url = card.get('url', '')
+    totals = {'success': 0, 'queued': 0, 'failed': 0, 'collected': 0, 'passed': 0}
+
+    async def handle(cards: List[Dict]) -> int:
+        # Filter ONLY by views + valid url (không bắt buộc match topic cho Playboard)
+        filtered_cards = []
+        for card in cards:
+            totals['collected'] += 1
+            i = totals['collected']
+            title = card.get('title', '')
+            views = card.get('views', 0)
+            video_url = card.get('url', '')
 
-        if views < min_views or not video_url:
-            print(f"[discover_playboard] Card {i+1}: Filtered (views={views:,}, url={bool(video_url)})")
-            continue
+            if views < min_views or not video_url:
+                print(f"[discover_playboard] Card {i}: Filtered (views={views:,}, url={bool(video_url)})")
+                continue
 
-        # Không cần check match_topic nữa để flexible hơn
-        filtered_cards.append(card)
-        print(f"[discover_playboard] Card {i+1}: Passed filter - {title[:40]}")
+            # Không cần check match_topic nữa để flexible hơn
+            filtered_cards.append(card)
+            print(f"[discover_playboard] Card {i}: Passed filter - {title[:40]}")
 
-    print(f"[discover_playboard] {len(filtered_cards)} cards passed filters for topic {topic}")
+        if not filtered_cards:
+            return 0
 
-    # Process filtered cards (save channels, videos, queue download)
-    if filtered_cards:
+        # Process each batch as soon as it is scraped (save channels, videos, queue download)
+        totals['passed'] += len(filtered_cards)
         result = await process_playboard_cards(filtered_cards, topic)
-        found = result.get('success', 0)
-        queued = result.get('queued', 0)
-        failed = result.get('failed', 0)
-    else:
-        print(f"[discover_playboard] No cards to process, skipping")
-        found = 0
-        queued = 0
-        failed = 0
+        totals['success'] += result.get('success', 0)
+        totals['queued'] += result.get('queued', 0)
+        totals['failed'] += result.get('failed', 0)
+        return result.get('queued', 0)
+
+    await _run_discovery_pipeline('playboard', _stream_playboard_cards(url), handle)
+    print(f"[discover_playboard] Collected {totals['collected']} cards from Playboard")
+    print(f"[discover_playboard] {totals['passed']} cards passed filters for topic {topic}")
+
+    found = totals['success']
+    queued = totals['queued']
+    failed = totals['failed']
 
     print(f"[Playboard {topic} | {config.get('category')} {config.get('country')} {config.get('period')}] -> Found {found} videos, Queued {queued} for download")
     return {
@@ -2128,56 +2168,238 @@ async def discover_playboard(config: Dict, topic: str):
 
 
 async def discover_youtube(topic: str):
-    setting = get_or_create_settings()
+    setting = await get_or_create_settings()
     min_views = setting.get('minViewsFilter', 100000)
     keywords = setting.get('keywords', {}).get(topic, [topic])
-    cards = await _collect_youtube_cards(topic, keywords)
+    async def handle(cards: List[Dict]) -> int:
+        found = 0
+        for card in cards:
+            title = card.get('title', '')
+            views = card.get('views', 0)
+            video_url = card.get('url', '')
+            if views < min_views or not video_url:
+                continue
+            if not match_topic(title, topic, keywords):
+                continue
+
+            video_id = extract_youtube_id(video_url)
+            if not video_id:
+                continue
+
+            # Save mới nếu chưa có, đã có thì bỏ qua
+            existing = await videos.find_one({'platform': 'youtube', 'videoId': video_id})
+            if existing:
+                continue
+
+            ch = await upsert_channel('youtube', card.get('channel_id') or f'yt-{video_id[:8]}', card.get('channel_name') or 'youtube-channel', topic)
+            v = await upsert_video(
+                {
+                    'platform': 'youtube',
+                    'videoId': video_id,
+                    'title': title,
+                    'views': views,
+                    'url': video_url,
+                    'topic': topic,
+                    'thumbnail': f'https://img.youtube.com/vi/{video_id}/maxresdefault.jpg',
+                    'channelId': ch['_id'],
+                }
+            )
+            if v is None:
+                continue
+            await enqueue(v['_id'], 1 if views > 1_000_000 else 5)
+            found += 1
+        return found
+
+    found = await _run_discovery_pipeline(f'youtube {topic}', _stream_youtube_cards(topic, keywords), handle)
+
+    return found
+
+
+async def discover_youtube_fanout(topics: List[str] | None = None):
+    """Run a single YouTube search covering every topic and tag each card with all topics it matches."""
+    topics = list(topics or TOPICS)
+    setting = await get_or_create_settings()
+    min_views = setting.get('minViewsFilter', 100000)
+    keywords_by_topic = setting.get('keywords', {}) or {}
+    query = _build_youtube_fanout_query(topics, keywords_by_topic)
+    async def handle(cards: List[Dict]) -> int:
+        found = 0
+        for card in cards:
+            title = card.get('title', '')
+            views = card.get('views', 0)
+            video_url = card.get('url', '')
+            if views < min_views or not video_url:
+                continue
+            matched = classify_topics(title, topics, keywords_by_topic)
+            if not matched:
+                continue
+
+            video_id = extract_youtube_id(video_url)
+            if not video_id:
+                continue
+
+            existing = await videos.find_one({'platform': 'youtube', 'videoId': video_id})
+            if existing:
+                continue
 
+            ch = await upsert_channel('youtube', card.get('channel_id') or f'yt-{video_id[:8]}', card.get('channel_name') or 'youtube-channel', matched)
+            v = await upsert_video(
+                {
+                    'platform': 'youtube',
+                    'videoId': video_id,
+                    'title': title,
+                    'views': views,
+                    'url': video_url,
+                    'topics': matched,
+                    'thumbnail': f'https://img.youtube.com/vi/{video_id}/maxresdefault.jpg',
+                    'channelId': ch['_id'],
+                }
+            )
+            if v is None:
+                continue
+            await enqueue(v['_id'], 1 if views > 1_000_000 else 5)
+            found += 1
+        return found
+
+    found = await _run_discovery_pipeline('youtube fan-out', _stream_youtube_cards(topics[0], [], query=query), handle)
+
+    print(f'[YouTube fan-out {len(topics)} topics] -> queued {found} videos')
+    return found
+
+
+async def discover_dailyhaha_fanout(topics: List[str] | None = None):
+    """Fetch the DailyHaha listing once and attach every matching topic (first topic as fallback)."""
+    topics = list(topics or TOPICS)
+    setting = await get_or_create_settings()
+    keywords_by_topic = setting.get('keywords', {}) or {}
+    cards = await _collect_dailyhaha_cards()
     found = 0
+
     for card in cards:
         title = card.get('title', '')
-        views = card.get('views', 0)
-        video_url = card.get('url', '')
-        if views < min_views or not video_url:
-            continue
-        if not match_topic(title, topic, keywords):
+        views = int(card.get('views', 0) or 0)
+        page_url = card.get('url', '')
+        if not page_url:
             continue
 
-        video_id = extract_youtube_id(video_url)
-        if not video_id:
+        video_slug = page_url.rstrip('/').split('/')[-1].replace('.htm', '').strip()
+        if not video_slug:
             continue
 
-        # Save mới nếu chưa có, đã có thì bỏ qua
-        existing = videos.find_one({'platform': 'youtube', 'videoId': video_id})
+        existing = await videos.find_one({'platform': 'dailyhaha', 'videoId': video_slug})
         if existing:
             continue
 
-        ch = upsert_channel('youtube', card.get('channel_id') or f'yt-{video_id[:8]}', card.get('channel_name') or 'youtube-channel', topic)
-        v = upsert_video(
+        youtube_url = await _resolve_dailyhaha_youtube_url(page_url)
+        if not youtube_url:
+            continue
+
+        youtube_id = extract_youtube_id(youtube_url)
+        if not youtube_id or not YOUTUBE_VIDEO_ID_RE.match(youtube_id):
+            continue
+
+        # DailyHaha keeps every card, so unmatched titles fall back to the first topic
+        matched = classify_topics(title, topics, keywords_by_topic) or topics[:1]
+        channel = await upsert_channel('dailyhaha', DAILYHAHA_CHANNEL_ID, 'DailyHaha', matched)
+        v = await upsert_video(
             {
-                'platform': 'youtube',
-                'videoId': video_id,
+                'platform': 'dailyhaha',
+                'videoId': video_slug,
                 'title': title,
                 'views': views,
-                'url': video_url,
-                'topic': topic,
-                'thumbnail': f'https://img.youtube.com/vi/{video_id}/maxresdefault.jpg',
-                'channelId': ch['_id'],
+                'url': youtube_url,
+                'topics': matched,
+                'thumbnail': card.get('thumbnail') or f'https://img.youtube.com/vi/{youtube_id}/maxresdefault.jpg',
+                'channelId': channel['_id'],
             }
         )
+        if v is None:
+            continue
         await enqueue(v['_id'], 1 if views > 1_000_000 else 5)
         found += 1
 
+    print(f'[DailyHaha fan-out {len(topics)} topics] -> queued {found} videos')
     return found
 
 
-async def discover_all():
+async def discover_douyin_fanout(topics: List[str] | None = None):
+    """Search every topic keyword in one Douyin session and classify cards against all topics."""
+    topics = list(topics or TOPICS)
+    setting = await get_or_create_settings()
+    keywords_by_topic = setting.get('keywords', {}) or {}
+    async def handle(cards: List[Dict]) -> int:
+        found = 0
+        for card in cards:
+            title = card.get('title', '')
+            matched = classify_topics(title, topics, keywords_by_topic)
+            # Same exception as discover_douyin: the 'funny' search keyword is trusted without a title match
+            search_topic = card.get('search_topic')
+            if search_topic == 'funny' and search_topic not in matched:
+                matched.insert(0, search_topic)
+            if not matched:
+                continue
+
+            video_id = card.get('video_id', '')
+            if not video_id:
+                continue
+
+            existing = await videos.find_one({'platform': 'douyin', 'videoId': video_id})
+            if existing:
+                continue
+
+            channel = await upsert_channel('douyin', card.get('channel_id') or f'dy-{video_id[:8]}', card.get('channel_name') or 'douyin-channel', matched)
+            v = await upsert_video(
+                {
+                    'platform': 'douyin',
+                    'videoId': video_id,
+                    'title': title,
+                    'views': int(card.get('views', 100001) or 100001),
+                    'url': card.get('url') or f'https://www.douyin.com/video/{video_id}',
+                    'topics': matched,
+                    'thumbnail': card.get('thumbnail') or f'https://p3-dy.byteimg.com/obj/bytedance-obj/dybase/img/{video_id}',
+                    'channelId': channel['_id'],
+                }
+            )
+            if v is None:
+                continue
+            await enqueue(v['_id'], 5)
+            found += 1
+        return found
+
+    found = await _run_discovery_pipeline('douyin fan-out', _stream_douyin_cards_for_topics(topics, on_resume=handle), handle)
+
+    print(f'[Douyin fan-out {len(topics)} topics] -> queued {found} videos')
+    return found
+
+
+async def discover_all(resume: bool = True):
     started = time.time()
-    setting = get_or_create_settings()
+    setting = await get_or_create_settings()
     if not setting.get('isEnabled', True):
         return {'skipped': True}
 
-    found = 0
+    # Một run / cron window: chạy lại trong cùng window sẽ tiếp tục từ step cuối đã xong
+    window_start = schedule_window_start(setting.get('cronTimes', {}).get('discover', '0 7 * * *'))
+    run = await DiscoveryRun.open('discover', window_start, resume=resume)
+
+    async def run_step(step: str, coro_fn):
+        if run.is_done(step):
+            print(f'[DEBUG] skip {step}: already completed in run {run.id}')
+            return
+        try:
+            result = await coro_fn()
+        except Exception as e:
+            # Collectors raise when they end on an error with nothing collected; the step stays
+            # incomplete so a resumed run retries it
+            print(f'[DEBUG] {step} failed: {e}')
+            return
+        if isinstance(result, dict) and result.get('captchaJobId'):
+            # The captcha continuation completes the step once the job is resolved
+            print(f"[DEBUG] {step} paused on captcha job {result['captchaJobId']}; left incomplete")
+            return
+        items = result.get('itemsFound', 0) if isinstance(result, dict) else result
+        await run.complete(step, int(items or 0))
+
     try:
         discover_sources = setting.get('discoverSources', {}) or {}
         use_playboard = discover_sources.get('playboard', True)
@@ -2202,59 +2424,60 @@ async def discover_all():
         print(
             '[DEBUG] Running discover with '
             f'{len(active_configs)} active configs '
-            f'| sources: playboard={use_playboard}, youtube={use_youtube}, dailyhaha={use_dailyhaha}, douyin={use_douyin}, kuaishou={use_kuaishou}'
+            f'| sources: playboard={use_playboard}, youtube={use_youtube}, dailyhaha={use_dailyhaha}, douyin={use_douyin}, kuaishou={use_kuaishou} '
+            f'| run={run.id} resumed={run.resumed}'
         )
 
         # 1) Playboard: chạy theo từng config (category/country/period), không loop theo từng topic
         if use_playboard:
             for cfg in active_configs:
+                step = f"playboard:{cfg.get('dimension', 'most-viewed')}|{cfg.get('category', 'All')}|{cfg.get('country', 'Worldwide')}|{cfg.get('period', 'weekly')}"
+                if run.is_done(step):
+                    print(f'[DEBUG] skip {step}: already completed in run {run.id}')
+                    continue
                 await asyncio.sleep(12 + random.random() * 5)
-                try:
-                    topic_label = f"playboard-{cfg.get('category', 'All')}-{cfg.get('country', 'Worldwide')}-{cfg.get('period', 'weekly')}"
-                    print(
-                        f"[DEBUG] Discovering Playboard with config: {cfg.get('category')} / {cfg.get('country')} / {cfg.get('period')} -> topic={topic_label}"
-                    )
-                    result = await discover_playboard(cfg, topic_label)
-                    found += int(result.get('itemsFound', 0))
-                except Exception as e:
-                    print(f"[DEBUG] discover_playboard failed: {e}")
-
-        if use_kuaishou:
-            try:
-                await asyncio.sleep(6 + random.random() * 3)
-                result = await discover_kuaishou()
-                found += int(result.get('itemsFound', 0))
-            except Exception as e:
-                print(f"[DEBUG] discover_kuaishou failed: {e}")
-
-        # 2) Các nguồn khác vẫn loop theo TOPICS
-        for topic in TOPICS:
-            try:
+                topic_label = f"playboard-{cfg.get('category', 'All')}-{cfg.get('country', 'Worldwide')}-{cfg.get('period', 'weekly')}"
+                print(
+                    f"[DEBUG] Discovering Playboard with config: {cfg.get('category')} / {cfg.get('country')} / {cfg.get('period')} -> topic={topic_label}"
+                )
+                await run_step(step, lambda cfg=cfg, topic_label=topic_label: discover_playboard(cfg, topic_label))
+
+        if use_kuaishou and not run.is_done('kuaishou'):
+            await asyncio.sleep(6 + random.random() * 3)
+            await run_step('kuaishou', lambda: discover_kuaishou(run=run))
+
+        # 2) Các nguồn khác: fan-out (collect 1 lần, classify theo tất cả TOPICS) hoặc loop theo TOPICS
+        if setting.get('discoverFanout', True):
+            if use_youtube:
+                await run_step('youtube-fanout', lambda: discover_youtube_fanout(TOPICS))
+            if use_dailyhaha:
+                await run_step('dailyhaha-fanout', lambda: discover_dailyhaha_fanout(TOPICS))
+            if use_douyin:
+                await run_step('douyin-fanout', lambda: discover_douyin_fanout(TOPICS))
+        else:
+            for topic in TOPICS:
                 if use_youtube:
-                    found += await discover_youtube(topic)
-            except Exception as e:
-                print(f"[DEBUG] discover_youtube failed: {e}")
-            try:
+                    await run_step(f'youtube:{topic}', lambda topic=topic: discover_youtube(topic))
                 if use_dailyhaha:
-                    found += await discover_dailyhaha(topic)
-            except Exception as e:
-                print(f"[DEBUG] discover_dailyhaha failed: {e}")
-            try:
+                    await run_step(f'dailyhaha:{topic}', lambda topic=topic: discover_dailyhaha(topic))
                 if use_douyin:
-                    found += await discover_douyin(topic)
-            except Exception as e:
-                print(f"[DEBUG] discover_douyin failed: {e}")
-
-
-        log_job('discover', 'success', itemsFound=found, duration=int((time.time() - started) * 1000))
-        return {'success': True, 'itemsFound': found}
+                    await run_step(f'douyin:{topic}', lambda topic=topic: discover_douyin(topic))
+
+        found = run.items_found
+        await run.finish('success')
+        await log_job('discover', 'success', itemsFound=found, duration=int((time.time() - started) * 1000), runId=str(run.id), resumed=run.resumed)
+        return {'success': True, 'itemsFound': found, 'runId': str(run.id), 'resumed': run.resumed}
+    except asyncio.CancelledError:
+        await run.finish('interrupted')
+        raise
     except Exception as ex:
-        log_job('discover', 'failed', itemsFound=found, duration=int((time.time() - started) * 1000), error=str(ex))
+        await run.finish('interrupted', error=str(ex))
+        await log_job('discover', 'failed', itemsFound=run.items_found, duration=int((time.time() - started) * 1000), error=str(ex), runId=str(run.id))
         raise
 
 
 async def scan_single_channel(channel, use_proxy: bool = True, headless_override: bool | None = None):
-    setting = get_or_create_settings()
+    setting = await get_or_create_settings()
     min_views = setting.get('minViewsFilter', 100000)
 
     channel_id = channel.get('channelId', '')
@@ -2270,13 +2493,13 @@ async def scan_single_channel(channel, use_proxy: bool = True, headless_override
         else:
             # Fallback: treat as handle without @
             target_url = f'https://www.youtube.com/@{channel_id}/shorts'
-        link_selector = 'a[href*="/shorts/"]'
+        extract_source = 'youtube-shorts'
     elif platform == 'douyin':
         target_url = f'https://www.douyin.com/user/{channel_id}'
-        link_selector = 'a[href*="/video/"]'
+        extract_source = 'douyin-channel'
     else:
         target_url = f'https://www.facebook.com/{channel_id}/reels'
-        link_selector = 'a[href*="/reel/"]'
+        extract_source = 'facebook-reels'
 
     print(f"[DEBUG] Scan target URL for {channel_id}: {target_url}")
 
@@ -2284,9 +2507,11 @@ async def scan_single_channel(channel, use_proxy: bool = True, headless_override
     attempts = max(len(pool), 1)
     found = 0
 
+    tried = []
     for i in range(attempts):
         timeout_ms = FAIL_FAST_TIMEOUTS_MS[min(i, len(FAIL_FAST_TIMEOUTS_MS) - 1)]
-        proxy = await _next_healthy_proxy() if pool else None
+        proxy = proxy_manager.pick(urlparse(target_url).hostname, exclude=tried, session=f'channel:{channel_id}') if pool else None
+        tried.append(proxy)
         if pool and not proxy:
             print(f'[DEBUG] No healthy proxy for scan channel {channel_id}')
             break
@@ -2294,110 +2519,96 @@ async def scan_single_channel(channel, use_proxy: bool = True, headless_override
         proxy_cfg = _proxy_for_playwright(proxy) if proxy else None
 
         try:
-            async with async_playwright() as p:
-                launch_kwargs = {
-                    'headless': SCRAPER_HEADLESS if headless_override is None else headless_override,
-                    'args': ['--no-default-browser-check'],
-                }
-                if proxy_cfg:
-                    launch_kwargs['proxy'] = proxy_cfg
-
-                browser = await p.chromium.launch(**launch_kwargs)
-                context = await browser.new_context(
-                    user_agent=random.choice(UA),
-                    locale=SCRAPER_LOCALE,
-                    timezone_id=SCRAPER_TIMEZONE,
-                    viewport={'width': 1280, 'height': 900},
-                )
+            async with browser_pool.lease(
+                proxy_cfg,
+                headless=headless_override,
+                source='channel-scan',
+                user_agent=random.choice(UA),
+                locale=SCRAPER_LOCALE,
+                timezone_id=SCRAPER_TIMEZONE,
+                viewport={'width': 1280, 'height': 900},
+            ) as context:
                 page = await context.new_page()
 
-                try:
-                    await page.goto(target_url, wait_until='domcontentloaded', timeout=timeout_ms)
-                    await asyncio.sleep(4)
-                    await human_scroll(page, 8)
+                await _goto(page, target_url, proxy, wait_until='domcontentloaded', timeout=timeout_ms)
+                await asyncio.sleep(4)
+                await human_scroll(page, 8)
 
-                    links = page.locator(link_selector)
-                    count = await links.count()
-                    print(f'[DEBUG] Scan channel {channel_id}: {count} links')
+                cards = await extract_cards(page, extract_source, limit=40)
+                print(f'[DEBUG] Scan channel {channel_id}: {len(cards)} links')
 
-                    seen = set()
-                    for j in range(min(count, 40)):
-                        try:
-                            href = await links.nth(j).get_attribute('href')
-                            if not href:
-                                continue
-                            full = href if href.startswith('http') else (
-                                f'https://www.youtube.com{href}' if platform == 'youtube' else (
-                                    f'https://www.douyin.com{href}' if platform == 'douyin' else f'https://www.facebook.com{href}'
-                                )
-                            )
-                            if platform == 'youtube':
-                                video_id = extract_youtube_id(full)
-                            elif platform == 'douyin':
-                                video_id = extract_douyin_id(full)
-                            else:
-                                video_id = extract_reel_id(full)
-                            if not video_id or video_id in seen:
-                                continue
-                            seen.add(video_id)
-
-                            existing = videos.find_one({'platform': platform, 'videoId': video_id})
-                            if existing and existing.get('downloadStatus') == 'done':
-                                continue
-
-                            topic_value = channel.get('topics', 'hai')
-                            if isinstance(topic_value, list):
-                                topic_value = topic_value[0] if topic_value else 'hai'
-
-                            v = upsert_video(
-                                {
-                                    'platform': platform,
-                                    'videoId': video_id,
-                                    'title': f'{platform} video {video_id}',
-                                    'views': max(min_views, 100001),
-                                    'url': full,
-                                    'topic': topic_value,
-                                    'thumbnail': '',
-                                    'channelId': str(channel['_id']),
-                                }
-                            )
-                            await enqueue(v['_id'], 5)
-                            found += 1
-                        except Exception:
+                seen = set()
+                for card in cards:
+                    try:
+                        full = card.get('url') or ''
+                        if not full:
+                            continue
+                        if platform == 'youtube':
+                            video_id = extract_youtube_id(full)
+                        elif platform == 'douyin':
+                            video_id = extract_douyin_id(full)
+                        else:
+                            video_id = extract_reel_id(full)
+                        if not video_id or video_id in seen:
+                            continue
+                        seen.add(video_id)
+
+                        existing = await videos.find_one({'platform': platform, 'videoId': video_id})
+                        if existing and existing.get('downloadStatus') == 'done':
                             continue
 
-                finally:
-                    await context.close()
-                    await browser.close()
+                        topic_value = channel.get('topics', 'hai')
+                        if isinstance(topic_value, list):
+                            topic_value = topic_value[0] if topic_value else 'hai'
+
+                        v = await upsert_video(
+                            {
+                                'platform': platform,
+                                'videoId': video_id,
+                                'title': f'{platform} video {video_id}',
+                                'views': max(min_views, 100001),
+                                'url': full,
+                                'topic': topic_value,
+                                'thumbnail': '',
+                                'channelId': str(channel['_id']),
+                            }
+                        )
+                        if v is None:
+                            continue
+                        await enqueue(v['_id'], 5)
+                        found += 1
+                    except Exception:
+                        continue
+
 
                 break
 
         except PlaywrightTimeoutError:
-            print(f'[DEBUG] scan goto timeout {timeout_ms}ms for {channel_id} with proxy {_mask_proxy(proxy)} -> retry next proxy')
+            print(f'[DEBUG] scan goto timeout {timeout_ms}ms for {channel_id} with proxy {mask_proxy(proxy)} -> retry next proxy')
             continue
         except Exception as e:
-            print(f'[DEBUG] scan failed for {channel_id} with proxy {_mask_proxy(proxy)}: {e}')
+            print(f'[DEBUG] scan failed for {channel_id} with proxy {mask_proxy(proxy)}: {e}')
             continue
 
-    channels.update_one({'_id': channel['_id']}, {'$set': {'lastScanned': datetime.utcnow(), 'updatedAt': datetime.utcnow()}})
+    await channels.update_one({'_id': channel['_id']}, {'$set': {'lastScanned': datetime.utcnow(), 'updatedAt': datetime.utcnow()}})
     return found
 
 
 async def scan_all_channels(use_proxy: bool = True, headless_override: bool | None = None):
     started = time.time()
-    setting = get_or_create_settings()
+    setting = await get_or_create_settings()
     if not setting.get('isEnabled', True):
         return {'skipped': True}
 
     found = 0
     try:
-        for c in channels.find({'isActive': True}).sort([('priority', -1)]).limit(100):
+        async for c in channels.find({'isActive': True}).sort([('priority', -1)]).limit(100):
             found += await scan_single_channel(c, use_proxy=use_proxy, headless_override=headless_override)
 
-        log_job('scan-channel', 'success', itemsFound=found, duration=int((time.time() - started) * 1000))
+        await log_job('scan-channel', 'success', itemsFound=found, duration=int((time.time() - started) * 1000))
         return {'success': True, 'itemsFound': found}
     except Exception as ex:
-        log_job('scan-channel', 'failed', itemsFound=found, duration=int((time.time() - started) * 1000), error=str(ex))
+        await log_job('scan-channel', 'failed', itemsFound=found, duration=int((time.time() - started) * 1000), error=str(ex))
         raise
 
 
@@ -2409,19 +2620,11 @@ def build_download_path(video):
         return os.path.join(DOWNLOAD_ROOT, 'pexels', d, f"{video['videoId']}.mp4")
     if platform == 'kuaishou':
         return os.path.join(DOWNLOAD_ROOT, 'kuaishou', d, f"{video['videoId']}.mp4")
-    return os.path.join(DOWNLOAD_ROOT, video['platform'], video.get('topics', 'misc'), d, f"{video['videoId']}.mp4")
+    return os.path.join(DOWNLOAD_ROOT, video['platform'], primary_topic(video.get('topics')), d, f"{video['videoId']}.mp4")
 
 
-def _download_direct_sync(url: str, out_path: str, timeout_sec: int = 120) -> None:
-    if not url:
-        raise RuntimeError('missing url')
-    req = Request(url, headers={'User-Agent': random.choice(UA)})
-    with urlopen(req, timeout=timeout_sec) as resp, open(out_path, 'wb') as f:
-        while True:
-            chunk = resp.read(1024 * 1024)
-            if not chunk:
-                break
-            f.write(chunk)
+async def _download_direct(url: str, out_path: str, timeout_sec: int = 120, proxy: Optional[str] = None) -> None:
+    await download_to_file(url, out_path, timeout_sec=timeout_sec, headers={'User-Agent': random.choice(UA)}, proxy=proxy_url(proxy) if proxy else None)
 
 
 def _is_valid_download_target(doc: Dict) -> tuple[bool, str]:
@@ -2439,7 +2642,10 @@ def _is_valid_download_target(doc: Dict) -> tuple[bool, str]:
 
 
 async def cleanup_invalid_youtube_records(limit: int = 1000) -> dict:
-    """Delete obviously invalid YouTube records (e.g. test IDs, wrong format)."""
+    """Delete obviously invalid YouTube records (e.g. test IDs, wrong format) discovered since the last full pass."""
+    # Runs on every startup: only rows discovered after the stored watermark are checked (platform/discoveredAt index)
+    watermark = await stats_collection.find_one({'_id': CLEANUP_WATERMARK_ID}) or {}
+    started = datetime.utcnow()
     # Match any youtube platform with malformed videoId (not 11-char ID) or test urls
     query = {
         'platform': 'youtube',
@@ -2449,15 +2655,21 @@ async def cleanup_invalid_youtube_records(limit: int = 1000) -> dict:
             {'title': {'$regex': 'test', '$options': 'i'}},
         ],
     }
+    if watermark.get('checkedUntil'):
+        query['discoveredAt'] = {'$gte': watermark['checkedUntil']}
 
-    invalid_docs = list(videos.find(query, {'_id': 1, 'videoId': 1, 'url': 1}).limit(limit))
+    invalid_docs = await videos.find(query, {'_id': 1, 'videoId': 1, 'url': 1}).limit(limit).to_list()
+    if len(invalid_docs) < limit:
+        # Everything discovered before `started` has been checked
+        await stats_collection.update_one({'_id': CLEANUP_WATERMARK_ID}, {'$set': {'checkedUntil': started}}, upsert=True)
     if not invalid_docs:
         return {'deleted': 0, 'matched': 0}
 
     invalid_ids = [doc['_id'] for doc in invalid_docs]
-    res = videos.delete_many({'_id': {'$in': invalid_ids}})
+    res = await videos.delete_many({'_id': {'$in': invalid_ids}})
+    await transcript_store.delete(invalid_ids)
 
-    log_job(
+    await log_job(
         'cleanup-invalid-youtube',
         'success',
         deleted=res.deleted_count,
@@ -2467,14 +2679,15 @@ async def cleanup_invalid_youtube_records(limit: int = 1000) -> dict:
     return {'deleted': res.deleted_count, 'matched': len(invalid_docs)}
 
 
-def _desired_worker_count() -> int:
-    setting = get_or_create_settings() or {}
+async def _desired_worker_count() -> int:
+    setting = await get_or_create_settings() or {}
     configured = int(setting.get('maxConcurrentDownload') or 1)
     return max(1, configured)
 
 
 async def reset_orphaned_downloads() -> dict:
-    result = videos.update_many(
+    await video_state.flush()
+    result = await videos.update_many(
         {
             '$or': [
                 {'downloadStatus': 'downloading'},
@@ -2496,34 +2709,27 @@ async def reset_orphaned_downloads() -> dict:
 
 async def enqueue(video_id, priority=5, attempts=0, force=False):
     video_id = str(video_id)
-    doc = videos.find_one({'_id': ObjectId(video_id)}, {'downloadStatus': 1})
+    doc = await videos.find_one({'_id': ObjectId(video_id)}, {'downloadStatus': 1, 'queueState': 1, 'stateChangedAt': 1})
     if not doc:
         return False
 
-    current_status = str(doc.get('downloadStatus') or '').lower()
+    # A transition not flushed yet is newer than the stored status
+    current_status = str(DOWNLOAD_STATUS.get(video_state.current(video_id)) or doc.get('downloadStatus') or '').lower()
     if not force and current_status in {'done', 'downloading'}:
         return False
 
     if not force and (video_id in queued_video_ids or video_id in processing_video_ids):
         return False
 
+    if not video_state.transition(doc, 'queued', {'lastQueuedAt': datetime.utcnow()}):
+        return False
     queued_video_ids.add(video_id)
-    videos.update_one(
-        {'_id': ObjectId(video_id)},
-        {
-            '$set': {
-                'queueState': 'queued',
-                'lastQueuedAt': datetime.utcnow(),
-                'updatedAt': datetime.utcnow(),
-            }
-        },
-    )
     await queue.put((priority, video_id, attempts))
     return True
 
 
 async def start_worker():
-    target_count = _desired_worker_count()
+    target_count = await _desired_worker_count()
     while len(worker_tasks) < target_count:
         worker_index = len(worker_tasks) + 1
         worker_tasks.append(asyncio.create_task(_worker_loop(worker_index)))
@@ -2546,110 +2752,106 @@ async def _worker_loop(worker_index: int):
 
 async def process_download(video_id, attempts):
     started = time.time()
-    doc = videos.find_one({'_id': ObjectId(video_id)})
+    doc = await videos.find_one({'_id': ObjectId(video_id)})
     if not doc:
         return
 
     try:
         is_valid, invalid_reason = _is_valid_download_target(doc)
         if not is_valid:
-            videos.update_one(
-                {'_id': doc['_id']},
-                {'$set': {'downloadStatus': 'failed', 'queueState': 'failed', 'failReason': invalid_reason, 'updatedAt': datetime.utcnow()}},
-            )
-            log_job(
+            video_state.transition(doc, 'failed', {'failReason': invalid_reason})
+            await log_job(
                 'download',
                 'failed',
                 platform=doc.get('platform'),
-                topic=doc.get('topics'),
+                topic=primary_topic(doc.get('topics')),
+                topics=doc.get('topics'),
                 duration=int((time.time() - started) * 1000),
                 error=invalid_reason,
             )
             return
 
-        videos.update_one(
-            {'_id': doc['_id']},
-            {
-                '$set': {
-                    'downloadStatus': 'downloading',
-                    'queueState': 'downloading',
-                    'downloadAttempts': attempts + 1,
-                    'updatedAt': datetime.utcnow(),
-                }
-            },
-        )
+        if not video_state.transition(doc, 'downloading', {'downloadAttempts': attempts + 1}):
+            # Stale queue entry: already downloaded, or reset meanwhile
+            return
         out = build_download_path(doc)
         os.makedirs(os.path.dirname(out), exist_ok=True)
         platform = (doc.get('platform') or '').lower()
-        if platform in {'pexels', 'kuaishou'}:
-            await asyncio.to_thread(_download_direct_sync, doc['url'], out, YTDLP_TIMEOUT_SEC)
-        else:
-            format_candidates = [
-                'bv*[height<=1080]+ba/b[height<=1080]/best[height<=1080]',
-                'bv*+ba/b/best',
-                'best',
-            ]
-            last_reason = ''
-
-            for format_selector in format_candidates:
-                cmd = [
-                    'yt-dlp',
-                    doc['url'],
-                    '-f',
-                    format_selector,
-                    '-o',
-                    out,
-                    '--no-warnings',
-                    '--no-playlist',
-                    '--socket-timeout',
-                    '20',
-                    '--retries',
-                    '1',
-                    '--fragment-retries',
-                    '1',
-                    '--write-thumbnail',
-                    '--write-description',
+        direct = platform in {'pexels', 'kuaishou'}
+        # One proxy per job, spread over the healthy pool; aiohttp only speaks HTTP proxies, yt-dlp also SOCKS
+        async with proxy_manager.download_proxy(doc['url'], supports_socks=not direct) as proxy:
+            if proxy:
+                print(f'[download] {doc.get("videoId")} via {mask_proxy(proxy)}')
+            if direct:
+                await _download_direct(doc['url'], out, YTDLP_TIMEOUT_SEC, proxy=proxy)
+            else:
+                format_candidates = [
+                    'bv*[height<=1080]+ba/b[height<=1080]/best[height<=1080]',
+                    'bv*+ba/b/best',
+                    'best',
                 ]
-                proc = await asyncio.create_subprocess_exec(
-                    *cmd,
-                    stdout=asyncio.subprocess.PIPE,
-                    stderr=asyncio.subprocess.PIPE,
-                )
-
-                try:
-                    out_bytes, err_bytes = await asyncio.wait_for(proc.communicate(), timeout=YTDLP_TIMEOUT_SEC)
-                except asyncio.TimeoutError:
-                    proc.kill()
-                    await proc.communicate()
-                    raise RuntimeError(f'yt-dlp timeout after {YTDLP_TIMEOUT_SEC}s')
-
-                if proc.returncode == 0:
-                    last_reason = ''
-                    break
-
-                err_text = (err_bytes or b'').decode('utf-8', errors='ignore').strip()
-                out_text = (out_bytes or b'').decode('utf-8', errors='ignore').strip()
-                last_reason = (err_text or out_text or f'yt-dlp code {proc.returncode}')[-2000:]
-                format_unavailable = 'Requested format is not available' in last_reason
-                if not format_unavailable:
-                    break
-
-            if last_reason:
-                raise RuntimeError(last_reason)
+                last_reason = ''
+
+                for format_selector in format_candidates:
+                    cmd = [
+                        'yt-dlp',
+                        doc['url'],
+                        '-f',
+                        format_selector,
+                        '-o',
+                        out,
+                        '--no-warnings',
+                        '--no-playlist',
+                        '--socket-timeout',
+                        '20',
+                        '--retries',
+                        '1',
+                        '--fragment-retries',
+                        '1',
+                        '--write-thumbnail',
+                        '--write-description',
+                    ]
+                    if proxy:
+                        cmd += ['--proxy', proxy_url(proxy)]
+                    proc = await asyncio.create_subprocess_exec(
+                        *cmd,
+                        stdout=asyncio.subprocess.PIPE,
+                        stderr=asyncio.subprocess.PIPE,
+                    )
 
-        videos.update_one(
-            {'_id': doc['_id']},
-            {
-                '$set': {
-                    'downloadStatus': 'done',
-                    'queueState': 'done',
-                    'localPath': out,
-                    'downloadedAt': datetime.utcnow(),
-                    'failReason': '',
-                    'updatedAt': datetime.utcnow(),
-                }
-            },
-        )
+                    try:
+                        out_bytes, err_bytes = await asyncio.wait_for(proc.communicate(), timeout=YTDLP_TIMEOUT_SEC)
+                    except asyncio.TimeoutError:
+                        proc.kill()
+                        await proc.communicate()
+                        raise RuntimeError(f'yt-dlp timeout after {YTDLP_TIMEOUT_SEC}s')
+
+                    if proc.returncode == 0:
+                        last_reason = ''
+                        break
+
+                    err_text = (err_bytes or b'').decode('utf-8', errors='ignore').strip()
+                    out_text = (out_bytes or b'').decode('utf-8', errors='ignore').strip()
+                    last_reason = (err_text or out_text or f'yt-dlp code {proc.returncode}')[-2000:]
+                    format_unavailable = 'Requested format is not available' in last_reason
+                    if not format_unavailable:
+                        break
+
+                if last_reason:
+                    raise RuntimeError(last_reason)
+
+        if not video_state.transition(doc, 'done', {'localPath': out, 'downloadedAt': datetime.utcnow(), 'failReason': ''}):
+            # Reset (re-download, orphan reset) while this job ran: the newer state wins
+            await log_job(
+                'download',
+                'failed',
+                platform=doc.get('platform'),
+                topic=primary_topic(doc.get('topics')),
+                topics=doc.get('topics'),
+                duration=int((time.time() - started) * 1000),
+                error=f'downloaded, but the video moved to {video_state.current(doc["_id"]) or "another state"} meanwhile',
+            )
+            return
         
         # 💾 Upload to Google Drive
         try:
@@ -2668,54 +2870,43 @@ async def process_download(video_id, attempts):
                     transcript_result = await fetch_transcript_for_video(video_id)
                     
                     if transcript_result['success'] and transcript_result['transcript']:
-                        update_video_transcript(
+                        video_state.update(doc['_id'], await transcript_fields(
                             doc['_id'],
-                            transcript_result['transcript'],
+                            transcript_result.get('segments') or transcript_result['transcript'],
                             transcript_result.get('language', 'mixed')
-                        )
+                        ))
                         print(f'✅ Transcript saved ({transcript_result["snippetCount"]} snippets, format: {transcript_result["format"]})')
                     else:
                         error_msg = transcript_result.get('error', 'Unknown error')
-                        update_video_transcript_error(doc['_id'], error_msg)
+                        video_state.update(doc['_id'], transcript_error_fields(error_msg))
                         print(f"⚠️  No transcript available: {error_msg}")
                 else:
                     error_msg = f'Invalid YouTube ID format: {video_id}'
-                    update_video_transcript_error(doc['_id'], error_msg)
+                    video_state.update(doc['_id'], transcript_error_fields(error_msg))
                     print(f"⚠️  {error_msg}")
             except Exception as transcript_err:
                 error_msg = f'Transcript fetch exception: {str(transcript_err)}'
-                try:
-                    update_video_transcript_error(doc['_id'], error_msg)
-                except Exception:
-                    pass
+                video_state.update(doc['_id'], transcript_error_fields(error_msg))
                 print(f"⚠️  Transcript fetch error (non-fatal): {transcript_err}")
         
-        log_job(
+        await log_job(
             'download',
             'success',
             platform=doc.get('platform'),
-            topic=doc.get('topics'),
+            topic=primary_topic(doc.get('topics')),
+            topics=doc.get('topics'),
             itemsDownloaded=1,
             duration=int((time.time() - started) * 1000),
         )
     except Exception as ex:
         retry = attempts < 2
-        videos.update_one(
-            {'_id': doc['_id']},
-            {
-                '$set': {
-                    'downloadStatus': 'pending' if retry else 'failed',
-                    'queueState': 'retry-pending' if retry else 'failed',
-                    'failReason': str(ex),
-                    'updatedAt': datetime.utcnow(),
-                }
-            },
-        )
-        log_job(
+        video_state.transition(doc, 'retry-pending' if retry else 'failed', {'failReason': str(ex)})
+        await log_job(
             'download',
             'partial' if retry else 'failed',
             platform=doc.get('platform'),
-            topic=doc.get('topics'),
+            topic=primary_topic(doc.get('topics')),
+            topics=doc.get('topics'),
             duration=int((time.time() - started) * 1000),
             error=str(ex),
         )
@@ -2723,8 +2914,9 @@ async def process_download(video_id, attempts):
             await enqueue(str(doc['_id']), 5, attempts + 1, force=True)
 
 
-def queue_stats():
-    return {
+async def queue_stats(persisted: bool = True):
+    """In-process queue state; `persisted` adds the queued / downloading counts stored on videos."""
+    stats = {
         'queued': queue.qsize(),
         'running': running_jobs,
         'started': bool(worker_tasks),
@@ -2732,9 +2924,17 @@ def queue_stats():
         'workers': len(worker_tasks),
         'uniqueQueuedVideos': len(queued_video_ids),
         'processingVideos': len(processing_video_ids),
-        'persistedQueued': videos.count_documents({'queueState': 'queued'}),
-        'persistedRunning': videos.count_documents({'queueState': 'downloading'}),
+        'stateWriter': video_state.stats(),
     }
+    if persisted:
+        cursor = await videos.aggregate([
+            {'$match': {'queueState': {'$in': ['queued', 'downloading']}}},
+            {'$group': {'_id': '$queueState', 'count': {'$sum': 1}}},
+        ])
+        counts = {row['_id']: row['count'] async for row in cursor}
+        stats['persistedQueued'] = counts.get('queued', 0)
+        stats['persistedRunning'] = counts.get('downloading', 0)
+    return stats
 
 
 async def process_playboard_cards(cards: List[Dict], topic: str):
@@ -2777,7 +2977,7 @@ async def process_playboard_cards(cards: List[Dict], topic: str):
             channel = None
             channel_obj_id = None
             try:
-                channel = upsert_channel('youtube', channel_id, channel_name, topic)
+                channel = await upsert_channel('youtube', channel_id, channel_name, topic)
                 if channel:
                     channel_obj_id = str(channel['_id'])
                     print(f'[OK] Card {i}: Channel saved - {channel_name} ({channel_id})')
@@ -2808,7 +3008,10 @@ async def process_playboard_cards(cards: List[Dict], topic: str):
                     'thumbnail': f'https://img.youtube.com/vi/{video_id}/maxresdefault.jpg',
                     'channelId': channel_obj_id,
                 }
-                video = upsert_video(video_payload)
+                video = await upsert_video(video_payload)
+                if video is None:
+                    print(f'[SKIP] Card {i}: Video archived - {video_id}')
+                    continue
                 print(f'[OK] Card {i}: Video saved - {title[:50]}... ({video_id})')
                 
                 # 3️⃣ Queue for download
@@ -2835,3 +3038,8 @@ async def process_playboard_cards(cards: List[Dict], topic: str):
     print(f'[SUMMARY] Processed {len(cards)} cards: {success} saved, {failed} failed, {queued} queued for download')
     
     return result
+
+
+# Resolved captcha jobs whose browser is no longer held restart from the cursor stored on the job
+captcha_pauses.register_resumer('kuaishou', lambda state: discover_kuaishou(resume=state))
+captcha_pauses.register_resumer('douyin', lambda state: discover_douyin_fanout(state.get('topics') or None))
@@ -0,0 +1,248 @@
+"""
+Long-lived Chromium pool shared by every Playwright collector.
+
+Collectors used to run `async_playwright()` + `chromium.launch()` per call
+(1-3 s and a few hundred MB each time). The pool keeps one Playwright driver
+and up to BROWSER_POOL_SIZE_PER_PROXY warm browsers per (proxy, headless)
+pair. Jobs lease a fresh context, which is closed when the lease ends. Browsers
+are recycled after BROWSER_POOL_MAX_PAGES pages, once their process tree
+exceeds BROWSER_POOL_MAX_RSS_MB (as of the last browser_watchdog sweep, needs `psutil`),
+when the watchdog asks for it, or after sitting idle for BROWSER_POOL_IDLE_TTL_SEC.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from playwright.async_api import async_playwright
+
+from .config import (
+    BROWSER_POOL_ENABLED,
+    BROWSER_POOL_SIZE_PER_PROXY,
+    BROWSER_POOL_MAX_PAGES,
+    BROWSER_POOL_MAX_RSS_MB,
+    BROWSER_POOL_IDLE_TTL_SEC,
+    SCRAPER_HEADLESS,
+)
+from .request_router import install_route_policy
+from .browser_watchdog import browser_watchdog
+
+LAUNCH_ARGS = ['--no-default-browser-check']
+
+
+class PooledBrowser:
+    def __init__(self, browser, key: str, tag: str):
+        self.browser = browser
+        self.key = key
+        self.tag = tag  # browser_watchdog launch marker
+        self.leases = 0
+        self.pages_served = 0
+        self.launched_at = time.time()
+        self.last_used = time.time()
+        self.retiring = False
+
+    @property
+    def healthy(self) -> bool:
+        return not self.retiring and self.browser.is_connected()
+
+    def rss_bytes(self) -> int:
+        return browser_watchdog.rss_bytes(self.tag)
+
+    def retire(self) -> None:
+        # Watchdog limit hit: stop handing out new leases, closed once idle
+        self.retiring = True
+
+    def snapshot(self) -> Dict:
+        return {
+            'key': self.key,
+            'leases': self.leases,
+            'pagesServed': self.pages_served,
+            'rssMb': round(self.rss_bytes() / (1024 * 1024), 1),
+            'ageSec': int(time.time() - self.launched_at),
+            'idleSec': int(time.time() - self.last_used),
+            'retiring': self.retiring,
+            'connected': self.browser.is_connected(),
+        }
+
+
+class BrowserPool:
+    def __init__(self):
+        self._playwright = None
+        self._browsers: Dict[str, List[PooledBrowser]] = {}
+        self._lock = asyncio.Lock()
+        self.stats_counters = {'launches': 0, 'leases': 0, 'recycled': 0, 'crashed': 0}
+
+    @staticmethod
+    def _key(proxy: Optional[Dict], headless: bool) -> str:
+        server = (proxy or {}).get('server') or 'direct'
+        user = (proxy or {}).get('username') or ''
+        return f"{server}|{user}|{'headless' if headless else 'headful'}"
+
+    async def playwright(self):
+        """Shared Playwright driver (started lazily, stopped by `stop`)."""
+        if self._playwright is None:
+            self._playwright = await async_playwright().start()
+        return self._playwright
+
+    async def _launch(self, key: str, proxy: Optional[Dict], headless: bool) -> PooledBrowser:
+        tag = browser_watchdog.register('pool')
+        launch_kwargs = {'headless': headless, 'args': [*LAUNCH_ARGS, tag]}
+        if proxy:
+            launch_kwargs['proxy'] = proxy
+        p = await self.playwright()
+        try:
+            browser = await p.chromium.launch(**launch_kwargs)
+        except Exception:
+            browser_watchdog.unregister(tag)
+            raise
+        self.stats_counters['launches'] += 1
+        print(f'[browser-pool] launched browser for {key}')
+        entry = PooledBrowser(browser, key, tag)
+        browser_watchdog.watch_limit(tag, entry.retire)
+        return entry
+
+    async def _acquire(self, proxy: Optional[Dict], headless: bool) -> PooledBrowser:
+        key = self._key(proxy, headless)
+        async with self._lock:
+            await self._reap_locked()
+            slots = self._browsers.setdefault(key, [])
+            for entry in [b for b in slots if not b.browser.is_connected()]:
+                slots.remove(entry)
+                self.stats_counters['crashed'] += 1
+            candidates = [b for b in slots if b.healthy]
+            idle = [b for b in candidates if b.leases == 0]
+            if idle:
+                entry = idle[0]
+            elif len(candidates) < max(1, BROWSER_POOL_SIZE_PER_PROXY):
+                entry = await self._launch(key, proxy, headless)
+                slots.append(entry)
+            else:
+                # Pool full: share the least busy browser (one context per lease)
+                entry = min(candidates, key=lambda b: b.leases)
+            entry.leases += 1
+            entry.last_used = time.time()
+            return entry
+
+    async def _release(self, entry: PooledBrowser, pages: int) -> None:
+        async with self._lock:
+            entry.leases -= 1
+            entry.pages_served += pages
+            entry.last_used = time.time()
+            if entry.pages_served >= BROWSER_POOL_MAX_PAGES:
+                entry.retiring = True
+            elif BROWSER_POOL_MAX_RSS_MB and entry.rss_bytes() > BROWSER_POOL_MAX_RSS_MB * 1024 * 1024:
+                print(f'[browser-pool] {entry.key} over {BROWSER_POOL_MAX_RSS_MB}MB RSS -> recycle')
+                entry.retiring = True
+            await self._reap_locked()
+
+    async def _reap_locked(self) -> None:
+        now = time.time()
+        for key, slots in list(self._browsers.items()):
+            for entry in list(slots):
+                expired = entry.leases == 0 and now - entry.last_used > BROWSER_POOL_IDLE_TTL_SEC
+                if entry.leases == 0 and (entry.retiring or expired or not entry.browser.is_connected()):
+                    slots.remove(entry)
+                    self.stats_counters['recycled'] += 1
+                    await self._close_browser(entry.browser)
+                    browser_watchdog.unregister(entry.tag)
+            if not slots:
+                self._browsers.pop(key, None)
+
+    @staticmethod
+    async def _close_browser(browser) -> None:
+        try:
+            await browser.close()
+        except Exception as e:
+            print(f'[browser-pool] browser close failed: {e}')
+
+    @asynccontextmanager
+    async def lease(self, proxy: Optional[Dict] = None, headless: Optional[bool] = None, source: Optional[str] = None, **context_kwargs):
+        """
+        Yield a fresh BrowserContext on a warm browser for `proxy` (Playwright proxy dict or None).
+        `source` selects the request-blocking policy from request_router.
+        """
+        headless = SCRAPER_HEADLESS if headless is None else headless
+        self.stats_counters['leases'] += 1
+
+        if not BROWSER_POOL_ENABLED:
+            p = await self.playwright()
+            tag = browser_watchdog.register('single')
+            launch_kwargs = {'headless': headless, 'args': [*LAUNCH_ARGS, tag]}
+            if proxy:
+                launch_kwargs['proxy'] = proxy
+            try:
+                browser = await p.chromium.launch(**launch_kwargs)
+            except Exception:
+                browser_watchdog.unregister(tag)
+                raise
+            self.stats_counters['launches'] += 1
+            try:
+                context = await browser.new_context(**context_kwargs)
+                route_stats = await install_route_policy(context, source) if source else None
+                try:
+                    yield context
+                finally:
+                    if route_stats:
+                        route_stats.report()
+                    await context.close()
+            finally:
+                await self._close_browser(browser)
+                browser_watchdog.unregister(tag)
+            return
+
+        entry = await self._acquire(proxy, headless)
+        pages = 0
+        context = None
+        route_stats = None
+        try:
+            context = await entry.browser.new_context(**context_kwargs)
+            route_stats = await install_route_policy(context, source) if source else None
+
+            def _count_page(_page):
+                nonlocal pages
+                pages += 1
+
+            context.on('page', _count_page)
+            yield context
+        except Exception:
+            if not entry.browser.is_connected():
+                entry.retiring = True
+            raise
+        finally:
+            if route_stats:
+                route_stats.report()
+            if context is not None:
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+            await self._release(entry, pages)
+
+    async def stop(self) -> None:
+        async with self._lock:
+            for slots in self._browsers.values():
+                for entry in slots:
+                    await self._close_browser(entry.browser)
+                    browser_watchdog.unregister(entry.tag)
+            self._browsers.clear()
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception as e:
+                print(f'[browser-pool] playwright stop failed: {e}')
+            self._playwright = None
+
+    def stats(self) -> Dict:
+        return {
+            'enabled': BROWSER_POOL_ENABLED,
+            **self.stats_counters,
+            'sizePerProxy': BROWSER_POOL_SIZE_PER_PROXY,
+            'maxPages': BROWSER_POOL_MAX_PAGES,
+            'maxRssMb': BROWSER_POOL_MAX_RSS_MB,
+            'rssTracking': browser_watchdog.available,
+            'browsers': [entry.snapshot() for slots in self._browsers.values() for entry in slots],
+        }
+
+
+browser_pool = BrowserPool()
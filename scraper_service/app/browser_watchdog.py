@@ -0,0 +1,292 @@
+"""
+Watchdog for every Chromium process the service spawns.
+
+Each launch (browser pool, Playboard session browser, nodriver) carries a
+`--scraper-browser=<owner pid>.<id>` switch. The watchdog periodically scans
+the process table for that marker and:
+
+- kills orphans left behind by a previous (crashed) service process, also
+  once at startup
+- kills leaked browsers whose owner already closed/stopped them
+- asks the owner to recycle a browser over BROWSER_WATCHDOG_MAX_RSS_MB or
+  BROWSER_WATCHDOG_MAX_AGE_SEC, and kills it outright at twice those limits
+
+Process inspection needs `psutil`; without it the watchdog only reports that
+it is unavailable.
+"""
+
+import asyncio
+import inspect
+import os
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+try:
+    import psutil
+except Exception:
+    psutil = None
+
+from .config import (
+    BROWSER_WATCHDOG_ENABLED,
+    BROWSER_WATCHDOG_INTERVAL_SEC,
+    BROWSER_WATCHDOG_MAX_RSS_MB,
+    BROWSER_WATCHDOG_MAX_AGE_SEC,
+    BROWSER_WATCHDOG_LEAK_GRACE_SEC,
+)
+
+MARKER = '--scraper-browser='
+
+
+class TrackedBrowser:
+    def __init__(self, tag: str, kind: str, on_limit: Optional[Callable] = None):
+        self.tag = tag
+        self.kind = kind
+        self.on_limit = on_limit
+        self.registered_at = time.time()
+        self.closed_at: Optional[float] = None
+        self.limit_signalled = False
+        self.pid: Optional[int] = None
+        self.rss = 0
+
+
+class BrowserWatchdog:
+    def __init__(self):
+        self.tracked: Dict[str, TrackedBrowser] = {}
+        self.counters = {'orphansKilled': 0, 'leaksKilled': 0, 'limitKilled': 0, 'recycleRequests': 0, 'sweeps': 0}
+        self._task: Optional[asyncio.Task] = None
+        self._last_sweep: Dict = {}
+
+    @property
+    def available(self) -> bool:
+        return BROWSER_WATCHDOG_ENABLED and psutil is not None
+
+    def register(self, kind: str, on_limit: Optional[Callable] = None) -> str:
+        """Return the launch switch to add to the browser args and start tracking it."""
+        tag = f'{os.getpid()}.{uuid.uuid4().hex[:12]}'
+        self.tracked[tag] = TrackedBrowser(tag, kind, on_limit)
+        return f'{MARKER}{tag}'
+
+    def watch_limit(self, launch_arg: str, on_limit: Callable) -> None:
+        rec = self.tracked.get(launch_arg.replace(MARKER, '', 1))
+        if rec:
+            rec.on_limit = on_limit
+
+    def unregister(self, launch_arg: str) -> None:
+        """Owner closed the browser; anything still alive after the grace period is a leak."""
+        rec = self.tracked.get(launch_arg.replace(MARKER, '', 1))
+        if rec and rec.closed_at is None:
+            rec.closed_at = time.time()
+
+    def rss_bytes(self, launch_arg: str) -> int:
+        """Tree RSS measured by the last sweep; never walks the process table on the event loop."""
+        rec = self.tracked.get(launch_arg.replace(MARKER, '', 1))
+        if not rec or not self.available:
+            return 0
+        return rec.rss
+
+    def _find(self, rec: TrackedBrowser):
+        try:
+            if rec.pid and psutil.pid_exists(rec.pid):
+                proc = psutil.Process(rec.pid)
+                if f'{MARKER}{rec.tag}' in (proc.cmdline() or []):
+                    return proc
+        except Exception:
+            pass
+        rec.pid = None
+        for tag, proc in self._scan().items():
+            if tag == rec.tag:
+                rec.pid = proc.pid
+                return proc
+        return None
+
+    @staticmethod
+    def _scan() -> Dict:
+        """Marker tag -> top-level browser process (renderers/GPU are its children)."""
+        found = {}
+        for proc in psutil.process_iter(['pid', 'cmdline']):
+            try:
+                for arg in proc.info.get('cmdline') or []:
+                    if arg.startswith(MARKER):
+                        tag = arg[len(MARKER):]
+                        parent = proc.parent()
+                        parent_args = (parent.cmdline() or []) if parent else []
+                        # Child processes inherit nothing, but some wrappers re-exec with the same args
+                        if f'{MARKER}{tag}' not in parent_args:
+                            found[tag] = proc
+                        break
+            except Exception:
+                continue
+        return found
+
+    @staticmethod
+    def _tree(proc) -> List:
+        try:
+            return [proc, *proc.children(recursive=True)]
+        except Exception:
+            return [proc]
+
+    def _tree_rss(self, proc) -> int:
+        total = 0
+        for p in self._tree(proc):
+            try:
+                total += p.memory_info().rss
+            except Exception:
+                continue
+        return total
+
+    @staticmethod
+    def _owner_pid(tag: str) -> int:
+        try:
+            return int(tag.split('.', 1)[0])
+        except Exception:
+            return 0
+
+    @staticmethod
+    def _owner_dead(owner: int, proc) -> bool:
+        if not owner or not psutil.pid_exists(owner):
+            return True
+        try:
+            # PID reused by a process started after the browser -> original owner is gone
+            return psutil.Process(owner).create_time() > proc.create_time()
+        except Exception:
+            return True
+
+    def _kill_tree_sync(self, proc) -> None:
+        procs = self._tree(proc)
+        for p in procs:
+            try:
+                p.terminate()
+            except Exception:
+                pass
+        _, alive = psutil.wait_procs(procs, timeout=3)
+        for p in alive:
+            try:
+                p.kill()
+            except Exception:
+                pass
+
+    async def _kill(self, proc, reason: str, counter: str) -> None:
+        print(f'[browser-watchdog] killing browser pid={proc.pid}: {reason}')
+        self.counters[counter] += 1
+        await asyncio.to_thread(self._kill_tree_sync, proc)
+
+    async def reap(self, launch_arg: str, grace_sec: float = 5) -> None:
+        """Wait briefly for a stopped browser to exit and kill its process tree if it does not."""
+        self.unregister(launch_arg)
+        rec = self.tracked.get(launch_arg.replace(MARKER, '', 1))
+        if not rec or not self.available:
+            return
+        deadline = time.time() + grace_sec
+        while time.time() < deadline:
+            if await asyncio.to_thread(self._find, rec) is None:
+                self.tracked.pop(rec.tag, None)
+                return
+            await asyncio.sleep(0.5)
+        proc = await asyncio.to_thread(self._find, rec)
+        if proc:
+            await self._kill(proc, f'{rec.kind} did not exit after stop', 'leaksKilled')
+        self.tracked.pop(rec.tag, None)
+
+    async def sweep(self, startup: bool = False) -> Dict:
+        if not self.available:
+            return {}
+        self.counters['sweeps'] += 1
+        now = time.time()
+        my_pid = os.getpid()
+        live = await asyncio.to_thread(self._scan)
+        max_rss = BROWSER_WATCHDOG_MAX_RSS_MB * 1024 * 1024
+
+        for tag, proc in live.items():
+            owner = self._owner_pid(tag)
+            if owner != my_pid:
+                # Other live workers keep their browsers; only dead owners leave orphans
+                if self._owner_dead(owner, proc):
+                    await self._kill(proc, f'orphan of dead service pid {owner}' + (' (startup cleanup)' if startup else ''), 'orphansKilled')
+                continue
+
+            rec = self.tracked.get(tag)
+            if rec is None or (rec.closed_at and now - rec.closed_at > BROWSER_WATCHDOG_LEAK_GRACE_SEC):
+                await self._kill(proc, 'leaked after close', 'leaksKilled')
+                self.tracked.pop(tag, None)
+                continue
+
+            rec.pid = proc.pid
+            rec.rss = await asyncio.to_thread(self._tree_rss, proc)
+            age = now - rec.registered_at
+            over_rss = max_rss and rec.rss > max_rss
+            over_age = BROWSER_WATCHDOG_MAX_AGE_SEC and age > BROWSER_WATCHDOG_MAX_AGE_SEC
+            if (max_rss and rec.rss > 2 * max_rss) or (BROWSER_WATCHDOG_MAX_AGE_SEC and age > 2 * BROWSER_WATCHDOG_MAX_AGE_SEC):
+                await self._kill(proc, f'{rec.kind} over hard limit (rss={rec.rss >> 20}MB age={int(age)}s)', 'limitKilled')
+                self.tracked.pop(tag, None)
+            elif (over_rss or over_age) and not rec.limit_signalled and rec.on_limit:
+                rec.limit_signalled = True
+                self.counters['recycleRequests'] += 1
+                print(f'[browser-watchdog] {rec.kind} over limit (rss={rec.rss >> 20}MB age={int(age)}s) -> recycle')
+                result = rec.on_limit()
+                if inspect.isawaitable(result):
+                    asyncio.create_task(result)
+
+        # Forget closed browsers that have exited
+        for tag, rec in list(self.tracked.items()):
+            if tag not in live and rec.closed_at:
+                self.tracked.pop(tag, None)
+
+        self._last_sweep = {'at': now, 'liveBrowsers': len(live)}
+        return self._last_sweep
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(BROWSER_WATCHDOG_INTERVAL_SEC)
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f'[browser-watchdog] sweep failed: {e}')
+
+    async def start(self) -> None:
+        if not self.available:
+            if BROWSER_WATCHDOG_ENABLED:
+                print('[browser-watchdog] psutil not installed; watchdog disabled')
+            return
+        # Browsers from a previous process that crashed without cleanup
+        await self.sweep(startup=True)
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict:
+        if not self.available:
+            return {'available': False, 'enabled': BROWSER_WATCHDOG_ENABLED, 'psutil': psutil is not None}
+        live = self._scan()
+        browsers = []
+        for tag, proc in live.items():
+            rec = self.tracked.get(tag)
+            try:
+                created = proc.create_time()
+            except Exception:
+                created = time.time()
+            browsers.append({
+                'pid': proc.pid,
+                'kind': rec.kind if rec else 'untracked',
+                'ownerPid': self._owner_pid(tag),
+                'rssMb': round(self._tree_rss(proc) / (1024 * 1024), 1),
+                'processes': len(self._tree(proc)),
+                'ageSec': int(time.time() - created),
+                'closed': bool(rec and rec.closed_at),
+            })
+        return {
+            'available': True,
+            'liveBrowsers': len(browsers),
+            'totalRssMb': round(sum(b['rssMb'] for b in browsers), 1),
+            'browsers': browsers,
+            'limits': {'maxRssMb': BROWSER_WATCHDOG_MAX_RSS_MB, 'maxAgeSec': BROWSER_WATCHDOG_MAX_AGE_SEC},
+            **self.counters,
+            'lastSweep': self._last_sweep,
+        }
+
+
+browser_watchdog = BrowserWatchdog()
@@ -0,0 +1,168 @@
+"""
+Captcha pause / resume for browser collectors.
+
+When Kuaishou or Douyin shows a captcha, the collector logs a `paused_captcha`
+job and hands its open browser lease (context, page, scroll position, cursor) to
+this registry instead of closing it. The lease is held for up to
+CAPTCHA_PAUSE_TTL_SEC (at most CAPTCHA_PAUSE_MAX_HELD at a time).
+
+Resolving the job (`POST /captcha/jobs/{id}/resolve`):
+- held lease: storage state (cookies) is written back for future runs and the
+  collector's continuation picks up on the same page where it stopped
+- no held lease (expired, over the limit, or the process restarted): the
+  platform resumer runs a fresh collection from the cursor stored on the job
+"""
+
+import asyncio
+import os
+import time
+from contextlib import AsyncExitStack
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+from bson import ObjectId
+
+from .config import CAPTCHA_PAUSE_TTL_SEC, CAPTCHA_PAUSE_MAX_HELD
+from .db import logs
+
+
+class PausedCollection:
+    def __init__(self, job_id: str, platform: str, stack: AsyncExitStack, context, continuation: Callable[[], Awaitable[int]], storage_state_path: str = ''):
+        self.job_id = job_id
+        self.platform = platform
+        self.stack = stack
+        self.context = context
+        self.continuation = continuation
+        self.storage_state_path = storage_state_path
+        self.paused_at = time.time()
+        self.resolved = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def snapshot(self) -> Dict:
+        return {
+            'jobId': self.job_id,
+            'platform': self.platform,
+            'pausedSec': int(time.time() - self.paused_at),
+            'expiresInSec': max(0, int(self.paused_at + CAPTCHA_PAUSE_TTL_SEC - time.time())),
+            'resolved': self.resolved.is_set(),
+        }
+
+
+class CaptchaPauses:
+    def __init__(self):
+        self.held: Dict[str, PausedCollection] = {}
+        self.resumers: Dict[str, Callable[[Dict], Awaitable]] = {}
+        self.counters = {'held': 0, 'notHeld': 0, 'resumedLive': 0, 'resumedFromState': 0, 'expired': 0, 'resumeFailed': 0}
+
+    def register_resumer(self, platform: str, resumer: Callable[[Dict], Awaitable]) -> None:
+        """`resumer(resume_state)` restarts collection from a stored cursor when no lease is held."""
+        self.resumers[platform] = resumer
+
+    @staticmethod
+    async def _update_job(job_id: str, fields: Dict) -> None:
+        try:
+            await logs.update_one(
+                {'_id': ObjectId(job_id)},
+                {'$set': {**{f'extra.{k}': v for k, v in fields.items()}, 'updatedAt': datetime.utcnow()}},
+            )
+        except Exception as e:
+            print(f'[captcha] could not update job {job_id}: {e}')
+
+    async def hold(self, job_id, platform: str, stack: AsyncExitStack, context, continuation: Callable[[], Awaitable[int]], storage_state_path: str = '') -> bool:
+        """Take over the lease in `stack` until the job is resolved; False leaves it with the caller."""
+        job_id = str(job_id)
+        if not CAPTCHA_PAUSE_TTL_SEC or len(self.held) >= CAPTCHA_PAUSE_MAX_HELD:
+            self.counters['notHeld'] += 1
+            return False
+        paused = PausedCollection(job_id, platform, stack.pop_all(), context, continuation, storage_state_path)
+        self.held[job_id] = paused
+        self.counters['held'] += 1
+        paused.task = asyncio.create_task(self._wait(paused))
+        await self._update_job(job_id, {'browserHeld': True, 'heldUntil': datetime.utcfromtimestamp(paused.paused_at + CAPTCHA_PAUSE_TTL_SEC)})
+        print(f'[captcha {platform}] holding browser context for job {job_id} up to {CAPTCHA_PAUSE_TTL_SEC}s')
+        return True
+
+    async def _save_storage_state(self, paused: PausedCollection) -> None:
+        if not paused.storage_state_path:
+            return
+        try:
+            folder = os.path.dirname(paused.storage_state_path)
+            if folder:
+                os.makedirs(folder, exist_ok=True)
+            await paused.context.storage_state(path=paused.storage_state_path)
+            print(f'[captcha {paused.platform}] saved storage state -> {paused.storage_state_path}')
+        except Exception as e:
+            print(f'[captcha {paused.platform}] could not save storage state: {e}')
+
+    async def _wait(self, paused: PausedCollection) -> None:
+        try:
+            try:
+                await asyncio.wait_for(paused.resolved.wait(), timeout=CAPTCHA_PAUSE_TTL_SEC)
+            except asyncio.TimeoutError:
+                self.counters['expired'] += 1
+                await self._update_job(paused.job_id, {'browserHeld': False, 'expired': True})
+                print(f'[captcha {paused.platform}] job {paused.job_id} not resolved in {CAPTCHA_PAUSE_TTL_SEC}s; releasing browser')
+                return
+
+            # Cookies from the solved challenge are useful even if the continuation fails
+            await self._save_storage_state(paused)
+            try:
+                found = await paused.continuation()
+                self.counters['resumedLive'] += 1
+                await self._update_job(paused.job_id, {'browserHeld': False, 'resumed': 'live', 'resumedItemsFound': int(found or 0)})
+                print(f'[captcha {paused.platform}] job {paused.job_id} resumed in place -> {int(found or 0)} items')
+            except Exception as e:
+                self.counters['resumeFailed'] += 1
+                await self._update_job(paused.job_id, {'browserHeld': False, 'resumeError': str(e)[:300]})
+                print(f'[captcha {paused.platform}] resume of job {paused.job_id} failed: {e}')
+            await self._save_storage_state(paused)
+        finally:
+            self.held.pop(paused.job_id, None)
+            try:
+                await paused.stack.aclose()
+            except Exception as e:
+                print(f'[captcha {paused.platform}] closing held browser failed: {e}')
+
+    async def _resume_from_state(self, job_id: str, platform: str, state: Dict) -> None:
+        try:
+            result = await self.resumers[platform](state)
+            self.counters['resumedFromState'] += 1
+            await self._update_job(job_id, {'resumed': 'state', 'resumeResult': result if isinstance(result, (int, dict)) else None})
+        except Exception as e:
+            self.counters['resumeFailed'] += 1
+            await self._update_job(job_id, {'resumeError': str(e)[:300]})
+            print(f'[captcha {platform}] resume from saved cursor failed for job {job_id}: {e}')
+
+    async def resolve(self, job_id: str, job: Optional[Dict] = None) -> Optional[str]:
+        """Resume the collection paused by `job_id`: 'live', 'state' or None when nothing can be resumed."""
+        paused = self.held.get(str(job_id))
+        if paused and not paused.resolved.is_set():
+            paused.resolved.set()
+            return 'live'
+
+        extra = (job or {}).get('extra') or {}
+        platform = (job or {}).get('platform') or ''
+        state = extra.get('resumeState')
+        if platform in self.resumers and isinstance(state, dict) and not extra.get('resumed'):
+            await self._update_job(str(job_id), {'resumed': 'pending'})
+            asyncio.create_task(self._resume_from_state(str(job_id), platform, state))
+            return 'state'
+        return None
+
+    async def stop(self) -> None:
+        tasks = [p.task for p in self.held.values() if p.task]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        return {
+            'ttlSec': CAPTCHA_PAUSE_TTL_SEC,
+            'maxHeld': CAPTCHA_PAUSE_MAX_HELD,
+            **self.counters,
+            'paused': [p.snapshot() for p in self.held.values()],
+        }
+
+
+captcha_pauses = CaptchaPauses()
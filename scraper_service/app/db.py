@@ -1,22 +1,97 @@
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo import AsyncMongoClient, ASCENDING, DESCENDING
 from .config import MONGO_URI, TREND_DB_NAME
 
-client = MongoClient(MONGO_URI)
+# Async client: queries are awaited on the event loop that also runs the download
+# workers, the scheduler and the API, instead of blocking it
+client = AsyncMongoClient(MONGO_URI)
 db = client[TREND_DB_NAME]
 
 channels = db['trendchannels']
 videos = db['trendvideos']
 logs = db['trendjoblogs']
 settings = db['trendsettings']
+discovery_runs = db['trenddiscoveryruns']
+# Archived videos (same _id) and their (platform, videoId) dedup tombstones (app/archive.py)
+videos_archive = db['trendvideos_archive']
+video_tombstones = db['trendvideotombstones']
+# Compressed transcript segments, one document per video (app/transcripts.py)
+transcripts = db['trendtranscripts']
+# Materialized aggregates (app/stats.py) and job watermarks
+stats = db['trendstats']
 
 
-def ensure_indexes():
-    channels.create_index([('platform', ASCENDING), ('channelId', ASCENDING)], unique=True)
-    channels.create_index([('isActive', ASCENDING), ('priority', DESCENDING)])
+# Index set for the query shapes in app/query_shapes.py: collection -> [(keys, create_index options)].
+# test_query_shapes.py explains every shape against these and fails on a hot COLLSCAN.
+INDEXES = {
+    channels.name: [
+        ([('platform', ASCENDING), ('channelId', ASCENDING)], {'unique': True}),
+        ([('isActive', ASCENDING), ('priority', DESCENDING)], {}),
+        # Keyset pagination orders (app/pagination.py)
+        ([('priority', DESCENDING), ('updatedAt', DESCENDING), ('_id', DESCENDING)], {}),
+        # Search keys: exact tokens and anchored prefixes (app/search.py)
+        ([('searchKeys', ASCENDING)], {}),
+    ],
+    videos.name: [
+        ([('platform', ASCENDING), ('videoId', ASCENDING)], {'unique': True}),
+        ([('downloadStatus', ASCENDING), ('discoveredAt', DESCENDING), ('_id', DESCENDING)], {}),
+        ([('topics', ASCENDING), ('downloadStatus', ASCENDING)], {}),
+        ([('discoveredAt', DESCENDING), ('_id', DESCENDING)], {}),
+        # Platform-filtered lists (also with minViews) and the invalid-YouTube cleanup watermark
+        ([('platform', ASCENDING), ('discoveredAt', DESCENDING), ('_id', DESCENDING)], {}),
+        # Startup / manual enqueue of pending videos, most viewed first; only pending rows are indexed
+        (
+            [('views', DESCENDING), ('discoveredAt', DESCENDING)],
+            {'name': 'pending_by_views', 'partialFilterExpression': {'downloadStatus': 'pending'}},
+        ),
+        # Persisted queue counts and the orphaned-download reset
+        ([('queueState', ASCENDING)], {}),
+        ([('searchKeys', ASCENDING)], {}),
+    ],
+    videos_archive.name: [
+        ([('platform', ASCENDING), ('videoId', ASCENDING)], {}),
+        ([('discoveredAt', DESCENDING), ('_id', DESCENDING)], {}),
+    ],
+    video_tombstones.name: [
+        ([('platform', ASCENDING), ('videoId', ASCENDING)], {'unique': True}),
+    ],
+    logs.name: [
+        ([('jobType', ASCENDING), ('ranAt', DESCENDING)], {}),
+        ([('ranAt', DESCENDING), ('_id', DESCENDING)], {}),
+        # Retention: entries are removed at their expireAt (app/log_sink.py); unresolved captchas have none
+        ([('expireAt', ASCENDING)], {'expireAfterSeconds': 0}),
+    ],
+    transcripts.name: [
+        ([('video', ASCENDING)], {'unique': True}),
+    ],
+    settings.name: [
+        ([('key', ASCENDING)], {'unique': True}),
+    ],
+    discovery_runs.name: [
+        # Resume lookup: equality on the window, newest run first, status ($in) checked from the index
+        ([('jobType', ASCENDING), ('windowStart', DESCENDING), ('startedAt', DESCENDING), ('status', ASCENDING)], {}),
+        # Run history, newest first
+        ([('jobType', ASCENDING), ('startedAt', DESCENDING)], {}),
+    ],
+}
+# Superseded indexes (a longer one with the same prefix, or one the sort can't use); dropped so writes don't maintain both
+OBSOLETE_INDEXES = {
+    videos.name: ['downloadStatus_1_discoveredAt_-1'],
+    discovery_runs.name: ['jobType_1_windowStart_-1_status_1'],
+}
 
-    videos.create_index([('platform', ASCENDING), ('videoId', ASCENDING)], unique=True)
-    videos.create_index([('downloadStatus', ASCENDING), ('discoveredAt', DESCENDING)])
-    videos.create_index([('topics', ASCENDING), ('downloadStatus', ASCENDING)])
 
-    logs.create_index([('jobType', ASCENDING), ('ranAt', DESCENDING)])
-    settings.create_index([('key', ASCENDING)], unique=True)
+async def ensure_indexes(database=None):
+    database = db if database is None else database
+    for name, specs in INDEXES.items():
+        for keys, options in specs:
+            await database[name].create_index(keys, **options)
+    for name, index_names in OBSOLETE_INDEXES.items():
+        existing = await database[name].index_information()
+        for index_name in index_names:
+            if index_name in existing:
+                await database[name].drop_index(index_name)
+                print(f'[db] dropped superseded index {name}.{index_name}')
+
+
+async def close():
+    await client.close()
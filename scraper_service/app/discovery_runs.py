@@ -0,0 +1,122 @@
+"""
+Checkpointed discovery runs.
+
+Each `discover_all` run persists one document in `trenddiscoveryruns` keyed by
+the cron window it belongs to. Steps (Playboard configs, Kuaishou, per-topic /
+fan-out sources) are recorded as they finish and Kuaishou stores its last
+`pcursor`, so a run interrupted by a restart or browser crash is resumed from
+the last completed step when it is re-triggered inside the same window.
+A step whose collector failed, or that is paused on a captcha job, is not
+recorded; the captcha continuation completes it once the job is resolved.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from apscheduler.triggers.cron import CronTrigger
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from .db import discovery_runs
+from .store import normalize
+from .utils import cron_to_args, now_utc
+
+RESUMABLE_STATUSES = ['running', 'interrupted']
+WINDOW_LOOKBACK = timedelta(days=8)
+
+# Runs currently executing in this process; never resumed concurrently
+_active_run_ids: set = set()
+
+
+def schedule_window_start(cron_expr: str, now: Optional[datetime] = None) -> datetime:
+    """Most recent fire time of `cron_expr` at or before `now`, as naive UTC (like now_utc())."""
+    trigger = CronTrigger(**cron_to_args(cron_expr))
+    now = now or datetime.now(trigger.timezone)
+    cursor = now - WINDOW_LOOKBACK
+    window = cursor
+    fire = trigger.get_next_fire_time(None, cursor)
+    while fire and fire <= now:
+        window = fire
+        fire = trigger.get_next_fire_time(fire, fire + timedelta(seconds=1))
+    return window.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class DiscoveryRun:
+    def __init__(self, doc: Dict):
+        self.id: ObjectId = doc['_id']
+        self.doc = doc
+        self.resumed = bool(doc.get('resumeCount'))
+
+    @classmethod
+    async def open(cls, job_type: str, window_start: datetime, resume: bool = True) -> 'DiscoveryRun':
+        """Resume the unfinished run of this window (if any) or start a new one."""
+        doc = None
+        if resume:
+            doc = await discovery_runs.find_one_and_update(
+                {
+                    'jobType': job_type,
+                    'windowStart': window_start,
+                    'status': {'$in': RESUMABLE_STATUSES},
+                    '_id': {'$nin': list(_active_run_ids)},
+                },
+                {
+                    '$set': {'status': 'running', 'resumedAt': now_utc(), 'updatedAt': now_utc()},
+                    '$inc': {'resumeCount': 1},
+                },
+                sort=[('startedAt', -1)],
+                return_document=ReturnDocument.AFTER,
+            )
+        if doc:
+            print(f"[run {job_type}] resuming {doc['_id']} with {len(doc.get('completedSteps') or [])} completed steps")
+        else:
+            doc = {
+                'jobType': job_type,
+                'windowStart': window_start,
+                'status': 'running',
+                'completedSteps': [],
+                'checkpoints': {},
+                'itemsFound': 0,
+                'resumeCount': 0,
+                'startedAt': now_utc(),
+                'updatedAt': now_utc(),
+            }
+            doc['_id'] = (await discovery_runs.insert_one(doc)).inserted_id
+        _active_run_ids.add(doc['_id'])
+        return cls(doc)
+
+    def is_done(self, step: str) -> bool:
+        return step in (self.doc.get('completedSteps') or [])
+
+    def state(self, key: str) -> Dict:
+        return dict((self.doc.get('checkpoints') or {}).get(key) or {})
+
+    @property
+    def items_found(self) -> int:
+        return int(self.doc.get('itemsFound') or 0)
+
+    async def _update(self, update: Dict) -> None:
+        update.setdefault('$set', {})['updatedAt'] = now_utc()
+        doc = await discovery_runs.find_one_and_update({'_id': self.id}, update, return_document=ReturnDocument.AFTER)
+        if doc:
+            self.doc = doc
+
+    async def save_state(self, key: str, state: Dict) -> None:
+        """Persist an intra-step checkpoint (e.g. Kuaishou pcursor) without completing the step."""
+        await self._update({'$set': {f'checkpoints.{key}': state}})
+
+    async def complete(self, step: str, items: int = 0) -> None:
+        await self._update({'$addToSet': {'completedSteps': step}, '$inc': {'itemsFound': int(items or 0)}})
+
+    async def finish(self, status: str, error: str = '') -> None:
+        update = {'$set': {'status': status}}
+        if error:
+            update['$set']['error'] = error
+        if status not in RESUMABLE_STATUSES:
+            update['$set']['finishedAt'] = now_utc()
+        await self._update(update)
+        _active_run_ids.discard(self.id)
+
+
+async def list_runs(job_type: str = 'discover', limit: int = 20):
+    cursor = discovery_runs.find({'jobType': job_type}).sort('startedAt', -1).limit(limit)
+    return [normalize(doc) async for doc in cursor]
@@ -0,0 +1,188 @@
+"""
+Single-roundtrip in-page card extraction.
+
+Every scanner describes what a "card" looks like on its source with a
+declarative schema (link selector, card container, dedup key, fields) and
+gets all cards back from ONE `page.evaluate` call. Locator loops
+(`links.nth(j).get_attribute` / `inner_text`) cost a CDP round trip per
+attribute, up to 120 per page.
+
+Schema keys:
+- links:  CSS selector of the anchor that identifies a card
+- scope:  `closest()` selector for the card container (fields with from='card')
+- origin: prefix for relative hrefs
+- key:    regex on the absolute href; group 1 is the dedup key (cards without it are skipped)
+- limit:  max cards returned
+- fields: name -> spec or list of specs (first non-empty wins). A spec has
+  from ('link' | 'card'), sel (querySelector inside it), attrs (tried in order),
+  text (fall back to innerText), abs (absolutize), match (regex, group 1),
+  max_number (selector; largest integer in the matched nodes' text)
+
+Dedup happens in-page: keys already returned are skipped, as are the keys passed
+in `skip` (e.g. cards yielded on earlier scroll steps).
+"""
+
+import json
+from typing import Dict, Iterable, List, Optional
+
+EXTRACT_CARDS_JS = """
+(args) => {
+    const schema = args.schema;
+    const origin = schema.origin || location.origin;
+    const abs = (href) => {
+        if (!href) return '';
+        if (href.startsWith('http')) return href;
+        if (href.startsWith('//')) return `https:${href}`;
+        return `${origin}${href.startsWith('/') ? '' : '/'}${href}`;
+    };
+    const textOf = (el) => el ? (el.innerText || el.textContent || '').trim() : '';
+    const maxNumber = (root, sel) => {
+        let best = 0;
+        for (const el of root.querySelectorAll(sel)) {
+            const m = textOf(el).match(/(\\d{1,3}(?:,\\d{3})+|\\d+)/);
+            if (m) {
+                const n = parseInt(m[0].replace(/,/g, ''), 10);
+                if (n > best) best = n;
+            }
+        }
+        return best;
+    };
+    const readSpec = (spec, link, card) => {
+        const root = spec.from === 'card' ? card : link;
+        if (!root) return '';
+        if (spec.max_number) return maxNumber(root, spec.max_number);
+        const el = spec.sel ? root.querySelector(spec.sel) : root;
+        if (!el) return '';
+        let value = '';
+        for (const attr of spec.attrs || []) {
+            value = (el.getAttribute(attr) || '').trim();
+            if (value) break;
+        }
+        if (!value && spec.text) value = textOf(el);
+        if (value && spec.abs) value = abs(value);
+        if (value && spec.match) {
+            const m = value.match(new RegExp(spec.match));
+            value = m ? (m[1] || '') : '';
+        }
+        return value;
+    };
+    const readField = (specs, link, card) => {
+        for (const spec of Array.isArray(specs) ? specs : [specs]) {
+            const value = readSpec(spec, link, card);
+            if (value) return value;
+        }
+        return '';
+    };
+
+    const keyRe = new RegExp(schema.key);
+    const seen = new Set(args.skip || []);
+    const limit = args.limit || schema.limit || 100;
+    const out = [];
+    for (const link of document.querySelectorAll(schema.links)) {
+        const url = abs(link.getAttribute('href') || '');
+        const m = url.match(keyRe);
+        if (!m || !m[1] || seen.has(m[1])) continue;
+        seen.add(m[1]);
+        const card = schema.scope ? (link.closest(schema.scope) || link) : link;
+        const item = {key: m[1], url};
+        for (const [name, specs] of Object.entries(schema.fields || {})) {
+            item[name] = readField(specs, link, card);
+        }
+        out.push(item);
+        if (out.length >= limit) break;
+    }
+    return out;
+}
+"""
+
+EXTRACTION_SCHEMAS: Dict[str, Dict] = {
+    'playboard': {
+        'links': 'a[href*="/en/video/"]',
+        'scope': 'tr, [class*="table__row"], [role="row"], div[class*="item"]',
+        'origin': 'https://playboard.co',
+        'key': r'/en/video/([a-zA-Z0-9_-]+)',
+        'limit': 100,
+        'fields': {
+            'channel_id': {'attrs': ['href'], 'match': r'channelId=([a-zA-Z0-9_-]+)'},
+            'title': {'from': 'card', 'sel': 'a.title__label h3, [class*="title"] h3, h3, a[class*="title"]', 'text': True},
+            'views': {'from': 'card', 'max_number': 'td, div[class*="cell"], span, strong'},
+            'views_text': {'from': 'card', 'sel': 'td.score, td.views', 'text': True},
+            'channel_name': {'from': 'card', 'sel': 'a[href*="/channel/"], [class*="channel"] a, a[class*="channel"]', 'attrs': ['title'], 'text': True},
+        },
+    },
+    'youtube-shorts': {
+        'links': 'a[href*="/shorts/"]',
+        'scope': 'ytm-shorts-lockup-view-model, ytd-rich-item-renderer, ytd-reel-item-renderer, ytd-video-renderer',
+        'origin': 'https://www.youtube.com',
+        'key': r'/shorts/([A-Za-z0-9_-]{11})',
+        'limit': 60,
+        'fields': {
+            'title': [
+                {'attrs': ['title', 'aria-label'], 'text': True},
+                {'from': 'card', 'sel': 'h3, #video-title, [id*="title"]', 'attrs': ['title', 'aria-label'], 'text': True},
+            ],
+        },
+    },
+    'douyin-search': {
+        'links': 'a[href*="/video/"]',
+        'scope': 'li, article, div',
+        'origin': 'https://www.douyin.com',
+        'key': r'/video/([0-9]+)',
+        'limit': 80,
+        'fields': {
+            'title': [
+                {'from': 'card', 'sel': 'h3, h4, [data-e2e*="desc"], [data-e2e*="title"]', 'text': True},
+                {'text': True},
+            ],
+            'channel_url': {'from': 'card', 'sel': 'a[href*="/user/"]', 'attrs': ['href'], 'abs': True},
+            'channel_name': {'from': 'card', 'sel': 'a[href*="/user/"]', 'text': True},
+        },
+    },
+    'douyin-channel': {
+        'links': 'a[href*="/video/"]',
+        'origin': 'https://www.douyin.com',
+        'key': r'/video/([0-9]+)',
+        'limit': 40,
+        'fields': {'title': {'text': True}},
+    },
+    'facebook-reels': {
+        'links': 'a[href*="/reel/"]',
+        'origin': 'https://www.facebook.com',
+        'key': r'/reel/([0-9]+)',
+        'limit': 40,
+        'fields': {'title': {'attrs': ['aria-label'], 'text': True}},
+    },
+    'pexels': {
+        'links': 'a[href*="/video/"]',
+        'scope': 'article, li, div',
+        'origin': 'https://www.pexels.com',
+        'key': r'-([0-9]+)(?:/|\?|$)',
+        'limit': 100,
+        'fields': {
+            'title': [
+                {'attrs': ['aria-label', 'title']},
+                {'from': 'card', 'sel': 'img', 'attrs': ['alt']},
+                {'from': 'card', 'text': True},
+            ],
+            'thumbnail': {'from': 'card', 'sel': 'img', 'attrs': ['src', 'data-src']},
+        },
+    },
+}
+
+
+def extraction_args(source: str, limit: Optional[int] = None, skip: Optional[Iterable[str]] = None) -> Dict:
+    return {
+        'schema': EXTRACTION_SCHEMAS[source],
+        'limit': limit,
+        'skip': [str(k) for k in (skip or []) if k],
+    }
+
+
+async def extract_cards(page, source: str, limit: Optional[int] = None, skip: Optional[Iterable[str]] = None) -> List[Dict]:
+    """All cards for `source` on a Playwright page in one evaluate call: [{key, url, <fields>}]."""
+    return await page.evaluate(EXTRACT_CARDS_JS, extraction_args(source, limit, skip)) or []
+
+
+def extraction_expression(source: str, limit: Optional[int] = None, skip: Optional[Iterable[str]] = None) -> str:
+    """Self-contained expression for engines whose evaluate() takes no arguments (nodriver)."""
+    return f'({EXTRACT_CARDS_JS.strip()})({json.dumps(extraction_args(source, limit, skip))})'
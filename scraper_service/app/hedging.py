@@ -0,0 +1,157 @@
+"""
+Hedged collection across engines / proxies.
+
+`hedged_stream` starts the first candidate and, if it has not produced a
+non-empty batch within `delay_sec`, starts the next one in parallel (a failed
+candidate starts the next one immediately). The first candidate to yield rows
+wins: the others are cancelled and the winner keeps streaming. `EngineStats`
+tracks per-engine success rate and time-to-first-rows so callers can put the
+best engine first.
+"""
+
+import asyncio
+import time
+from typing import AsyncIterator, Callable, Dict, List, Tuple
+
+EWMA_ALPHA = 0.3
+
+# (engine name, human label for logs, factory returning a fresh async iterator of batches)
+Candidate = Tuple[str, str, Callable[[], AsyncIterator[List[Dict]]]]
+
+
+class EngineStats:
+    def __init__(self):
+        self.engines: Dict[str, Dict] = {}
+
+    def _entry(self, engine: str) -> Dict:
+        return self.engines.setdefault(engine, {
+            'attempts': 0,
+            'wins': 0,
+            'failures': 0,
+            'cancelled': 0,
+            'latencyEwmaSec': None,
+            'lastError': '',
+        })
+
+    def record_win(self, engine: str, latency_sec: float) -> None:
+        e = self._entry(engine)
+        e['attempts'] += 1
+        e['wins'] += 1
+        prev = e['latencyEwmaSec']
+        e['latencyEwmaSec'] = round(latency_sec if prev is None else EWMA_ALPHA * latency_sec + (1 - EWMA_ALPHA) * prev, 2)
+
+    def record_failure(self, engine: str, error: str = '') -> None:
+        e = self._entry(engine)
+        e['attempts'] += 1
+        e['failures'] += 1
+        e['lastError'] = error[:200]
+
+    def record_cancelled(self, engine: str) -> None:
+        # Lost the race: neither a success nor a failure for ranking purposes
+        self._entry(engine)['cancelled'] += 1
+
+    def success_rate(self, engine: str) -> float:
+        e = self._entry(engine)
+        decided = e['wins'] + e['failures']
+        return (e['wins'] + 1) / (decided + 2)  # Laplace prior: unknown engines start at 0.5
+
+    def rank(self, engines: List[str]) -> List[str]:
+        """Best engine first: higher success rate, then lower time-to-first-rows."""
+        def key(engine: str):
+            latency = self._entry(engine)['latencyEwmaSec']
+            return (-round(self.success_rate(engine), 2), latency if latency is not None else float('inf'))
+        return sorted(engines, key=key)
+
+    def snapshot(self) -> Dict:
+        return {
+            engine: {**stats, 'successRate': round(self.success_rate(engine), 3)}
+            for engine, stats in self.engines.items()
+        }
+
+
+async def hedged_stream(label: str, candidates: List[Candidate], delay_sec: float, stats: EngineStats):
+    """Yield batches from the first candidate that produces rows; cancel the others.
+
+    Raises RuntimeError when every candidate fails before producing a row.
+    """
+    pending = list(candidates)
+    events: asyncio.Queue = asyncio.Queue()
+    attempts: Dict[int, Dict] = {}
+    winner = None
+    last_error = None
+
+    async def pump(attempt_id: int, factory):
+        try:
+            async for batch in factory():
+                await events.put((attempt_id, 'batch', batch))
+            await events.put((attempt_id, 'done', None))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            await events.put((attempt_id, 'error', e))
+
+    def launch(reason: str) -> None:
+        engine, desc, factory = pending.pop(0)
+        attempt_id = len(attempts)
+        attempts[attempt_id] = {
+            'engine': engine,
+            'desc': desc,
+            'started': time.time(),
+            'task': asyncio.create_task(pump(attempt_id, factory)),
+        }
+        print(f'[hedge {label}] start #{attempt_id} {desc} ({reason})')
+
+    def running() -> List[int]:
+        return [i for i, a in attempts.items() if not a['task'].done()]
+
+    launch('primary')
+    try:
+        while True:
+            if winner is None and not running() and events.empty():
+                if not pending:
+                    print(f'[hedge {label}] all {len(attempts)} attempts failed')
+                    # Raise so the caller does not mistake a failed collect for an empty one
+                    raise RuntimeError(f'{label}: all {len(attempts)} attempts failed, last error: {last_error}')
+                launch('previous attempt failed')
+
+            timeout = delay_sec if winner is None and pending else None
+            try:
+                attempt_id, kind, payload = await asyncio.wait_for(events.get(), timeout=timeout)
+            except asyncio.TimeoutError:
+                launch(f'no rows after {delay_sec:.0f}s')
+                continue
+
+            attempt = attempts[attempt_id]
+            if winner is None:
+                if kind == 'batch' and payload:
+                    winner = attempt_id
+                    latency = time.time() - attempt['started']
+                    stats.record_win(attempt['engine'], latency)
+                    print(f'[hedge {label}] #{attempt_id} {attempt["desc"]} won after {latency:.1f}s')
+                    for other_id in running():
+                        if other_id != winner:
+                            attempts[other_id]['task'].cancel()
+                            stats.record_cancelled(attempts[other_id]['engine'])
+                    yield payload
+                elif kind in ('done', 'error'):
+                    error = str(payload) if kind == 'error' else 'no rows'
+                    last_error = error
+                    stats.record_failure(attempt['engine'], error)
+                    print(f'[hedge {label}] #{attempt_id} {attempt["desc"]} failed: {error}')
+                continue
+
+            if attempt_id != winner:
+                continue
+            if kind == 'batch':
+                if payload:
+                    yield payload
+            else:
+                if kind == 'error':
+                    print(f'[hedge {label}] winner stopped early, keeping partial result: {payload}')
+                return
+    finally:
+        tasks = [a['task'] for a in attempts.values() if not a['task'].done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,336 @@
+"""
+Shared async HTTP client for non-browser fetches.
+
+- One pooled aiohttp session (keep-alive, DNS cache, gzip/deflate, br when `brotli` is installed)
+- On-disk response cache with ETag / Last-Modified revalidation, per-host TTL
+  and size-bounded LRU eviction; file I/O runs off the event loop
+- Hit-rate counters exposed through `cache_stats()`
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+from urllib.parse import urlparse
+
+import aiohttp
+
+try:
+    import brotli  # noqa: F401 - aiohttp only decodes `br` when brotli is importable
+    ACCEPT_ENCODING = 'gzip, deflate, br'
+except Exception:
+    ACCEPT_ENCODING = 'gzip, deflate'
+
+from .config import (
+    HTTP_POOL_LIMIT,
+    HTTP_POOL_LIMIT_PER_HOST,
+    HTTP_CACHE_ENABLED,
+    HTTP_CACHE_DIR,
+    HTTP_CACHE_MAX_BYTES,
+    HTTP_CACHE_DEFAULT_TTL_SEC,
+    HTTP_CACHE_HOST_TTLS,
+)
+
+_session: Optional[aiohttp.ClientSession] = None
+# LRU-touch metadata is written in batches at most this often
+META_FLUSH_DELAY_SEC = 30
+
+
+class ResponseCache:
+    """
+    File-backed response cache: `<key>.body` holds the payload, `<key>.json` the metadata.
+
+    File I/O runs in worker threads (`asyncio.to_thread`) so a slow disk never
+    stalls the event loop. The index and byte accounting live in memory and
+    are only changed on the loop. LRU touches and revalidations just mark
+    the metadata dirty; dirty entries are written in one batch at most every
+    META_FLUSH_DELAY_SEC, and on `close()`.
+    """
+
+    def __init__(self, root: str, max_bytes: int, default_ttl_sec: int, host_ttls: Dict[str, int]):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.default_ttl_sec = default_ttl_sec
+        self.host_ttls = host_ttls
+        self._index: 'OrderedDict[str, Dict]' = OrderedDict()  # LRU order: oldest first
+        self._total_bytes = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._dirty: Set[str] = set()
+        self._meta_flush: Optional[asyncio.Task] = None
+        self.stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'errors': 0, 'metaWrites': 0}
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _paths(self, key: str) -> tuple[str, str]:
+        return os.path.join(self.root, f'{key}.body'), os.path.join(self.root, f'{key}.json')
+
+    def _read_index(self) -> list:
+        os.makedirs(self.root, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.root):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.root, name), 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except Exception:
+                continue
+            if meta.get('key') and os.path.exists(self._paths(meta['key'])[0]):
+                entries.append(meta)
+        return sorted(entries, key=lambda m: m.get('lastAccess', 0))
+
+    async def _load(self) -> None:
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            for meta in await asyncio.to_thread(self._read_index):
+                self._index[meta['key']] = meta
+                self._total_bytes += int(meta.get('size', 0))
+            self._loaded = True
+        await self._evict()
+
+    def ttl_for(self, url: str) -> int:
+        host = (urlparse(url).hostname or '').lower()
+        for suffix, ttl in self.host_ttls.items():
+            if host == suffix or host.endswith(f'.{suffix}'):
+                return ttl
+        return self.default_ttl_sec
+
+    async def lookup(self, url: str) -> Optional[Dict]:
+        await self._load()
+        key = self._key(url)
+        meta = self._index.get(key)
+        if not meta:
+            return None
+        entry = dict(meta)
+        entry['fresh'] = (time.time() - meta.get('fetchedAt', 0)) < self.ttl_for(url)
+        return entry
+
+    @staticmethod
+    def _read_file(path: str) -> bytes:
+        with open(path, 'rb') as f:
+            return f.read()
+
+    async def read_body(self, key: str) -> Optional[bytes]:
+        body_path, _ = self._paths(key)
+        try:
+            body = await asyncio.to_thread(self._read_file, body_path)
+        except Exception:
+            self.stats['errors'] += 1
+            await self._drop(key)
+            return None
+        self._touch(key)
+        return body
+
+    @staticmethod
+    def _write_entry(body_path: str, body: bytes, meta_path: str, meta: Dict) -> None:
+        with open(body_path, 'wb') as f:
+            f.write(body)
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    async def store(self, url: str, body: bytes, headers) -> None:
+        cache_control = (headers.get('Cache-Control') or '').lower()
+        if 'no-store' in cache_control:
+            return
+        await self._load()
+        key = self._key(url)
+        await self._drop(key)
+        meta = {
+            'key': key,
+            'url': url,
+            'etag': headers.get('ETag') or '',
+            'lastModified': headers.get('Last-Modified') or '',
+            'fetchedAt': time.time(),
+            'lastAccess': time.time(),
+            'size': len(body),
+        }
+        body_path, meta_path = self._paths(key)
+        try:
+            await asyncio.to_thread(self._write_entry, body_path, body, meta_path, meta)
+        except Exception as e:
+            self.stats['errors'] += 1
+            print(f'[http-cache] store failed for {url}: {e}')
+            return
+        self._index[key] = meta
+        self._total_bytes += len(body)
+        self.stats['stores'] += 1
+        await self._evict()
+
+    def mark_revalidated(self, key: str) -> None:
+        meta = self._index.get(key)
+        if not meta:
+            return
+        meta['fetchedAt'] = time.time()
+        self._mark_dirty(key)
+
+    def _touch(self, key: str) -> None:
+        meta = self._index.get(key)
+        if not meta:
+            return
+        meta['lastAccess'] = time.time()
+        self._index.move_to_end(key)
+        self._mark_dirty(key)
+
+    def _mark_dirty(self, key: str) -> None:
+        self._dirty.add(key)
+        if self._meta_flush is None or self._meta_flush.done():
+            self._meta_flush = asyncio.get_running_loop().create_task(self._flush_meta_later())
+
+    async def _flush_meta_later(self) -> None:
+        await asyncio.sleep(META_FLUSH_DELAY_SEC)
+        await self.flush_meta()
+
+    def _write_metas(self, metas: list) -> int:
+        failed = 0
+        for meta in metas:
+            try:
+                with open(self._paths(meta['key'])[1], 'w', encoding='utf-8') as f:
+                    json.dump(meta, f)
+            except Exception:
+                failed += 1
+        return failed
+
+    async def flush_meta(self) -> None:
+        """Write the metadata of entries touched or revalidated since the last flush."""
+        keys, self._dirty = self._dirty, set()
+        # Entries evicted meanwhile have no metadata file to update
+        metas = [dict(self._index[key]) for key in keys if key in self._index]
+        if not metas:
+            return
+        self.stats['errors'] += await asyncio.to_thread(self._write_metas, metas)
+        self.stats['metaWrites'] += 1
+
+    async def close(self) -> None:
+        if self._meta_flush is not None and not self._meta_flush.done():
+            self._meta_flush.cancel()
+        self._meta_flush = None
+        await self.flush_meta()
+
+    def _remove_files(self, key: str) -> int:
+        failed = 0
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except Exception:
+                failed += 1
+        return failed
+
+    async def _drop(self, key: str) -> None:
+        meta = self._index.pop(key, None)
+        self._dirty.discard(key)
+        if meta:
+            self._total_bytes -= int(meta.get('size', 0))
+        self.stats['errors'] += await asyncio.to_thread(self._remove_files, key)
+
+    async def _evict(self) -> None:
+        while self._index and self._total_bytes > self.max_bytes:
+            key = next(iter(self._index))
+            await self._drop(key)
+            self.stats['evictions'] += 1
+
+    async def snapshot(self) -> Dict:
+        await self._load()
+        lookups = self.stats['hits'] + self.stats['revalidated'] + self.stats['misses']
+        served = self.stats['hits'] + self.stats['revalidated']
+        return {
+            **self.stats,
+            'lookups': lookups,
+            'hitRate': round(served / lookups, 4) if lookups else 0.0,
+            'entries': len(self._index),
+            'bytes': self._total_bytes,
+            'maxBytes': self.max_bytes,
+            'dirtyMeta': len(self._dirty),
+        }
+
+
+response_cache = ResponseCache(HTTP_CACHE_DIR, HTTP_CACHE_MAX_BYTES, HTTP_CACHE_DEFAULT_TTL_SEC, HTTP_CACHE_HOST_TTLS)
+
+
+async def get_http_session() -> aiohttp.ClientSession:
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=HTTP_POOL_LIMIT,
+            limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+            ttl_dns_cache=300,
+            keepalive_timeout=30,
+        )
+        _session = aiohttp.ClientSession(connector=connector, headers={'Accept-Encoding': ACCEPT_ENCODING})
+    return _session
+
+
+async def close_http_client() -> None:
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    await response_cache.close()
+
+
+async def fetch_text(url: str, timeout_sec: int = 25, headers: Dict | None = None, use_cache: bool = True) -> str:
+    """GET `url` as text, serving fresh cache entries directly and revalidating stale ones."""
+    use_cache = use_cache and HTTP_CACHE_ENABLED
+    entry = await response_cache.lookup(url) if use_cache else None
+
+    if entry and entry['fresh']:
+        body = await response_cache.read_body(entry['key'])
+        if body is not None:
+            response_cache.stats['hits'] += 1
+            return body.decode('utf-8', errors='ignore')
+        entry = None
+
+    req_headers = dict(headers or {})
+    if entry:
+        if entry.get('etag'):
+            req_headers['If-None-Match'] = entry['etag']
+        if entry.get('lastModified'):
+            req_headers['If-Modified-Since'] = entry['lastModified']
+
+    session = await get_http_session()
+    async with session.get(url, headers=req_headers, timeout=aiohttp.ClientTimeout(total=timeout_sec)) as resp:
+        if resp.status == 304 and entry:
+            body = await response_cache.read_body(entry['key'])
+            if body is None:
+                # Cached body vanished (read_body dropped the entry): refetch unconditionally
+                return await fetch_text(url, timeout_sec=timeout_sec, headers=headers, use_cache=use_cache)
+            response_cache.mark_revalidated(entry['key'])
+            response_cache.stats['revalidated'] += 1
+            return body.decode('utf-8', errors='ignore')
+        resp.raise_for_status()
+        body = await resp.read()
+        if use_cache:
+            response_cache.stats['misses'] += 1
+            await response_cache.store(url, body, resp.headers)
+
+    return body.decode('utf-8', errors='ignore')
+
+
+async def download_to_file(url: str, out_path: str, timeout_sec: int = 120, headers: Dict | None = None, proxy: str | None = None) -> None:
+    """Stream a (never cached) binary download through the pooled session, optionally via an HTTP proxy."""
+    if not url:
+        raise RuntimeError('missing url')
+    session = await get_http_session()
+    async with session.get(url, headers=headers or {}, proxy=proxy, timeout=aiohttp.ClientTimeout(total=timeout_sec)) as resp:
+        resp.raise_for_status()
+        # Writes go to a worker thread: a 1 MiB write to a busy disk must not block other jobs
+        f = await asyncio.to_thread(open, out_path, 'wb')
+        try:
+            async for chunk in resp.content.iter_chunked(1024 * 1024):
+                await asyncio.to_thread(f.write, chunk)
+        finally:
+            await asyncio.to_thread(f.close)
+
+
+async def cache_stats() -> Dict:
+    return await response_cache.snapshot()
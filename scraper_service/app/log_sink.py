@@ -0,0 +1,169 @@
+"""
+Buffered job-log writer with per-jobType retention.
+
+`log_job()` used to do one insert per download success, failure and retry.
+Entries now go into an in-memory buffer. The buffer is flushed with a single
+unordered `insert_many` once it holds LOG_FLUSH_BATCH entries, or
+LOG_FLUSH_INTERVAL_SEC after the first pending entry. Ids are generated
+client-side, so `log_job()` still returns the id straight away.
+
+Captcha jobs are written immediately: they are resolved through the API and
+updated by the captcha pause registry, so they have to exist right away.
+
+Retention: each entry gets `expireAt = ranAt + retention(jobType)`, and a TTL
+index on `expireAt` removes it. Retention comes from
+LOG_RETENTION_DAYS_BY_TYPE, with LOG_RETENTION_DAYS as the default; 0 keeps
+entries forever. Unresolved captcha jobs get no `expireAt` and are kept
+until they are resolved.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo.errors import BulkWriteError
+
+from .config import LOG_FLUSH_BATCH, LOG_FLUSH_INTERVAL_SEC, LOG_RETENTION_DAYS, LOG_RETENTION_DAYS_BY_TYPE
+from .db import logs
+
+# Entries kept for a retry when Mongo is unreachable; older ones are dropped beyond this
+MAX_PENDING = 10_000
+
+
+def retention_days(job_type: str) -> int:
+    return LOG_RETENTION_DAYS_BY_TYPE.get(job_type, LOG_RETENTION_DAYS)
+
+
+def expire_at(job_type: str, ran_at: datetime) -> Optional[datetime]:
+    days = retention_days(job_type)
+    return ran_at + timedelta(days=days) if days > 0 else None
+
+
+def needs_resolution(doc: Dict) -> bool:
+    return doc.get('status') == 'paused_captcha' and not (doc.get('extra') or {}).get('resolved')
+
+
+class LogSink:
+    def __init__(self):
+        self.buffer: List[Dict] = []
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {'buffered': 0, 'direct': 0, 'flushes': 0, 'written': 0, 'dropped': 0, 'flushErrors': 0}
+
+    @staticmethod
+    def _with_expiry(doc: Dict) -> Dict:
+        if not needs_resolution(doc):
+            expires = expire_at(doc.get('jobType') or '', doc.get('ranAt') or datetime.utcnow())
+            if expires:
+                doc['expireAt'] = expires
+        return doc
+
+    async def write(self, doc: Dict) -> None:
+        """Insert now, bypassing the buffer (jobs other code updates right after logging them)."""
+        await logs.insert_one(self._with_expiry(doc))
+        self.counters['direct'] += 1
+
+    def add(self, doc: Dict) -> None:
+        self.buffer.append(self._with_expiry(doc))
+        self.counters['buffered'] += 1
+        if len(self.buffer) > MAX_PENDING:
+            dropped = len(self.buffer) - MAX_PENDING
+            del self.buffer[:dropped]
+            self.counters['dropped'] += dropped
+        if self._task is None:
+            # Not started (scripts, tests): no background flusher, so write through
+            asyncio.get_running_loop().create_task(self.flush())
+        elif len(self.buffer) >= LOG_FLUSH_BATCH or len(self.buffer) == 1:
+            self._wake.set()
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            batch, self.buffer = self.buffer, []
+            if not batch:
+                return 0
+            self.counters['flushes'] += 1
+            try:
+                result = await logs.insert_many(batch, ordered=False)
+                written = len(result.inserted_ids)
+            except BulkWriteError as e:
+                # Duplicate ids from an earlier partial flush are already stored; other errors are lost
+                written = e.details.get('nInserted', 0)
+                failed = [err for err in e.details.get('writeErrors', []) if err.get('code') != 11000]
+                self.counters['dropped'] += len(failed)
+                self.counters['flushErrors'] += 1
+                print(f'[logs] flush wrote {written}/{len(batch)} entries, {len(failed)} failed')
+            except Exception as e:
+                # Mongo unreachable: keep the batch for the next flush
+                self.buffer[:0] = batch
+                self.counters['flushErrors'] += 1
+                print(f'[logs] flush of {len(batch)} entries failed, will retry: {e}')
+                return 0
+            self.counters['written'] += written
+            return written
+
+    async def _loop(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            if len(self.buffer) < LOG_FLUSH_BATCH:
+                # Give the batch time to fill; a full batch wakes us early
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=LOG_FLUSH_INTERVAL_SEC)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+            await self.flush()
+            if self.buffer:
+                # Leftovers (failed flush or entries added meanwhile) go out on the next interval
+                self._wake.set()
+
+    async def start(self) -> None:
+        if not self._task:
+            self._task = asyncio.create_task(self._loop())
+            if self.buffer:
+                self._wake.set()
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except BaseException:
+                pass
+            self._task = None
+        await self.flush()
+
+    async def backfill_expiry(self) -> int:
+        """Give entries written before retention existed an expireAt from their ranAt."""
+        updated = 0
+        for job_type in await logs.distinct('jobType', {'expireAt': {'$exists': False}}):
+            days = retention_days(job_type or '')
+            if days <= 0:
+                continue
+            result = await logs.update_many(
+                {
+                    'jobType': job_type,
+                    'expireAt': {'$exists': False},
+                    'ranAt': {'$type': 'date'},
+                    '$nor': [{'status': 'paused_captcha', 'extra.resolved': {'$ne': True}}],
+                },
+                [{'$set': {'expireAt': {'$add': ['$ranAt', days * 86_400_000]}}}],
+            )
+            updated += result.modified_count
+        if updated:
+            print(f'[logs] set retention on {updated} existing job logs')
+        return updated
+
+    def stats(self) -> Dict:
+        return {
+            'pending': len(self.buffer),
+            'flushBatch': LOG_FLUSH_BATCH,
+            'flushIntervalSec': LOG_FLUSH_INTERVAL_SEC,
+            'retentionDays': LOG_RETENTION_DAYS,
+            'retentionDaysByType': LOG_RETENTION_DAYS_BY_TYPE,
+            **self.counters,
+        }
+
+
+log_sink = LogSink()
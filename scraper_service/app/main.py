@@ -8,16 +8,34 @@ from fastapi.middleware.cors import CORSMiddleware
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from bson import ObjectId
 
-from .config import PORT, ENABLE_SCHEDULER, AUTO_ENQUEUE_PENDING_ON_STARTUP, STARTUP_PENDING_ENQUEUE_LIMIT, VOICEOVER_OUTPUT_ROOT
-from .db import ensure_indexes, channels, videos, logs
-from .store import get_or_create_settings, update_settings, normalize, log_job
-from .automation import discover_all, discover_playboard, discover_dailyhaha, discover_douyin, discover_pexels, discover_kuaishou, scan_all_channels, scan_single_channel, enqueue, queue_stats, start_worker, cleanup_invalid_youtube_records, reset_orphaned_downloads
+from .config import ARCHIVE_ENABLED, PLAYBOARD_HEDGE_ENABLED, PORT, ENABLE_SCHEDULER, AUTO_ENQUEUE_PENDING_ON_STARTUP, STARTUP_PENDING_ENQUEUE_LIMIT, VOICEOVER_OUTPUT_ROOT
+from .db import ensure_indexes, channels, videos, videos_archive, video_tombstones, logs, close as close_db
+from .store import get_or_create_settings, update_settings, normalize, log_job, projection, VIDEO_SUMMARY_FIELDS
+from .utils import cron_to_args
+from .automation import playboard_engine_stats, discover_all, discover_playboard, discover_dailyhaha, discover_douyin, discover_dailyhaha_fanout, discover_douyin_fanout, discover_pexels, discover_kuaishou, scan_all_channels, scan_single_channel, enqueue, queue_stats, start_worker, cleanup_invalid_youtube_records, reset_orphaned_downloads
 from .transcriptService import TranscriptService
+from .http_client import cache_stats, close_http_client
+from .playboard_sessions import playboard_sessions
+from .browser_pool import browser_pool
+from .browser_watchdog import browser_watchdog
+from .captcha_pauses import captcha_pauses
+from .proxy_manager import proxy_manager
+from .serializers import MongoJSONResponse
+from .pagination import paginate, VIDEO_SORT, CHANNEL_SORT, LOG_SORT
+from .stats import get_overview
+from .log_sink import log_sink, expire_at
+from .video_state import video_state, DOWNLOAD_STATUS
+from .transcripts import transcript_store
+from .archive import archive_videos, restore_videos, archive_stats
+from .search import NO_MATCH, search_filter, search_videos, search_channels, backfill_search_keys
+from .settings_cache import settings_cache
+from .request_router import route_stats
+from .discovery_runs import list_runs
 from .voiceover_pipeline import run_voiceover_pipeline
 from .pipeline_v2 import run_pipeline_v2
 
 
-app = FastAPI(title='Shorts/Reels Python Automation Service')
+app = FastAPI(title='Shorts/Reels Python Automation Service', default_response_class=MongoJSONResponse)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=['*'],
@@ -39,13 +57,27 @@ def build_playboard_manual_topic_label(config: dict | None = None) -> str:
 
 @app.on_event('startup')
 async def startup_event():
-    ensure_indexes()
-    get_or_create_settings()
+    await ensure_indexes()
+    await log_sink.start()
+    await video_state.start()
+    asyncio.create_task(log_sink.backfill_expiry())
+    asyncio.create_task(backfill_search_keys())
+    asyncio.create_task(transcript_store.migrate_inline())
+    await get_or_create_settings()
+    await settings_cache.start()
     
     # Initialize TranscriptService with database collection for persistent rate-limit cache
     TranscriptService.set_db_collection(logs)
     print('[startup] TranscriptService initialized with persistent rate-limit cache')
     
+    # Kill Chromium left behind by a crashed previous process before launching new ones
+    try:
+        await browser_watchdog.start()
+    except Exception as e:
+        print(f'[startup] browser watchdog failed to start: {e}')
+
+    await proxy_manager.start()
+
     reset_result = await reset_orphaned_downloads()
     if reset_result.get('reset'):
         print(f"[startup] reset orphaned download states: {reset_result}")
@@ -63,33 +95,45 @@ async def startup_event():
     except Exception as e:
         print(f"[startup] cleanup invalid youtube records failed: {e}")
 
+    # Warm authenticated Playboard contexts so config runs don't pay for launch/login
+    try:
+        await playboard_sessions.start()
+    except Exception as e:
+        print(f'[startup] playboard session pool failed to start: {e}')
+
     if ENABLE_SCHEDULER:
         await reload_scheduler()
 
 
+@app.on_event('shutdown')
+async def shutdown_event():
+    await captcha_pauses.stop()
+    await playboard_sessions.stop()
+    await browser_pool.stop()
+    await browser_watchdog.stop()
+    await proxy_manager.stop()
+    await settings_cache.stop()
+    await video_state.stop()
+    await log_sink.stop()
+    await close_http_client()
+    await close_db()
 
 
 async def reload_scheduler():
     scheduler.remove_all_jobs()
-    s = get_or_create_settings()
+    s = await get_or_create_settings()
     scheduler.add_job(discover_all, 'cron', **cron_to_args(s.get('cronTimes', {}).get('discover', '0 7 * * *')), id='discover')
     scheduler.add_job(scan_all_channels, 'cron', **cron_to_args(s.get('cronTimes', {}).get('scan', '30 8 * * *')), id='scan')
     scheduler.add_job(discover_pexels, 'cron', **cron_to_args(s.get('cronTimes', {}).get('pexels', '15 7 * * *')), id='discover-pexels')
+    if ARCHIVE_ENABLED:
+        scheduler.add_job(archive_videos, 'cron', **cron_to_args(s.get('cronTimes', {}).get('archive', '45 3 * * *')), id='archive')
     if not scheduler.running:
         scheduler.start()
 
 
-def cron_to_args(expr):
-    parts = expr.split()
-    if len(parts) != 5:
-        parts = ['0', '7', '*', '*', '*']
-    minute, hour, day, month, dow = parts
-    return {'minute': minute, 'hour': hour, 'day': day, 'month': month, 'day_of_week': dow}
-
-
 async def _enqueue_pending_videos(limit: int) -> dict:
     pending_cursor = videos.find({'downloadStatus': 'pending'}).sort([('views', -1), ('discoveredAt', -1)]).limit(limit)
-    pending_items = list(pending_cursor)
+    pending_items = await pending_cursor.to_list()
 
     queued = 0
     skipped = 0
@@ -105,34 +149,72 @@ async def _enqueue_pending_videos(limit: int) -> dict:
 
 
 @app.get('/api/shorts-reels/stats/overview')
-async def stats_overview():
-    recent = [normalize(x) for x in videos.find().sort([('discoveredAt', -1)]).limit(10)]
-    return {
-        'channels': channels.count_documents({}),
-        'videos': videos.count_documents({}),
-        'pexelsSubVideos': videos.count_documents({'platform': 'pexels'}),
-        'pending': videos.count_documents({'downloadStatus': 'pending'}),
-        'failed': videos.count_documents({'downloadStatus': 'failed'}),
-        'done': videos.count_documents({'downloadStatus': 'done'}),
-        'queue': queue_stats(),
-        'recent': recent,
-    }
+async def stats_overview(fresh: bool = Query(False, description='Re-aggregate instead of serving the materialized stats')):
+    overview, channel_count, archived_count, queue = await asyncio.gather(
+        get_overview(fresh=fresh),
+        channels.estimated_document_count(),
+        video_tombstones.estimated_document_count(),
+        queue_stats(persisted=False),
+    )
+    queue['persistedQueued'] = overview.pop('persistedQueued')
+    queue['persistedRunning'] = overview.pop('persistedRunning')
+    return MongoJSONResponse({'channels': channel_count, **overview, 'archived': archived_count, 'queue': queue})
+
+
+def _projection(fields: str | None, summary: list | None = None) -> dict | None:
+    try:
+        return projection(fields, summary)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def _page(collection, query: dict, sort: list, limit: int, cursor: str | None, page: int | None, projection: dict | None, count: str | None) -> MongoJSONResponse:
+    """Keyset page after `cursor`; without one, `page` (default 1) keeps the old skip paging and totals."""
+    try:
+        result = await paginate(
+            collection, query, sort, limit,
+            cursor=cursor, page=page or (None if cursor else 1), projection=projection, count=count,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return MongoJSONResponse(result)
 
 
 @app.get('/api/shorts-reels/channels')
-async def get_channels(page: int = 1, limit: int = 20, search: str = ''):
-    query = {}
-    if search:
-        query = {'$or': [{'name': {'$regex': search, '$options': 'i'}}, {'channelId': {'$regex': search, '$options': 'i'}}]}
-    cursor = channels.find(query).sort([('priority', -1), ('updatedAt', -1)]).skip((page-1)*limit).limit(limit)
-    items = [normalize(x) for x in cursor]
-    total = channels.count_documents(query)
-    return {'items': items, 'total': total, 'page': page, 'pages': (total + limit - 1)//limit}
+async def get_channels(
+    page: int | None = Query(default=None, ge=1),
+    limit: int = Query(default=20, ge=1, le=500),
+    search: str = '',
+    fields: str | None = None,
+    cursor: str | None = None,
+    count: str | None = Query(default=None, description="'exact', 'estimate' or 'none'"),
+):
+    # Blank lists every channel; a search of only punctuation / stray letters matches none
+    query = (search_filter(search) or NO_MATCH) if search.strip() else {}
+    return await _page(channels, query, CHANNEL_SORT, limit, cursor, page, _projection(fields), count)
+
+
+CHANNEL_SUMMARY_FIELDS = ['platform', 'channelId', 'name', 'topics', 'priority', 'totalVideos', 'isActive', 'updatedAt']
+
+
+@app.get('/api/shorts-reels/search')
+async def search(
+    q: str = Query(..., min_length=1, max_length=200),
+    type: str = Query(default='all', description="'all', 'videos' or 'channels'"),
+    limit: int = Query(default=20, ge=1, le=100),
+):
+    if type not in ('all', 'videos', 'channels'):
+        raise HTTPException(status_code=400, detail="type must be 'all', 'videos' or 'channels'")
+    found_videos, found_channels = await asyncio.gather(
+        search_videos(q, limit, {name: 1 for name in VIDEO_SUMMARY_FIELDS}) if type != 'channels' else asyncio.sleep(0, []),
+        search_channels(q, limit, {name: 1 for name in CHANNEL_SUMMARY_FIELDS}) if type != 'videos' else asyncio.sleep(0, []),
+    )
+    return MongoJSONResponse({'query': q, 'videos': found_videos, 'channels': found_channels})
 
 
 @app.post('/api/shorts-reels/channels/{channel_id}/manual-scan')
 async def manual_scan(channel_id: str):
-    ch = channels.find_one({'_id': ObjectId(channel_id)})
+    ch = await channels.find_one({'_id': ObjectId(channel_id)})
     if not ch:
         raise HTTPException(status_code=404, detail='Channel not found')
 
@@ -144,14 +226,17 @@ async def manual_scan(channel_id: str):
 
 @app.get('/api/shorts-reels/videos')
 async def get_videos(
-    page: int = 1,
-    limit: int = 20,
+    page: int | None = Query(default=None, ge=1),
+    limit: int = Query(default=20, ge=1, le=500),
     platform: str | None = None,
     topic: str | None = None,
     status: str | None = None,
     minViews: int | None = None,
     from_date: str | None = Query(default=None, alias='from'),
     to: str | None = None,
+    fields: str | None = Query(default=None, description="Comma-separated fields, 'summary' (default) or 'all'"),
+    cursor: str | None = Query(default=None, description='nextCursor of the previous page'),
+    count: str | None = Query(default=None, description="'exact' (default on the first page), 'estimate' or 'none'"),
 ):
     query = {}
     if platform:
@@ -169,18 +254,16 @@ async def get_videos(
         if to:
             query['discoveredAt']['$lte'] = datetime.fromisoformat(to)
 
-    cursor = videos.find(query).sort([('discoveredAt', -1)]).skip((page-1)*limit).limit(limit)
-    items = [normalize(x) for x in cursor]
-    total = videos.count_documents(query)
-    return {'items': items, 'total': total, 'page': page, 'pages': (total + limit - 1)//limit}
+    # Summary shape by default: the full transcript / voiceover / Drive fields stay in Mongo
+    return await _page(videos, query, VIDEO_SORT, limit, cursor, page, _projection(fields, VIDEO_SUMMARY_FIELDS), count)
 
 
 @app.post('/api/shorts-reels/videos/{video_id}/re-download')
 async def redownload(video_id: str):
-    v = videos.find_one({'_id': ObjectId(video_id)})
+    v = await videos.find_one({'_id': ObjectId(video_id)})
     if not v:
         raise HTTPException(status_code=404, detail='Video not found')
-    videos.update_one({'_id': v['_id']}, {'$set': {'downloadStatus': 'pending', 'queueState': 'pending', 'failReason': ''}})
+    video_state.transition(v, 'pending', {'failReason': ''})
     await enqueue(str(v['_id']), 1 if v.get('views', 0) > 1_000_000 else 5)
     return {'success': True}
 
@@ -195,8 +278,8 @@ async def trigger_pending_downloads(limit: int = Query(default=200, ge=1, le=200
         'queued': queue_result.get('queued', 0),
         'skipped': queue_result.get('skipped', 0),
         'considered': queue_result.get('considered', 0),
-        'pendingTotal': videos.count_documents({'downloadStatus': 'pending'}),
-        'queue': queue_stats(),
+        'pendingTotal': await videos.count_documents({'downloadStatus': 'pending'}),
+        'queue': await queue_stats(),
         'message': (
             'No new pending videos were queued'
             if queue_result.get('queued', 0) == 0
@@ -231,7 +314,7 @@ async def run_voiceover(payload: dict):
     results = []
     for vid in video_ids:
         try:
-            doc = videos.find_one({'_id': ObjectId(vid)})
+            doc = await videos.find_one({'_id': ObjectId(vid)})
             if not doc:
                 results.append({'videoId': str(vid), 'success': False, 'error': 'Video not found'})
                 continue
@@ -281,22 +364,17 @@ async def run_voiceover(payload: dict):
                     enable_voiceover=enable_voiceover,
                 )
 
-            videos.update_one(
-                {'_id': doc['_id']},
-                {
-                    '$set': {
-                        'voiceover': {
-                            'status': 'done',
-                            'outputVideoPath': assets.get('outputVideoPath', ''),
-                            'audioPath': assets.get('voicePath', ''),
-                            'subtitlePath': assets.get('subtitlePath', ''),
-                            'transcriptPath': assets.get('transcriptPath', ''),
-                            'translatedPath': assets.get('translatedPath', ''),
-                            'updatedAt': datetime.utcnow(),
-                        }
-                    }
+            video_state.update(doc['_id'], {
+                'voiceover': {
+                    'status': 'done',
+                    'outputVideoPath': assets.get('outputVideoPath', ''),
+                    'audioPath': assets.get('voicePath', ''),
+                    'subtitlePath': assets.get('subtitlePath', ''),
+                    'transcriptPath': assets.get('transcriptPath', ''),
+                    'translatedPath': assets.get('translatedPath', ''),
+                    'updatedAt': datetime.utcnow(),
                 }
-            )
+            })
 
             results.append({'videoId': str(vid), 'success': True, 'assets': assets})
         except Exception as e:
@@ -309,7 +387,18 @@ async def run_voiceover(payload: dict):
 
 
 @app.get('/api/shorts-reels/logs')
-async def get_logs(jobType: str | None = None, status: str | None = None, from_date: str | None = Query(default=None, alias='from'), to: str | None = None):
+async def get_logs(
+    jobType: str | None = None,
+    status: str | None = None,
+    from_date: str | None = Query(default=None, alias='from'),
+    to: str | None = None,
+    fields: str | None = None,
+    limit: int = Query(default=200, ge=1, le=500),
+    cursor: str | None = None,
+    count: str | None = Query(default='none', description="'exact', 'estimate' or 'none'"),
+):
+    # Show entries still sitting in the write buffer
+    await log_sink.flush()
     query = {}
     if jobType:
         query['jobType'] = jobType
@@ -322,18 +411,21 @@ async def get_logs(jobType: str | None = None, status: str | None = None, from_d
         if to:
             query['ranAt']['$lte'] = datetime.fromisoformat(to)
 
-    items = [normalize(x) for x in logs.find(query).sort([('ranAt', -1)]).limit(200)]
-    return {'items': items}
+    try:
+        result = await paginate(logs, query, LOG_SORT, limit, cursor=cursor, projection=_projection(fields), count=count)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return MongoJSONResponse(result)
 
 
 @app.get('/api/shorts-reels/settings')
 async def get_settings():
-    return get_or_create_settings()
+    return await get_or_create_settings()
 
 
 @app.post('/api/shorts-reels/settings')
 async def save_settings(payload: dict):
-    saved = update_settings(payload)
+    saved = await update_settings(payload)
     await start_worker()
     if ENABLE_SCHEDULER:
         await reload_scheduler()
@@ -341,9 +433,10 @@ async def save_settings(payload: dict):
 
 
 @app.post('/api/shorts-reels/jobs/trigger')
-async def trigger_job(type: str = Query(...)):
+async def trigger_job(type: str = Query(...), fresh: bool = Query(False)):
     if type == 'discover':
-        return await discover_all()
+        # Re-triggering inside the same cron window resumes the interrupted run unless fresh=true
+        return await discover_all(resume=not fresh)
     if type == 'scan':
         # Manual scan from dashboard: run without proxy, always headless
         return await scan_all_channels(use_proxy=False, headless_override=True)
@@ -403,7 +496,7 @@ async def get_playboard_config_options():
 @app.get('/api/shorts-reels/playboard/configs')
 async def get_playboard_configs():
     """Get saved Playboard discovery configs from settings"""
-    setting = get_or_create_settings()
+    setting = await get_or_create_settings()
     configs = setting.get('playboardConfigs', [])
     return {'configs': configs, 'total': len(configs)}
 
@@ -414,7 +507,7 @@ async def save_playboard_config(config: dict):
     if not config.get('dimension') or not config.get('category'):
         raise HTTPException(status_code=400, detail='dimension and category are required')
     
-    setting = get_or_create_settings()
+    setting = await get_or_create_settings()
     configs = setting.get('playboardConfigs', [])
     
     # Add timestamp and ensure required fields
@@ -423,7 +516,7 @@ async def save_playboard_config(config: dict):
     config['priority'] = config.get('priority', 5)
     
     configs.append(config)
-    update_settings({'playboardConfigs': configs})
+    await update_settings({'playboardConfigs': configs})
     
     return {'success': True, 'config': config, 'totalConfigs': len(configs)}
 
@@ -431,14 +524,14 @@ async def save_playboard_config(config: dict):
 @app.delete('/api/shorts-reels/playboard/configs/{config_id}')
 async def delete_playboard_config(config_id: int):
     """Delete Playboard discovery config by index"""
-    setting = get_or_create_settings()
+    setting = await get_or_create_settings()
     configs = setting.get('playboardConfigs', [])
     
     if config_id < 0 or config_id >= len(configs):
         raise HTTPException(status_code=404, detail='Config not found')
     
     configs.pop(config_id)
-    update_settings({'playboardConfigs': configs})
+    await update_settings({'playboardConfigs': configs})
     
     return {'success': True, 'totalConfigs': len(configs)}
 
@@ -446,7 +539,7 @@ async def delete_playboard_config(config_id: int):
 @app.post('/api/shorts-reels/playboard/configs/{config_id}')
 async def update_playboard_config(config_id: int, updates: dict):
     """Update Playboard discovery config"""
-    setting = get_or_create_settings()
+    setting = await get_or_create_settings()
     configs = setting.get('playboardConfigs', [])
     
     if config_id < 0 or config_id >= len(configs):
@@ -454,11 +547,57 @@ async def update_playboard_config(config_id: int, updates: dict):
     
     configs[config_id].update(updates)
     configs[config_id]['updatedAt'] = datetime.utcnow().isoformat()
-    update_settings({'playboardConfigs': configs})
+    await update_settings({'playboardConfigs': configs})
     
     return {'success': True, 'config': configs[config_id]}
 
 
+@app.get('/api/shorts-reels/playboard/sessions')
+async def get_playboard_sessions():
+    """Warm Playboard session pool state (accounts, cookie expiry, leases)"""
+    return playboard_sessions.stats()
+
+
+@app.get('/api/shorts-reels/playboard/engines')
+async def get_playboard_engine_stats():
+    """Per-engine win rate and time-to-first-rows used to order hedged Playboard attempts"""
+    return {
+        'hedging': PLAYBOARD_HEDGE_ENABLED,
+        'ranking': playboard_engine_stats.rank(list(playboard_engine_stats.engines) or ['playwright']),
+        'engines': playboard_engine_stats.snapshot(),
+    }
+
+
+@app.get('/api/shorts-reels/proxies/health')
+async def get_proxy_health():
+    """Per-proxy circuit state, success/latency EWMAs (overall and per target host) and last probe"""
+    return proxy_manager.stats()
+
+
+@app.get('/api/shorts-reels/browser-pool/stats')
+async def get_browser_pool_stats():
+    """Warm Chromium pool state (browsers per proxy, leases, pages served, RSS)"""
+    return browser_pool.stats()
+
+
+@app.get('/api/shorts-reels/browsers/watchdog')
+async def get_browser_watchdog():
+    """Live Chromium processes spawned by the service (RSS, age, owner) and watchdog kill counters"""
+    return await asyncio.to_thread(browser_watchdog.stats)
+
+
+@app.get('/api/shorts-reels/resource-blocking/stats')
+async def get_resource_blocking_stats():
+    """Blocked requests and estimated bytes/time saved per scraping source"""
+    return route_stats()
+
+
+@app.get('/api/shorts-reels/discovery-runs')
+async def get_discovery_runs(limit: int = Query(20, ge=1, le=200)):
+    """Recent checkpointed discover_all runs (completed steps, Kuaishou cursor, resume count)"""
+    return await list_runs('discover', limit)
+
+
 @app.post('/api/shorts-reels/playboard/manual-discover')
 async def manual_discover_playboard(config: dict, topics: list[str] | None = None):
     """
@@ -499,7 +638,7 @@ async def manual_discover_playboard(config: dict, topics: list[str] | None = Non
                 failed += 1
         
         duration = int((time.time() - started) * 1000)
-        log_job(
+        await log_job(
             'discover',
             'success',
             isManual=True,
@@ -520,7 +659,7 @@ async def manual_discover_playboard(config: dict, topics: list[str] | None = Non
         }
     except Exception as ex:
         duration = int((time.time() - started) * 1000)
-        log_job(
+        await log_job(
             'discover',
             'failed',
             isManual=True,
@@ -548,16 +687,23 @@ async def manual_discover_dailyhaha(payload: dict | None = None):
     failed = 0
 
     try:
-        for topic in target_topics:
+        if (await get_or_create_settings()).get('discoverFanout', True):
             try:
-                await asyncio.sleep(1 + random.random())
-                found += await discover_dailyhaha(topic)
+                found += await discover_dailyhaha_fanout(target_topics)
             except Exception as e:
-                print(f"[ManualDailyHaha] Failed for topic {topic}: {e}")
-                failed += 1
+                print(f"[ManualDailyHaha] Fan-out failed for topics {target_topics}: {e}")
+                failed += len(target_topics)
+        else:
+            for topic in target_topics:
+                try:
+                    await asyncio.sleep(1 + random.random())
+                    found += await discover_dailyhaha(topic)
+                except Exception as e:
+                    print(f"[ManualDailyHaha] Failed for topic {topic}: {e}")
+                    failed += 1
 
         duration = int((time.time() - started) * 1000)
-        log_job('discover', 'success', isManual=True, platform='dailyhaha', itemsFound=found, failedTopics=failed, duration=duration)
+        await log_job('discover', 'success', isManual=True, platform='dailyhaha', itemsFound=found, failedTopics=failed, duration=duration)
 
         return {
             'success': True,
@@ -568,7 +714,7 @@ async def manual_discover_dailyhaha(payload: dict | None = None):
         }
     except Exception as ex:
         duration = int((time.time() - started) * 1000)
-        log_job('discover', 'failed', isManual=True, platform='dailyhaha', itemsFound=found, error=str(ex), duration=duration)
+        await log_job('discover', 'failed', isManual=True, platform='dailyhaha', itemsFound=found, error=str(ex), duration=duration)
         raise HTTPException(status_code=500, detail=f'Manual DailyHaha discovery failed: {str(ex)}')
 
 
@@ -586,16 +732,23 @@ async def manual_discover_douyin(payload: dict | None = None):
     failed = 0
 
     try:
-        for topic in target_topics:
+        if (await get_or_create_settings()).get('discoverFanout', True):
             try:
-                await asyncio.sleep(1 + random.random())
-                found += await discover_douyin(topic)
+                found += await discover_douyin_fanout(target_topics)
             except Exception as e:
-                print(f"[ManualDouyin] Failed for topic {topic}: {e}")
-                failed += 1
+                print(f"[ManualDouyin] Fan-out failed for topics {target_topics}: {e}")
+                failed += len(target_topics)
+        else:
+            for topic in target_topics:
+                try:
+                    await asyncio.sleep(1 + random.random())
+                    found += await discover_douyin(topic)
+                except Exception as e:
+                    print(f"[ManualDouyin] Failed for topic {topic}: {e}")
+                    failed += 1
 
         duration = int((time.time() - started) * 1000)
-        log_job('discover', 'success', isManual=True, platform='douyin', itemsFound=found, failedTopics=failed, duration=duration)
+        await log_job('discover', 'success', isManual=True, platform='douyin', itemsFound=found, failedTopics=failed, duration=duration)
 
         return {
             'success': True,
@@ -606,7 +759,7 @@ async def manual_discover_douyin(payload: dict | None = None):
         }
     except Exception as ex:
         duration = int((time.time() - started) * 1000)
-        log_job('discover', 'failed', isManual=True, platform='douyin', itemsFound=found, error=str(ex), duration=duration)
+        await log_job('discover', 'failed', isManual=True, platform='douyin', itemsFound=found, error=str(ex), duration=duration)
         raise HTTPException(status_code=500, detail=f'Manual Douyin discovery failed: {str(ex)}')
 
 
@@ -620,7 +773,7 @@ async def manual_discover_pexels():
         result = await discover_pexels()
         found = int(result.get('itemsFound', 0))
         duration = int((time.time() - started) * 1000)
-        log_job('discover', 'success', isManual=True, platform='pexels', itemsFound=found, duration=duration)
+        await log_job('discover', 'success', isManual=True, platform='pexels', itemsFound=found, duration=duration)
 
         return {
             'success': True,
@@ -630,7 +783,7 @@ async def manual_discover_pexels():
         }
     except Exception as ex:
         duration = int((time.time() - started) * 1000)
-        log_job('discover', 'failed', isManual=True, platform='pexels', itemsFound=found, error=str(ex), duration=duration)
+        await log_job('discover', 'failed', isManual=True, platform='pexels', itemsFound=found, error=str(ex), duration=duration)
         raise HTTPException(status_code=500, detail=f'Manual Pexels discovery failed: {str(ex)}')
 
 
@@ -642,7 +795,7 @@ async def manual_discover_kuaishou():
         result = await discover_kuaishou()
         found = int(result.get('itemsFound', 0))
         duration = int((time.time() - started) * 1000)
-        log_job('discover', 'success', isManual=True, platform='kuaishou', itemsFound=found, duration=duration)
+        await log_job('discover', 'success', isManual=True, platform='kuaishou', itemsFound=found, duration=duration)
 
         return {
             'success': True,
@@ -652,14 +805,14 @@ async def manual_discover_kuaishou():
         }
     except Exception as ex:
         duration = int((time.time() - started) * 1000)
-        log_job('discover', 'failed', isManual=True, platform='kuaishou', itemsFound=found, error=str(ex), duration=duration)
+        await log_job('discover', 'failed', isManual=True, platform='kuaishou', itemsFound=found, error=str(ex), duration=duration)
         raise HTTPException(status_code=500, detail=f'Manual Kuaishou discovery failed: {str(ex)}')
 
 @app.get('/api/shorts-reels/captcha/jobs')
 async def get_captcha_jobs(limit: int = Query(default=50, ge=1, le=500)):
     query = {'jobType': 'captcha', 'status': 'paused_captcha', 'extra.resolved': {'$ne': True}}
-    items = [normalize(x) for x in logs.find(query).sort([('ranAt', -1)]).limit(limit)]
-    return {'items': items, 'total': len(items)}
+    items = await logs.find(query).sort([('ranAt', -1)]).limit(limit).to_list()
+    return MongoJSONResponse({'items': items, 'total': len(items)})
 
 
 @app.post('/api/shorts-reels/captcha/jobs/{job_id}/resolve')
@@ -669,15 +822,85 @@ async def resolve_captcha_job(job_id: str):
     except Exception:
         raise HTTPException(status_code=400, detail='Invalid job id')
 
-    result = logs.update_one(
+    now = datetime.utcnow()
+    resolved = {'extra.resolved': True, 'extra.resolvedAt': now, 'updatedAt': now}
+    # Resolved captcha jobs start their retention period now
+    if expire_at('captcha', now):
+        resolved['expireAt'] = expire_at('captcha', now)
+    result = await logs.update_one(
         {'_id': oid, 'jobType': 'captcha', 'status': 'paused_captcha'},
-        {'$set': {'extra.resolved': True, 'extra.resolvedAt': datetime.utcnow(), 'updatedAt': datetime.utcnow()}},
+        {'$set': resolved},
     )
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail='CAPTCHA job not found')
 
-    updated = logs.find_one({'_id': oid})
-    return {'success': True, 'item': normalize(updated)}
+    updated = await logs.find_one({'_id': oid})
+    # Continue the paused collection: in its held browser if still open, else from the stored cursor
+    resumed = await captcha_pauses.resolve(job_id, updated)
+    return {'success': True, 'item': normalize(updated), 'resumed': resumed}
+
+
+@app.get('/api/shorts-reels/captcha/paused')
+async def get_captcha_paused():
+    """Browser contexts currently held open for unresolved captcha jobs"""
+    return captcha_pauses.stats()
+
+
+@app.get('/api/shorts-reels/logs/sink')
+async def get_log_sink_stats():
+    return log_sink.stats()
+
+
+@app.get('/api/shorts-reels/archive')
+async def get_archived_videos(
+    limit: int = Query(default=20, ge=1, le=500),
+    platform: str | None = None,
+    status: str | None = None,
+    fields: str | None = None,
+    cursor: str | None = None,
+    count: str | None = Query(default='none', description="'exact', 'estimate' or 'none'"),
+):
+    query = {}
+    if platform:
+        query['platform'] = platform
+    if status:
+        query['downloadStatus'] = status
+    return await _page(videos_archive, query, VIDEO_SORT, limit, cursor, None, _projection(fields, VIDEO_SUMMARY_FIELDS + ['archivedAt']), count)
+
+
+@app.get('/api/shorts-reels/archive/stats')
+async def get_archive_stats():
+    return await archive_stats()
+
+
+@app.post('/api/shorts-reels/archive/run')
+async def run_archive():
+    return await archive_videos()
+
+
+@app.post('/api/shorts-reels/archive/restore')
+async def restore_archived(payload: dict):
+    """Restore archived videos: {"ids": [...]} and/or {"videos": [{"platform", "videoId"}, ...]}."""
+    ids = payload.get('ids') or []
+    keys = payload.get('videos') or []
+    if not ids and not keys:
+        raise HTTPException(status_code=400, detail='ids or videos is required')
+    if not all(isinstance(i, str) and ObjectId.is_valid(i) for i in ids):
+        raise HTTPException(status_code=400, detail='Invalid video id')
+    if not all(isinstance(k, dict) and k.get('platform') and k.get('videoId') for k in keys):
+        raise HTTPException(status_code=400, detail='videos entries need platform and videoId')
+    result = await restore_videos([ObjectId(i) for i in ids], keys)
+    return {'success': True, **result}
+
+
+@app.get('/api/shorts-reels/settings/cache')
+async def get_settings_cache_stats():
+    return settings_cache.stats()
+
+
+@app.get('/api/shorts-reels/http-cache/stats')
+async def get_http_cache_stats():
+    return await cache_stats()
 
 
 @app.get('/healthz')
@@ -699,7 +922,7 @@ async def upload_downloaded_videos_to_drive():
         started = time.time()
         
         # Get all videos that are downloaded but not uploaded  
-        pending = list(videos.find({'downloadStatus': 'done', 'driveUploadStatus': {'$ne': 'done'}}))
+        pending = await videos.find({'downloadStatus': 'done', 'driveUploadStatus': {'$ne': 'done'}}).to_list()
         
         if not pending:
             return {'success': True, 'message': 'No pending uploads', 'processed': 0}
@@ -708,9 +931,9 @@ async def upload_downloaded_videos_to_drive():
         print(f"   Note: Uploads should be handled automatically via backend API during download")
         
         # Check upload status
-        uploaded = videos.count_documents({'driveUploadStatus': 'done'})
-        upload_failed = videos.count_documents({'driveUploadStatus': 'failed'})
-        upload_skipped = videos.count_documents({'driveUploadStatus': 'skipped'})
+        uploaded = await videos.count_documents({'driveUploadStatus': 'done'})
+        upload_failed = await videos.count_documents({'driveUploadStatus': 'failed'})
+        upload_skipped = await videos.count_documents({'driveUploadStatus': 'skipped'})
         
         duration = int((time.time() - started) * 1000)
         
@@ -731,25 +954,57 @@ async def upload_downloaded_videos_to_drive():
 async def get_upload_status():
     """Get current upload status for all videos"""
     return {
-        'downloaded': videos.count_documents({'downloadStatus': 'done'}),
-        'uploaded': videos.count_documents({'uploadStatus': 'done'}),
-        'uploadFailed': videos.count_documents({'uploadStatus': 'failed'}),
-        'pendingUpload': videos.count_documents({'downloadStatus': 'done', 'uploadStatus': {'$ne': 'done'}}),
-        'withAssets': videos.count_documents({'assetId': {'$exists': True}})
+        'downloaded': await videos.count_documents({'downloadStatus': 'done'}),
+        'uploaded': await videos.count_documents({'uploadStatus': 'done'}),
+        'uploadFailed': await videos.count_documents({'uploadStatus': 'failed'}),
+        'pendingUpload': await videos.count_documents({'downloadStatus': 'done', 'uploadStatus': {'$ne': 'done'}}),
+        'withAssets': await videos.count_documents({'assetId': {'$exists': True}})
     }
 
 
+# Declared after the fixed /videos/... GET routes so it doesn't shadow them
+@app.get('/api/shorts-reels/videos/{video_id}')
+async def get_video(video_id: str, fields: str | None = Query(default=None, description="Comma-separated fields or 'all' (default)")):
+    """Full video document (transcript, voiceover, Drive fields) that the list endpoint leaves out."""
+    if not ObjectId.is_valid(video_id):
+        raise HTTPException(status_code=400, detail='Invalid video id')
+    doc = await videos.find_one({'_id': ObjectId(video_id)}, _projection(fields))
+    if not doc:
+        raise HTTPException(status_code=404, detail='Video not found')
+    return MongoJSONResponse(doc)
+
+
+@app.get('/api/shorts-reels/videos/{video_id}/transcript')
+async def get_video_transcript(video_id: str, format: str = Query(default='srt', description="'srt', 'text' or 'segments'")):
+    """Transcript rendered from the stored segments."""
+    if not ObjectId.is_valid(video_id):
+        raise HTTPException(status_code=400, detail='Invalid video id')
+    try:
+        transcript = await transcript_store.render(ObjectId(video_id), format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if transcript is None:
+        raise HTTPException(status_code=404, detail='Transcript not found')
+    return MongoJSONResponse({'videoId': video_id, 'format': format, 'transcript': transcript})
+
+
+@app.get('/api/shorts-reels/transcripts/stats')
+async def transcripts_stats():
+    return transcript_store.stats()
+
+
 @app.post('/api/shorts-reels/videos/{video_id}/upload-to-drive')
 async def upload_single_video_to_drive(video_id: str):
     """Upload a specific video to Google Drive via backend API"""
     try:
         from .simple_upload import upload_video_to_backend_api
         
-        video = videos.find_one({'_id': ObjectId(video_id)})
+        video = await videos.find_one({'_id': ObjectId(video_id)})
         if not video:
             raise HTTPException(status_code=404, detail='Video not found')
         
-        if video.get('downloadStatus') != 'done':
+        # A transition not flushed yet is newer than the stored status
+        if (DOWNLOAD_STATUS.get(video_state.current(video_id)) or video.get('downloadStatus')) != 'done':
             raise HTTPException(status_code=400, detail='Video not downloaded yet')
         
         local_path = video.get('localPath')
@@ -762,20 +1017,16 @@ async def upload_single_video_to_drive(video_id: str):
         
         if upload_result:
             # Update video record
-            videos.update_one(
-                {'_id': ObjectId(video_id)},
-                {
-                    '$set': {
-                        'driveUploadStatus': 'done',
-                        'driveFileId': upload_result.get('fileId') or upload_result.get('id'),
-                        'driveWebLink': upload_result.get('webViewLink') or upload_result.get('weblink'),
-                        'driveUploadedAt': datetime.utcnow()
-                    }
-                }
-            )
+            video_state.update(video_id, {
+                'driveUploadStatus': 'done',
+                'driveFileId': upload_result.get('fileId') or upload_result.get('id'),
+                'driveWebLink': upload_result.get('webViewLink') or upload_result.get('weblink'),
+                'driveUploadedAt': datetime.utcnow()
+            })
             
             # Fetch updated video to return current state
-            updated = videos.find_one({'_id': ObjectId(video_id)})
+            await video_state.flush()
+            updated = await videos.find_one({'_id': ObjectId(video_id)})
             return {
                 'success': True,
                 'video': normalize(updated),
@@ -0,0 +1,132 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+`.skip((page-1)*limit)` makes Mongo walk and discard every row before the
+page, so deep pages get slower. Here a page is a range query that continues
+after the last row of the previous page, on an index that matches the sort:
+
+    videos   (discoveredAt, _id)
+    channels (priority, updatedAt, _id)
+    logs     (ranAt, _id)
+
+`_id` is the tie-breaker, so the order is total. The continuation token is
+the last row's sort values in Extended JSON, base64url-encoded and opaque to
+clients. A total count is only computed when asked for: `exact`
+(count_documents), `estimate` (collection metadata when unfiltered, else a
+count capped at COUNT_ESTIMATE_CAP) or `none`.
+"""
+
+import base64
+from typing import Dict, List, Optional, Tuple
+
+from bson import json_util
+
+VIDEO_SORT = [('discoveredAt', -1), ('_id', -1)]
+CHANNEL_SORT = [('priority', -1), ('updatedAt', -1), ('_id', -1)]
+LOG_SORT = [('ranAt', -1), ('_id', -1)]
+
+COUNT_MODES = {'exact', 'estimate', 'none'}
+COUNT_ESTIMATE_CAP = 10_000
+
+
+def _field_value(doc: Dict, field: str):
+    value = doc
+    for part in field.split('.'):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def encode_cursor(doc: Dict, sort: List[Tuple[str, int]]) -> str:
+    raw = json_util.dumps([_field_value(doc, field) for field, _ in sort])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token: str, sort: List[Tuple[str, int]]) -> List:
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        values = json_util.loads(raw)
+    except Exception:
+        raise ValueError('invalid cursor')
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise ValueError('invalid cursor')
+    return values
+
+
+def _after(field: str, direction: int, value) -> Optional[Dict]:
+    # Mongo sorts null/missing before every other value: last in descending order, first in ascending
+    if value is None:
+        return {field: {'$ne': None}} if direction > 0 else None
+    bound = {field: {'$gt' if direction > 0 else '$lt': value}}
+    if direction < 0:
+        return {'$or': [bound, {field: None}]}
+    return bound
+
+
+def keyset_filter(sort: List[Tuple[str, int]], values: List) -> Dict:
+    """Rows strictly after `values` in `sort` order."""
+    branches = []
+    for i, (field, direction) in enumerate(sort):
+        after = _after(field, direction, values[i])
+        if after is None:
+            continue
+        equal = {f: v for (f, _), v in zip(sort[:i], values[:i])}
+        branches.append({'$and': [equal, after]} if equal else after)
+    return {'$or': branches}
+
+
+async def _count(collection, query: Dict, mode: str) -> Dict:
+    if mode == 'exact':
+        return {'total': await collection.count_documents(query)}
+    if mode == 'estimate':
+        if not query:
+            return {'total': await collection.estimated_document_count(), 'totalEstimated': True}
+        total = await collection.count_documents(query, limit=COUNT_ESTIMATE_CAP)
+        return {'total': total, 'totalEstimated': total >= COUNT_ESTIMATE_CAP}
+    return {}
+
+
+async def paginate(
+    collection,
+    query: Dict,
+    sort: List[Tuple[str, int]],
+    limit: int,
+    cursor: Optional[str] = None,
+    page: Optional[int] = None,
+    projection: Optional[Dict] = None,
+    count: Optional[str] = None,
+) -> Dict:
+    """
+    One page of `collection` in `sort` order: {items, nextCursor, hasMore[, total, totalEstimated, page, pages]}.
+    `page` keeps the legacy skip paging; the count defaults to exact on the first page only.
+    """
+    count = count or ('none' if cursor else 'exact')
+    if count not in COUNT_MODES:
+        raise ValueError(f'count must be one of {", ".join(sorted(COUNT_MODES))}')
+
+    find_query = query
+    if cursor:
+        keyset = keyset_filter(sort, decode_cursor(cursor, sort))
+        find_query = {'$and': [query, keyset]} if query else keyset
+    if projection is not None:
+        # The next cursor is built from the sort fields
+        projection = {**projection, **{field: 1 for field, _ in sort}}
+
+    find = collection.find(find_query, projection).sort(sort)
+    if page and not cursor:
+        find = find.skip((page - 1) * limit)
+    rows = await find.limit(limit + 1).to_list()
+
+    has_more = len(rows) > limit
+    items = rows[:limit]
+    result = {
+        'items': items,
+        'limit': limit,
+        'hasMore': has_more,
+        'nextCursor': encode_cursor(items[-1], sort) if has_more and items else None,
+        **await _count(collection, query, count),
+    }
+    if page and not cursor:
+        result['page'] = page
+        if 'total' in result:
+            result['pages'] = (result['total'] + limit - 1) // limit
+    return result
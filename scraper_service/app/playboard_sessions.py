@@ -0,0 +1,426 @@
+"""
+Warm, authenticated Playboard browser contexts.
+
+Every Playboard config run used to launch Chromium, reload cookies from disk,
+sleep 3-15 s and possibly run the full login form. The pool keeps one context
+per configured account alive, checks cookie expiry locally (no network), logs in
+again in the background before cookies expire and rotates leases across
+accounts so rate limits are spread out.
+"""
+
+import asyncio
+import json
+import os
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+from .config import (
+    PLAYBOARD_COOKIES_FILE,
+    PLAYBOARD_USER_EMAIL,
+    PLAYBOARD_USER_PASSWORD,
+    PLAYBOARD_ACCOUNTS,
+    PLAYBOARD_SESSION_POOL,
+    PLAYBOARD_SESSION_REFRESH_INTERVAL_SEC,
+    PLAYBOARD_SESSION_REFRESH_MARGIN_SEC,
+    PLAYBOARD_SESSION_MIN_INTERVAL_SEC,
+    SCRAPER_HEADLESS,
+    SCRAPER_LOCALE,
+    SCRAPER_TIMEZONE,
+)
+from .browser_pool import browser_pool
+from .request_router import install_route_policy
+from .browser_watchdog import browser_watchdog
+
+PLAYBOARD_HOME = 'https://playboard.co/en/'
+SESSION_UA = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/134.0.0.0 Safari/537.36'
+# recycle() gives running leases this long to finish before it gives up
+RECYCLE_DRAIN_TIMEOUT_SEC = 600
+STEALTH_INIT_SCRIPT = """
+Object.defineProperty(navigator, 'webdriver', { get: () => undefined });
+Object.defineProperty(navigator, 'languages', { get: () => ['vi-VN', 'vi', 'en-US', 'en'] });
+"""
+
+
+def _cookies_file_for(email: str, primary: bool) -> str:
+    if primary and PLAYBOARD_COOKIES_FILE:
+        return PLAYBOARD_COOKIES_FILE
+    base_dir = os.path.dirname(PLAYBOARD_COOKIES_FILE) if PLAYBOARD_COOKIES_FILE else 'cookies'
+    slug = re.sub(r'[^a-z0-9]+', '-', email.lower()).strip('-') or 'default'
+    return os.path.join(base_dir, f'playboard.{slug}.cookies.json')
+
+
+def configured_accounts() -> List[Dict]:
+    accounts = []
+    if PLAYBOARD_USER_EMAIL and PLAYBOARD_USER_PASSWORD:
+        accounts.append({'email': PLAYBOARD_USER_EMAIL, 'password': PLAYBOARD_USER_PASSWORD})
+    for email, password in PLAYBOARD_ACCOUNTS:
+        if email and password and all(a['email'] != email for a in accounts):
+            accounts.append({'email': email, 'password': password})
+    for index, account in enumerate(accounts):
+        account['cookiesFile'] = _cookies_file_for(account['email'], primary=index == 0)
+    return accounts
+
+
+def load_cookies(cookies_file: str) -> List[Dict]:
+    if not cookies_file or not os.path.exists(cookies_file):
+        return []
+    try:
+        with open(cookies_file, 'r', encoding='utf-8') as f:
+            cookies = json.load(f)
+        return cookies if isinstance(cookies, list) else []
+    except Exception as e:
+        print(f'[playboard-session] read cookies failed ({cookies_file}): {e}')
+        return []
+
+
+def save_cookies(cookies_file: str, cookies: List[Dict]) -> None:
+    if not cookies_file:
+        return
+    try:
+        cookies_dir = os.path.dirname(cookies_file)
+        if cookies_dir:
+            os.makedirs(cookies_dir, exist_ok=True)
+        with open(cookies_file, 'w', encoding='utf-8') as f:
+            json.dump(cookies, f, indent=2)
+        print(f'[playboard-session] saved {len(cookies)} cookies to {cookies_file}')
+    except Exception as e:
+        print(f'[playboard-session] could not save cookies: {e}')
+
+
+def cookies_expire_at(cookies: List[Dict]) -> float:
+    """Earliest expiry among persistent playboard.co cookies (0 when there are none)."""
+    expiries = [
+        float(c.get('expires') or 0)
+        for c in cookies
+        if 'playboard.co' in str(c.get('domain') or '') and float(c.get('expires') or 0) > 0
+    ]
+    return min(expiries) if expiries else 0.0
+
+
+async def playboard_login(page, email: str = '', password: str = '', cookies_file: str = '') -> bool:
+    """
+    Detect and login to Playboard if needed
+    Returns True if login was successful or not needed, False if login failed
+    """
+    email = email or PLAYBOARD_USER_EMAIL
+    password = password or PLAYBOARD_USER_PASSWORD
+    cookies_file = cookies_file or PLAYBOARD_COOKIES_FILE
+    try:
+        print('[DEBUG] Checking if Playboard login is needed...')
+
+        # Check for "Too many requests" error
+        too_many_requests = await page.locator('text=Too many requests').count()
+        if too_many_requests > 0:
+            print('[DEBUG] Detected "Too many requests" error, need to sign in')
+
+        # Check for Sign in link/button (on error page it's an <a> tag)
+        sign_in_link = await page.locator('a[href*="/account/signin"], a:has-text("Sign in"), button:has-text("Sign in")').count()
+
+        if too_many_requests == 0 and sign_in_link == 0:
+            print('[DEBUG] No login needed, page loaded successfully')
+            return True
+
+        if not email or not password:
+            print('[ERROR] Playboard credentials not configured in .env (PLAYBOARD_USER_EMAIL, PLAYBOARD_USER_PASSWORD)')
+            return False
+
+        print(f'[DEBUG] Playboard login required, attempting login as {email}...')
+
+        # Click sign in link/button (prioritize the <a> link from error page)
+        sign_in_element = page.locator('a[href*="/account/signin"]').first
+        if await sign_in_element.count() == 0:
+            sign_in_element = page.locator('a:has-text("Sign in"), button:has-text("Sign in")').first
+
+        await sign_in_element.click(timeout=5000)
+        print('[DEBUG] Clicked Sign in button/link')
+        await asyncio.sleep(3)
+
+        # Wait for login form to appear
+        await page.wait_for_selector('input[name="email"], input[name="password"]', timeout=10000)
+        await asyncio.sleep(1)
+
+        # Fill email field - use input[name="email"]
+        email_field = page.locator('input[name="email"]')
+        if await email_field.count() > 0:
+            await email_field.fill(email)
+            print(f'[DEBUG] Entered email: {email}')
+            await asyncio.sleep(0.5)
+
+        # Fill password field - use input[name="password"]
+        password_field = page.locator('input[name="password"]')
+        if await password_field.count() > 0:
+            await password_field.fill(password)
+            print('[DEBUG] Entered password')
+            await asyncio.sleep(0.5)
+
+        # Click submit button - button[type="submit"]
+        submit_button = page.locator('button[type="submit"]')
+        if await submit_button.count() > 0:
+            await submit_button.click(timeout=5000)
+            print('[DEBUG] Clicked submit button')
+            await asyncio.sleep(3)
+
+        # Wait for page to fully load after login
+        try:
+            await page.wait_for_load_state('networkidle', timeout=15000)
+        except Exception:
+            await asyncio.sleep(2)
+
+        print('[DEBUG] Playboard login completed successfully')
+
+        # 💾 SAVE COOKIES for next time!
+        if cookies_file:
+            save_cookies(cookies_file, await page.context.cookies())
+
+        return True
+
+    except Exception as e:
+        print(f'[DEBUG] Playboard login failed: {e}')
+        return False
+
+
+class PlayboardSession:
+    def __init__(self, account: Dict):
+        self.account = account
+        self.context = None
+        self.lock = asyncio.Lock()
+        self.expires_at = 0.0
+        self.last_used = 0.0
+        self.last_validated = 0.0
+        self.needs_login = False
+        self.leases = 0
+        self.route_stats = None
+
+    @property
+    def email(self) -> str:
+        return self.account['email']
+
+    def is_fresh(self, margin_sec: float = 0) -> bool:
+        if self.context is None or self.needs_login:
+            return False
+        # Session cookies only (no expiry) are treated as fresh until a login prompt shows up
+        return self.expires_at == 0 or self.expires_at - time.time() > margin_sec
+
+    def invalidate(self) -> None:
+        self.needs_login = True
+
+    async def sync_cookies(self) -> None:
+        """Cheap freshness check: read cookies from the live context, no page load."""
+        if self.context is None:
+            return
+        cookies = await self.context.cookies()
+        self.expires_at = cookies_expire_at(cookies)
+        self.last_validated = time.time()
+
+    def snapshot(self) -> Dict:
+        return {
+            'email': self.email,
+            'ready': self.context is not None,
+            'busy': self.lock.locked(),
+            'needsLogin': self.needs_login,
+            'expiresAt': self.expires_at or None,
+            'lastUsed': self.last_used or None,
+            'lastValidated': self.last_validated or None,
+            'leases': self.leases,
+        }
+
+
+class PlayboardSessionPool:
+    def __init__(self):
+        self.sessions: List[PlayboardSession] = []
+        self._browser = None
+        self._browser_tag = ''
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._start_lock = asyncio.Lock()
+        self._cursor = 0
+
+    @property
+    def enabled(self) -> bool:
+        return PLAYBOARD_SESSION_POOL and bool(configured_accounts())
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        async with self._start_lock:
+            if self._browser is not None:
+                return
+            # Dedicated long-lived browser on the shared Playwright driver (see browser_pool)
+            playwright = await browser_pool.playwright()
+            self._browser_tag = browser_watchdog.register('playboard-sessions', on_limit=self.recycle)
+            self._browser = await playwright.chromium.launch(
+                headless=SCRAPER_HEADLESS,
+                args=['--no-default-browser-check', self._browser_tag],
+            )
+            self.sessions = [PlayboardSession(account) for account in configured_accounts()]
+            for session in self.sessions:
+                await self._open_context(session)
+            self._refresh_task = asyncio.create_task(self._refresh_loop())
+            print(f'[playboard-session] pool started with {len(self.sessions)} account(s)')
+
+    async def stop(self) -> None:
+        if self._refresh_task:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        for session in self.sessions:
+            if session.context is not None:
+                try:
+                    await session.context.close()
+                except Exception:
+                    pass
+                session.context = None
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception as e:
+                print(f'[playboard-session] browser close failed: {e}')
+            self._browser = None
+            browser_watchdog.unregister(self._browser_tag)
+
+    async def recycle(self) -> None:
+        """Restart the shared browser (watchdog memory/age limit) once no session is leased."""
+        # Holding every session lock drains running leases and keeps new ones out until the restart is done
+        sessions = list(self.sessions)
+        held = []
+        try:
+            for session in sessions:
+                await asyncio.wait_for(session.lock.acquire(), timeout=RECYCLE_DRAIN_TIMEOUT_SEC)
+                held.append(session)
+        except asyncio.TimeoutError:
+            # The watchdog's hard limit still kills the browser if it keeps growing
+            print(f'[playboard-session] recycle skipped: {sessions[len(held)].email} still leased')
+            for session in held:
+                session.lock.release()
+            return
+        try:
+            print('[playboard-session] recycling browser')
+            await self.stop()
+            await self.start()
+        finally:
+            for session in held:
+                session.lock.release()
+
+    async def _open_context(self, session: PlayboardSession) -> None:
+        if session.context is not None:
+            try:
+                await session.context.close()
+            except Exception:
+                pass
+        session.context = await self._browser.new_context(
+            user_agent=SESSION_UA,
+            locale=SCRAPER_LOCALE,
+            timezone_id=SCRAPER_TIMEZONE,
+            viewport={'width': 1280 + random.randint(-80, 120), 'height': 900 + random.randint(-60, 80)},
+        )
+        await session.context.add_init_script(STEALTH_INIT_SCRIPT)
+        session.route_stats = await install_route_policy(session.context, 'playboard')
+        cookies = load_cookies(session.account['cookiesFile'])
+        if cookies:
+            await session.context.add_cookies(cookies)
+        session.expires_at = cookies_expire_at(cookies)
+        session.needs_login = not cookies
+        session.last_validated = time.time()
+
+    async def _login(self, session: PlayboardSession) -> bool:
+        page = await session.context.new_page()
+        try:
+            await page.goto(PLAYBOARD_HOME, wait_until='domcontentloaded', timeout=45000)
+            await asyncio.sleep(2)
+            ok = await playboard_login(page, session.email, session.account['password'], session.account['cookiesFile'])
+            if ok:
+                save_cookies(session.account['cookiesFile'], await session.context.cookies())
+                session.needs_login = False
+                await session.sync_cookies()
+            return ok
+        finally:
+            await page.close()
+
+    async def _refresh_locked(self, session: PlayboardSession) -> None:
+        # Caller holds session.lock
+        try:
+            if session.context is None:
+                await self._open_context(session)
+            ok = await self._login(session)
+            print(f'[playboard-session] refreshed {session.email}: {"ok" if ok else "login failed"}')
+        except Exception as e:
+            print(f'[playboard-session] refresh failed for {session.email}: {e}')
+            # Context may be wedged (crashed page/target); rebuild it on the next lease
+            session.context = None
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(PLAYBOARD_SESSION_REFRESH_INTERVAL_SEC)
+            for session in list(self.sessions):
+                # Leased sessions are refreshed by their lease if needed
+                if session.lock.locked():
+                    continue
+                async with session.lock:
+                    try:
+                        await session.sync_cookies()
+                    except Exception:
+                        session.context = None
+                    if not session.is_fresh(PLAYBOARD_SESSION_REFRESH_MARGIN_SEC):
+                        await self._refresh_locked(session)
+
+    async def _claim(self) -> Optional[PlayboardSession]:
+        """Lock and return the next idle session (round-robin, fresh ones first); None when all are busy."""
+        count = len(self.sessions)
+        ordered = [self.sessions[(self._cursor + i) % count] for i in range(count)]
+        idle = [s for s in ordered if not s.lock.locked()]
+        if not idle:
+            return None
+        session = next((s for s in idle if s.is_fresh()), idle[0])
+        # An unlocked asyncio.Lock is acquired without yielding, so no other lease can claim it in between
+        await session.lock.acquire()
+        self._cursor = (self.sessions.index(session) + 1) % count
+        return session
+
+    @asynccontextmanager
+    async def lease(self):
+        """Yield a ready (context, session) pair; the session is exclusive from the pick until the block exits."""
+        await self.start()
+        session = await self._claim()
+        while session is None:
+            await asyncio.sleep(0.5)
+            session = await self._claim()
+
+        try:
+            if not session.is_fresh():
+                await self._refresh_locked(session)
+            if session.context is None:
+                await self._open_context(session)
+            # Per-account spacing replaces the fixed 3-15 s pre-request delay
+            wait = PLAYBOARD_SESSION_MIN_INTERVAL_SEC - (time.time() - session.last_used)
+            if wait > 0:
+                await asyncio.sleep(wait + random.uniform(0, 2))
+            session.leases += 1
+            try:
+                yield session.context, session
+            finally:
+                session.last_used = time.time()
+                if session.route_stats:
+                    session.route_stats.report()
+                try:
+                    await session.sync_cookies()
+                except Exception:
+                    session.context = None
+        finally:
+            session.lock.release()
+
+    def idle_sessions(self) -> int:
+        """Sessions a lease could claim right now (every account before the pool has started)."""
+        if self._browser is None:
+            return len(configured_accounts())
+        return sum(1 for s in self.sessions if not s.lock.locked())
+
+    def stats(self) -> Dict:
+        return {
+            'enabled': self.enabled,
+            'started': self._browser is not None,
+            'sessions': [s.snapshot() for s in self.sessions],
+        }
+
+
+playboard_sessions = PlayboardSessionPool()
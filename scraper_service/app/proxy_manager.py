@@ -0,0 +1,353 @@
+"""
+Proxy health scoring, background probing and circuit breakers.
+
+Collectors used to TCP-connect to each proxy (2.5 s timeout, one after the
+other) right before every scrape. That only showed that a port was open. Now:
+
+- a background loop probes every proxy concurrently (HTTP GET of
+  PROXY_PROBE_URL through the proxy, TCP connect for SOCKS proxies)
+- real outcomes (`record`) feed an EWMA of success and latency per proxy and
+  per (proxy, target host)
+- PROXY_CIRCUIT_FAILURES consecutive failures open the proxy's circuit for
+  PROXY_CIRCUIT_COOLDOWN_SEC (doubling on each re-open, capped at
+  PROXY_CIRCUIT_MAX_COOLDOWN_SEC); after the cooldown one trial request is
+  allowed (half-open) and its outcome closes or re-opens the circuit
+- `pick(host)` returns the best proxy immediately from the stats, without
+  doing any I/O. With a `session` key the proxy stays bound to (host,
+  session) for PROXY_STICKY_TTL_SEC so a site sees one IP per session; the
+  binding moves when the proxy's circuit opens or the caller excludes it
+- `download_proxy(url)` spreads downloads over healthy proxies by fewest
+  in-flight transfers and records each transfer's outcome
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+
+from .config import (
+    SCRAPER_PROXY,
+    SCRAPER_PROXIES,
+    PROXY_PROBE_URL,
+    PROXY_PROBE_INTERVAL_SEC,
+    PROXY_PROBE_TIMEOUT_SEC,
+    PROXY_CIRCUIT_FAILURES,
+    PROXY_CIRCUIT_COOLDOWN_SEC,
+    PROXY_CIRCUIT_MAX_COOLDOWN_SEC,
+    PROXY_STICKY_TTL_SEC,
+    PROXY_DOWNLOADS_ENABLED,
+)
+from .http_client import get_http_session
+
+EWMA_ALPHA = 0.3
+DEFAULT_LATENCY_MS = 1500.0
+PRIOR_SUCCESS = 0.8
+# Proxies scoring within this fraction of the best one share the load round-robin
+SCORE_BAND = 0.9
+
+
+def mask_proxy(proxy: str) -> str:
+    if not proxy:
+        return ''
+    parsed = urlparse(proxy if '://' in proxy else f'http://{proxy}')
+    return f'{parsed.hostname or "unknown"}:{parsed.port or ""}'
+
+
+def proxy_url(proxy: str) -> str:
+    """Proxy with an explicit scheme, as aiohttp and yt-dlp expect it."""
+    return proxy if '://' in proxy else f'http://{proxy}'
+
+
+def _ewma(prev: Optional[float], value: float) -> float:
+    return value if prev is None else EWMA_ALPHA * value + (1 - EWMA_ALPHA) * prev
+
+
+class HealthStats:
+    """Success / latency EWMAs for one proxy, or one proxy on one target host."""
+
+    def __init__(self):
+        self.success: Optional[float] = None
+        self.latency_ms: Optional[float] = None
+        self.samples = 0
+        self.last_error = ''
+        self.last_at = 0.0
+
+    def record(self, ok: bool, latency_ms: Optional[float] = None, error: str = '') -> None:
+        self.success = _ewma(self.success, 1.0 if ok else 0.0)
+        if ok and latency_ms is not None:
+            self.latency_ms = _ewma(self.latency_ms, float(latency_ms))
+        if not ok:
+            self.last_error = error[:200]
+        self.samples += 1
+        self.last_at = time.time()
+
+    def score(self) -> float:
+        success = PRIOR_SUCCESS if self.success is None else self.success
+        latency = DEFAULT_LATENCY_MS if self.latency_ms is None else self.latency_ms
+        return success * 1000.0 / (1000.0 + latency)
+
+    def snapshot(self) -> Dict:
+        return {
+            'success': round(self.success, 3) if self.success is not None else None,
+            'latencyMs': int(self.latency_ms) if self.latency_ms is not None else None,
+            'samples': self.samples,
+            'lastError': self.last_error,
+        }
+
+
+class ProxyState:
+    def __init__(self, proxy: str):
+        self.proxy = proxy
+        self.overall = HealthStats()
+        self.hosts: Dict[str, HealthStats] = {}
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.cooldown_sec = float(PROXY_CIRCUIT_COOLDOWN_SEC)
+        self.half_open_trial = False
+        self.last_probe: Dict = {}
+        self.downloads_in_flight = 0
+
+    def circuit(self, now: float) -> str:
+        if self.open_until > now:
+            return 'open'
+        if self.open_until:
+            return 'half-open'
+        return 'closed'
+
+    def host_stats(self, host: Optional[str]) -> HealthStats:
+        if host and host in self.hosts and self.hosts[host].samples:
+            return self.hosts[host]
+        return self.overall
+
+
+class ProxyManager:
+    def __init__(self):
+        self.states: Dict[str, ProxyState] = {}
+        # (host, session) -> {'proxy', 'expiresAt'}
+        self.sticky: Dict[tuple, Dict] = {}
+        self._rr = 0
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {'picks': 0, 'stickyHits': 0, 'noProxy': 0, 'circuitsOpened': 0, 'probes': 0, 'downloads': 0}
+
+    @staticmethod
+    def pool() -> List[str]:
+        pool = [x for x in SCRAPER_PROXIES if x]
+        if not pool and SCRAPER_PROXY:
+            pool = [SCRAPER_PROXY]
+        return pool
+
+    def _state(self, proxy: str) -> ProxyState:
+        if proxy not in self.states:
+            self.states[proxy] = ProxyState(proxy)
+        return self.states[proxy]
+
+    def pick(self, host: Optional[str] = None, exclude: Iterable[str] = (), session: Optional[str] = None) -> Optional[str]:
+        """
+        Best available proxy for `host` from recorded stats (no I/O); None when every circuit is open.
+        `session` keeps returning the same proxy for (host, session) until the binding expires.
+        """
+        now = time.time()
+        excluded = set(exclude or [])
+        if session:
+            bound = self.sticky.get((host, session))
+            if bound and bound['expiresAt'] > now and bound['proxy'] not in excluded and bound['proxy'] in self.pool() \
+                    and self._state(bound['proxy']).circuit(now) == 'closed':
+                self.counters['stickyHits'] += 1
+                return bound['proxy']
+            self.sticky.pop((host, session), None)
+
+        chosen = self._pick_best(host, excluded, now)
+        if chosen and session:
+            self.sticky[(host, session)] = {'proxy': chosen, 'expiresAt': now + PROXY_STICKY_TTL_SEC}
+        return chosen
+
+    def _available(self, excluded: set, now: float) -> List[ProxyState]:
+        states = []
+        for proxy in self.pool():
+            if proxy in excluded:
+                continue
+            state = self._state(proxy)
+            circuit = state.circuit(now)
+            if circuit == 'open' or (circuit == 'half-open' and state.half_open_trial):
+                continue
+            states.append(state)
+        return states
+
+    def _pick_best(self, host: Optional[str], excluded: set, now: float) -> Optional[str]:
+        candidates = []
+        for state in self._available(excluded, now):
+            candidates.append((state.host_stats(host).score(), state.proxy, state, state.circuit(now)))
+
+        if not candidates:
+            if self.pool():
+                self.counters['noProxy'] += 1
+            return None
+
+        # A half-open proxy gets exactly one trial request before anything else
+        trial = next((c for c in candidates if c[3] == 'half-open'), None)
+        if trial:
+            trial[2].half_open_trial = True
+            chosen = trial[1]
+        else:
+            best = max(c[0] for c in candidates)
+            band = [c[1] for c in sorted(candidates, key=lambda c: -c[0]) if c[0] >= best * SCORE_BAND]
+            chosen = band[self._rr % len(band)]
+            self._rr += 1
+
+        self.counters['picks'] += 1
+        print(f'[proxy] selected {mask_proxy(chosen)}' + (f' for {host}' if host else ''))
+        return chosen
+
+    def record(self, proxy: Optional[str], host: Optional[str], ok: bool, latency_ms: Optional[float] = None, error: str = '') -> None:
+        """Feed a real scrape / download outcome (or a probe result when host is None) into the stats."""
+        if not proxy:
+            return
+        state = self._state(proxy)
+        state.overall.record(ok, latency_ms, error)
+        if host:
+            state.hosts.setdefault(host, HealthStats()).record(ok, latency_ms, error)
+
+        now = time.time()
+        if ok:
+            state.consecutive_failures = 0
+            if state.open_until:
+                print(f'[proxy] circuit closed for {mask_proxy(proxy)}')
+            state.open_until = 0.0
+            state.half_open_trial = False
+            state.cooldown_sec = float(PROXY_CIRCUIT_COOLDOWN_SEC)
+            return
+
+        state.consecutive_failures += 1
+        reopen = state.circuit(now) == 'half-open'
+        if reopen or state.consecutive_failures >= PROXY_CIRCUIT_FAILURES:
+            if reopen:
+                state.cooldown_sec = min(state.cooldown_sec * 2, float(PROXY_CIRCUIT_MAX_COOLDOWN_SEC))
+            state.open_until = now + state.cooldown_sec
+            state.half_open_trial = False
+            self.counters['circuitsOpened'] += 1
+            # Sessions bound to this proxy move to another one on their next pick
+            for key in [k for k, b in self.sticky.items() if b['proxy'] == proxy]:
+                self.sticky.pop(key, None)
+            print(f'[proxy] circuit open for {mask_proxy(proxy)} ({int(state.cooldown_sec)}s): {error[:120]}')
+
+    @asynccontextmanager
+    async def download_proxy(self, url: str, supports_socks: bool = True):
+        """
+        Yield the proxy for one download (None = direct): the healthy proxy with the fewest transfers
+        in flight, best score first on ties. The transfer's success or failure is recorded on exit.
+        """
+        host = urlparse(url).hostname
+        now = time.time()
+        state = None
+        if PROXY_DOWNLOADS_ENABLED:
+            candidates = [
+                s for s in self._available(set(), now)
+                if supports_socks or not proxy_url(s.proxy).startswith('socks')
+            ]
+            if candidates:
+                state = min(candidates, key=lambda s: (s.downloads_in_flight, -s.host_stats(host).score()))
+                if state.circuit(now) == 'half-open':
+                    state.half_open_trial = True
+
+        if state is None:
+            yield None
+            return
+
+        state.downloads_in_flight += 1
+        self.counters['downloads'] += 1
+        try:
+            yield state.proxy
+        except Exception as e:
+            # Success only: transfer time depends on file size, so it would skew the latency EWMA
+            self.record(state.proxy, host, False, error=str(e) or type(e).__name__)
+            raise
+        else:
+            self.record(state.proxy, host, True)
+        finally:
+            state.downloads_in_flight -= 1
+
+    async def _probe(self, proxy: str) -> None:
+        started = time.time()
+        parsed = urlparse(proxy if '://' in proxy else f'http://{proxy}')
+        try:
+            if parsed.scheme.startswith('socks'):
+                # aiohttp cannot tunnel through SOCKS; a TCP connect is the best cheap signal
+                _, writer = await asyncio.wait_for(asyncio.open_connection(parsed.hostname, parsed.port), timeout=PROXY_PROBE_TIMEOUT_SEC)
+                writer.close()
+                await writer.wait_closed()
+            else:
+                session = await get_http_session()
+                proxy_url = proxy if '://' in proxy else f'http://{proxy}'
+                async with session.get(PROXY_PROBE_URL, proxy=proxy_url, timeout=aiohttp.ClientTimeout(total=PROXY_PROBE_TIMEOUT_SEC)) as resp:
+                    if resp.status >= 400:
+                        raise RuntimeError(f'probe HTTP {resp.status}')
+            latency = (time.time() - started) * 1000
+            self._state(proxy).last_probe = {'ok': True, 'latencyMs': int(latency), 'at': time.time()}
+            self.record(proxy, None, True, latency)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            self._state(proxy).last_probe = {'ok': False, 'error': error[:200], 'at': time.time()}
+            self.record(proxy, None, False, error=f'probe: {error}')
+
+    async def probe_all(self) -> None:
+        pool = self.pool()
+        if not pool:
+            return
+        self.counters['probes'] += 1
+        now = time.time()
+        # Open circuits are left alone until their cooldown ends; the half-open trial decides then
+        targets = [p for p in pool if self._state(p).circuit(now) != 'open']
+        await asyncio.gather(*(self._probe(p) for p in targets), return_exceptions=True)
+
+    async def _loop(self) -> None:
+        while True:
+            try:
+                await self.probe_all()
+            except Exception as e:
+                print(f'[proxy] probe round failed: {e}')
+            await asyncio.sleep(PROXY_PROBE_INTERVAL_SEC)
+
+    async def start(self) -> None:
+        if self._task is None and self.pool() and PROXY_PROBE_INTERVAL_SEC > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> Dict:
+        now = time.time()
+        proxies = []
+        for proxy in self.pool():
+            state = self._state(proxy)
+            proxies.append({
+                'proxy': mask_proxy(proxy),
+                'circuit': state.circuit(now),
+                'openForSec': max(0, int(state.open_until - now)),
+                'consecutiveFailures': state.consecutive_failures,
+                'downloadsInFlight': state.downloads_in_flight,
+                'score': round(state.overall.score(), 3),
+                **state.overall.snapshot(),
+                'lastProbe': state.last_probe,
+                'hosts': {host: stats.snapshot() for host, stats in state.hosts.items()},
+            })
+        sticky = [
+            {'host': host, 'session': session, 'proxy': mask_proxy(b['proxy']), 'expiresInSec': int(b['expiresAt'] - now)}
+            for (host, session), b in self.sticky.items() if b['expiresAt'] > now
+        ]
+        return {
+            'probeUrl': PROXY_PROBE_URL,
+            'probeIntervalSec': PROXY_PROBE_INTERVAL_SEC,
+            'stickyTtlSec': PROXY_STICKY_TTL_SEC,
+            'downloadsEnabled': PROXY_DOWNLOADS_ENABLED,
+            **self.counters,
+            'proxies': proxies,
+            'stickySessions': sticky,
+        }
+
+
+proxy_manager = ProxyManager()
@@ -0,0 +1,177 @@
+"""
+Catalog of the query shapes the service issues.
+
+Each entry is the filter / sort of a real call site with representative
+values, so `db.INDEXES` can be checked against how the collections are
+actually queried. `hot` marks shapes that run on every request, download or
+startup. Those must never be a COLLSCAN. The others (manual status endpoints,
+one-off backfills) are reported but allowed to scan.
+
+`explain_shape()` runs `explain` (queryPlanner verbosity) for one shape and
+summarizes the winning plan. test_query_shapes.py runs the whole catalog
+against a local mongod and exits non-zero when a hot shape scans the
+collection.
+"""
+
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from .archive import archive_filter
+from .db import channels, discovery_runs, logs, settings, transcripts, video_tombstones, videos, videos_archive
+from .discovery_runs import RESUMABLE_STATUSES
+from .pagination import CHANNEL_SORT, LOG_SORT, VIDEO_SORT
+from .search import search_filter
+
+PAGE = 21  # limit + 1, as paginate() asks for
+
+
+def shapes(now: datetime = None) -> List[Dict]:
+    now = now or datetime.utcnow()
+    week_ago = now - timedelta(days=7)
+    catalog = [
+        # --- videos -------------------------------------------------------------------------
+        {'name': 'videos.by-key', 'source': 'store.upsert_video, discovery dedup', 'hot': True,
+         'collection': videos.name, 'filter': {'platform': 'youtube', 'videoId': 'dQw4w9WgXcQ'}},
+        {'name': 'videos.enqueue-pending', 'source': 'main._enqueue_pending_videos', 'hot': True,
+         'collection': videos.name, 'filter': {'downloadStatus': 'pending'},
+         'sort': [('views', -1), ('discoveredAt', -1)], 'limit': 300},
+        {'name': 'videos.pending-total', 'source': 'main.trigger_pending_downloads', 'hot': True,
+         'collection': videos.name, 'filter': {'downloadStatus': 'pending'}, 'count': True},
+        {'name': 'videos.list', 'source': 'main.get_videos', 'hot': True,
+         'collection': videos.name, 'filter': {}, 'sort': VIDEO_SORT, 'limit': PAGE},
+        {'name': 'videos.list-by-platform', 'source': 'main.get_videos?platform', 'hot': True,
+         'collection': videos.name, 'filter': {'platform': 'douyin'}, 'sort': VIDEO_SORT, 'limit': PAGE},
+        {'name': 'videos.list-by-platform-views', 'source': 'main.get_videos?platform&minViews', 'hot': True,
+         'collection': videos.name, 'filter': {'platform': 'youtube', 'views': {'$gte': 100_000}},
+         'sort': VIDEO_SORT, 'limit': PAGE},
+        {'name': 'videos.list-by-status', 'source': 'main.get_videos?status', 'hot': True,
+         'collection': videos.name, 'filter': {'downloadStatus': 'failed'}, 'sort': VIDEO_SORT, 'limit': PAGE},
+        {'name': 'videos.list-by-topic', 'source': 'main.get_videos?topic', 'hot': True,
+         'collection': videos.name, 'filter': {'topics': 'funny'}, 'sort': VIDEO_SORT, 'limit': PAGE},
+        {'name': 'videos.list-by-date', 'source': 'main.get_videos?from&to', 'hot': True,
+         'collection': videos.name, 'filter': {'discoveredAt': {'$gte': week_ago, '$lte': now}},
+         'sort': VIDEO_SORT, 'limit': PAGE},
+        {'name': 'videos.queue-state-counts', 'source': 'automation.queue_stats', 'hot': True,
+         'collection': videos.name, 'filter': {'queueState': {'$in': ['queued', 'downloading']}}, 'count': True},
+        {'name': 'videos.orphaned-reset', 'source': 'automation.reset_orphaned_downloads', 'hot': True,
+         'collection': videos.name,
+         'filter': {'$or': [
+             {'downloadStatus': 'downloading'},
+             {'queueState': {'$in': ['queued', 'downloading', 'retry-pending']}},
+         ]}},
+        {'name': 'videos.cleanup-invalid-youtube', 'source': 'automation.cleanup_invalid_youtube_records', 'hot': True,
+         'collection': videos.name,
+         'filter': {
+             'platform': 'youtube',
+             'discoveredAt': {'$gte': week_ago},
+             '$or': [
+                 {'videoId': {'$not': {'$regex': '^[A-Za-z0-9_-]{11}$'}}},
+                 {'url': {'$regex': 'test_video', '$options': 'i'}},
+                 {'title': {'$regex': 'test', '$options': 'i'}},
+             ],
+         },
+         'limit': 1000},
+        {'name': 'videos.search', 'source': 'search.search_videos', 'hot': True,
+         'collection': videos.name, 'filter': search_filter('hai huo'), 'limit': 2000},
+        {'name': 'videos.archive-candidates', 'source': 'archive.archive_videos', 'hot': True,
+         'collection': videos.name, 'filter': archive_filter(now), 'limit': 500},
+        {'name': 'videos.drive-pending', 'source': 'main.upload_downloaded_videos_to_drive', 'hot': False,
+         'collection': videos.name, 'filter': {'downloadStatus': 'done', 'driveUploadStatus': {'$ne': 'done'}}},
+        {'name': 'videos.drive-upload-counts', 'source': 'main.upload_downloaded_videos_to_drive', 'hot': False,
+         'collection': videos.name, 'filter': {'driveUploadStatus': 'done'}, 'count': True},
+        {'name': 'videos.backend-upload-counts', 'source': 'main.get_upload_status', 'hot': False,
+         'collection': videos.name, 'filter': {'uploadStatus': 'done'}, 'count': True},
+        {'name': 'videos.search-backfill', 'source': 'search.backfill_search_keys', 'hot': False,
+         'collection': videos.name, 'filter': {'searchKeys': {'$exists': False}}, 'limit': 500},
+        {'name': 'videos.inline-transcripts', 'source': 'transcripts.migrate_inline', 'hot': False,
+         'collection': videos.name, 'filter': {'transcript.srt': {'$type': 'string'}}, 'limit': 200},
+
+        # --- archive ------------------------------------------------------------------------
+        {'name': 'tombstones.by-key', 'source': 'archive.is_archived (every upsert_video)', 'hot': True,
+         'collection': video_tombstones.name, 'filter': {'platform': 'youtube', 'videoId': 'dQw4w9WgXcQ'}},
+        {'name': 'archive.list', 'source': 'main.get_archived_videos', 'hot': True,
+         'collection': videos_archive.name, 'filter': {}, 'sort': VIDEO_SORT, 'limit': PAGE},
+        {'name': 'archive.restore-by-key', 'source': 'archive.restore_videos', 'hot': False,
+         'collection': videos_archive.name, 'filter': {'$or': [{'platform': 'youtube', 'videoId': 'dQw4w9WgXcQ'}]}},
+
+        # --- channels -----------------------------------------------------------------------
+        {'name': 'channels.by-key', 'source': 'store.upsert_channel', 'hot': True,
+         'collection': channels.name, 'filter': {'platform': 'youtube', 'channelId': 'UC123'}},
+        {'name': 'channels.active-by-priority', 'source': 'automation.scan_all_channels', 'hot': True,
+         'collection': channels.name, 'filter': {'isActive': True}, 'sort': [('priority', -1)], 'limit': 100},
+        {'name': 'channels.list', 'source': 'main.get_channels', 'hot': True,
+         'collection': channels.name, 'filter': {}, 'sort': CHANNEL_SORT, 'limit': PAGE},
+        {'name': 'channels.search', 'source': 'main.get_channels?search, search.search_channels', 'hot': True,
+         'collection': channels.name, 'filter': search_filter('hai'), 'sort': CHANNEL_SORT, 'limit': PAGE},
+
+        # --- job logs -----------------------------------------------------------------------
+        {'name': 'logs.list', 'source': 'main.get_logs', 'hot': True,
+         'collection': logs.name, 'filter': {}, 'sort': LOG_SORT, 'limit': PAGE},
+        {'name': 'logs.list-by-type', 'source': 'main.get_logs?jobType', 'hot': True,
+         'collection': logs.name, 'filter': {'jobType': 'download'}, 'sort': LOG_SORT, 'limit': PAGE},
+        {'name': 'logs.open-captchas', 'source': 'main.get_captcha_jobs', 'hot': True,
+         'collection': logs.name,
+         'filter': {'jobType': 'captcha', 'status': 'paused_captcha', 'extra.resolved': {'$ne': True}},
+         'sort': [('ranAt', -1)], 'limit': 50},
+        {'name': 'logs.retention-backfill', 'source': 'log_sink.backfill_expiry', 'hot': False,
+         'collection': logs.name, 'filter': {'expireAt': {'$exists': False}}},
+
+        # --- others -------------------------------------------------------------------------
+        {'name': 'settings.by-key', 'source': 'settings_cache.get', 'hot': True,
+         'collection': settings.name, 'filter': {'key': 'default'}},
+        {'name': 'transcripts.by-video', 'source': 'transcripts.render', 'hot': True,
+         'collection': transcripts.name, 'filter': {'video': None}},
+        {'name': 'discovery-runs.resume', 'source': 'discovery_runs.DiscoveryRun.open', 'hot': True,
+         'collection': discovery_runs.name,
+         'filter': {'jobType': 'discover', 'windowStart': week_ago, 'status': {'$in': RESUMABLE_STATUSES}, '_id': {'$nin': []}},
+         'sort': [('startedAt', -1)], 'limit': 1},
+        {'name': 'discovery-runs.by-type', 'source': 'discovery_runs.list_runs', 'hot': True,
+         'collection': discovery_runs.name, 'filter': {'jobType': 'discover'}, 'sort': [('startedAt', -1)], 'limit': 20},
+    ]
+    # archive_filter() is None when no archive rule is configured: that job does not query at all
+    return [shape for shape in catalog if shape['filter'] is not None]
+
+
+def _walk(plan, stages: List[str], indexes: List[str]) -> None:
+    if isinstance(plan, list):
+        for item in plan:
+            _walk(item, stages, indexes)
+        return
+    if not isinstance(plan, dict):
+        return
+    if plan.get('stage'):
+        stages.append(plan['stage'])
+    if plan.get('indexName'):
+        indexes.append(plan['indexName'])
+    # classic (inputStage/s), slot-based engine (queryPlan) and sharded (shards/winningPlan) layouts
+    for key in ('inputStage', 'inputStages', 'queryPlan', 'shards', 'winningPlan'):
+        if key in plan:
+            _walk(plan[key], stages, indexes)
+
+
+def explain_command(shape: Dict) -> Dict:
+    if shape.get('count'):
+        return {'count': shape['collection'], 'query': shape['filter']}
+    command = {'find': shape['collection'], 'filter': shape['filter']}
+    if shape.get('sort'):
+        command['sort'] = dict(shape['sort'])
+    if shape.get('limit'):
+        command['limit'] = shape['limit']
+    return command
+
+
+async def explain_shape(database, shape: Dict) -> Dict:
+    """Winning-plan summary of `shape` on `database`: stages, indexes used, COLLSCAN / in-memory sort."""
+    result = await database.command({'explain': explain_command(shape), 'verbosity': 'queryPlanner'})
+    stages: List[str] = []
+    indexes: List[str] = []
+    _walk((result.get('queryPlanner') or {}).get('winningPlan') or {}, stages, indexes)
+    return {
+        'name': shape['name'],
+        'collection': shape['collection'],
+        'hot': shape.get('hot', False),
+        'stages': stages,
+        'indexes': sorted(set(indexes)),
+        'collscan': 'COLLSCAN' in stages,
+        'blockingSort': 'SORT' in stages,
+    }
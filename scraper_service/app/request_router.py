@@ -0,0 +1,239 @@
+"""
+Per-source `context.route` policies for scraping pages.
+
+Extractors only read DOM attributes (href / src / alt) or call first-party
+JSON endpoints, so images, video previews, fonts and tracker scripts are
+aborted before they hit the network or the proxy. Each policy keeps the hosts
+an extractor depends on (first-party documents/XHR, captcha widgets) and
+blocks third-party hosts for the listed resource types.
+
+Blocked bytes are estimated from the average response size seen for the same
+resource type on allowed requests (falling back to DEFAULT_RESOURCE_BYTES), and
+time saved is estimated from observed throughput.
+"""
+
+import time
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from .config import RESOURCE_BLOCKING_ENABLED
+from .store import get_or_create_settings
+
+DEFAULT_RESOURCE_BYTES = {
+    'image': 40_000,
+    'media': 1_500_000,
+    'font': 30_000,
+    'stylesheet': 20_000,
+    'script': 60_000,
+    'other': 5_000,
+}
+
+TRACKER_HOSTS = [
+    'google-analytics.com',
+    'googletagmanager.com',
+    'doubleclick.net',
+    'googlesyndication.com',
+    'googleadservices.com',
+    'facebook.net',
+    'connect.facebook.com',
+    'hotjar.com',
+    'clarity.ms',
+    'segment.io',
+    'sentry.io',
+    'mixpanel.com',
+    'amplitude.com',
+    'bytegoofy.com',  # Douyin/Toutiao telemetry
+    'mcs.zijieapi.com',
+    'log.kuaishou.com',
+    'wlog.kuaishou.com',
+]
+
+CAPTCHA_HOSTS = ['captcha', 'verify', 'hcaptcha.com', 'recaptcha.net', 'gstatic.com/recaptcha']
+
+# first_party: hosts whose documents/XHR/scripts the extractor needs
+# block_types: resource types aborted for every host except captcha hosts
+# block_third_party_types: resource types aborted only on non first-party hosts
+ROUTE_POLICIES: Dict[str, Dict] = {
+    'playboard': {
+        'first_party': ['playboard.co'],
+        'block_types': ['image', 'media', 'font'],
+        'block_third_party_types': ['script', 'stylesheet', 'xhr', 'fetch', 'other'],
+    },
+    'youtube': {
+        'first_party': ['youtube.com', 'ytimg.com', 'googlevideo.com', 'ggpht.com', 'google.com', 'gstatic.com'],
+        'block_types': ['image', 'media', 'font'],
+        'block_third_party_types': ['other'],
+    },
+    'pexels': {
+        'first_party': ['pexels.com'],
+        'block_types': ['image', 'media', 'font'],
+        'block_third_party_types': ['script', 'stylesheet', 'other'],
+    },
+    'douyin': {
+        'first_party': ['douyin.com', 'douyinstatic.com', 'douyinpic.com', 'bytedance.com', 'byteimg.com', 'zjcdn.com', 'snssdk.com'],
+        'block_types': ['image', 'media', 'font'],
+        'block_third_party_types': ['other'],
+    },
+    'kuaishou': {
+        'first_party': ['kuaishou.com', 'kuaishouzt.com', 'yximgs.com', 'kwimgs.com', 'kwaicdn.com'],
+        'block_types': ['image', 'media', 'font'],
+        'block_third_party_types': ['other'],
+    },
+    'channel-scan': {
+        'first_party': ['youtube.com', 'ytimg.com', 'google.com', 'gstatic.com', 'facebook.com', 'fbcdn.net', 'douyin.com', 'douyinstatic.com', 'snssdk.com'],
+        'block_types': ['image', 'media', 'font'],
+        'block_third_party_types': ['other'],
+    },
+}
+
+# Lifetime totals per source, exposed through route_stats()
+_totals: Dict[str, Dict] = {}
+
+
+def _host_matches(host: str, suffixes: List[str]) -> bool:
+    return any(host == s or host.endswith(f'.{s}') for s in suffixes)
+
+
+def _is_captcha(url: str) -> bool:
+    lowered = url.lower()
+    return any(marker in lowered for marker in CAPTCHA_HOSTS)
+
+
+class RouteStats:
+    """Counters for one leased context (one collector run)."""
+
+    def __init__(self, source: str):
+        self.source = source
+        self.reset()
+
+    def reset(self) -> None:
+        self.started = time.time()
+        self.blocked: Dict[str, int] = {}
+        self.allowed = 0
+        self.allowed_bytes = 0
+        self.allowed_ms = 0.0
+        self._bytes_by_type: Dict[str, List[int]] = {}
+
+    def record_blocked(self, resource_type: str) -> None:
+        self.blocked[resource_type] = self.blocked.get(resource_type, 0) + 1
+
+    def record_response(self, resource_type: str, size: int, duration_ms: float) -> None:
+        self.allowed += 1
+        if size > 0:
+            self.allowed_bytes += size
+            self.allowed_ms += max(duration_ms, 0.0)
+            sizes = self._bytes_by_type.setdefault(resource_type, [0, 0])
+            sizes[0] += size
+            sizes[1] += 1
+
+    def estimated_bytes_saved(self) -> int:
+        total = 0
+        for resource_type, count in self.blocked.items():
+            observed = self._bytes_by_type.get(resource_type)
+            avg = observed[0] / observed[1] if observed and observed[1] else DEFAULT_RESOURCE_BYTES.get(resource_type, DEFAULT_RESOURCE_BYTES['other'])
+            total += int(avg * count)
+        return total
+
+    def estimated_ms_saved(self) -> int:
+        if not self.allowed_bytes or not self.allowed_ms:
+            return 0
+        bytes_per_ms = self.allowed_bytes / self.allowed_ms
+        return int(self.estimated_bytes_saved() / bytes_per_ms) if bytes_per_ms else 0
+
+    def summary(self) -> Dict:
+        return {
+            'source': self.source,
+            'blockedRequests': sum(self.blocked.values()),
+            'blockedByType': dict(self.blocked),
+            'allowedRequests': self.allowed,
+            'allowedBytes': self.allowed_bytes,
+            'estimatedBytesSaved': self.estimated_bytes_saved(),
+            'estimatedMsSaved': self.estimated_ms_saved(),
+            'durationSec': round(time.time() - self.started, 1),
+        }
+
+    def report(self) -> Dict:
+        summary = self.summary()
+        totals = _totals.setdefault(self.source, {'runs': 0, 'blockedRequests': 0, 'allowedRequests': 0, 'estimatedBytesSaved': 0, 'estimatedMsSaved': 0})
+        totals['runs'] += 1
+        for key in ('blockedRequests', 'allowedRequests', 'estimatedBytesSaved', 'estimatedMsSaved'):
+            totals[key] += summary[key]
+        if summary['blockedRequests']:
+            print(
+                f"[route {self.source}] blocked {summary['blockedRequests']} requests {summary['blockedByType']} "
+                f"~{summary['estimatedBytesSaved'] / 1024 / 1024:.1f}MB / ~{summary['estimatedMsSaved'] / 1000:.1f}s saved"
+            )
+        # Long-lived contexts (Playboard sessions) report once per lease
+        self.reset()
+        return summary
+
+
+async def resolve_policy(source: str) -> Optional[Dict]:
+    """Built-in policy for `source` merged with settings.resourceBlocking.policies[source]; None when disabled."""
+    if not RESOURCE_BLOCKING_ENABLED:
+        return None
+    cfg = (await get_or_create_settings()).get('resourceBlocking', {}) or {}
+    if not cfg.get('enabled', True):
+        return None
+    override = (cfg.get('policies') or {}).get(source) or {}
+    if override.get('enabled') is False:
+        return None
+    base = ROUTE_POLICIES.get(source)
+    if not base and not override:
+        return None
+    return {**(base or {}), **{k: v for k, v in override.items() if k != 'enabled'}}
+
+
+async def install_route_policy(context, source: str, policy: Optional[Dict] = None) -> Optional[RouteStats]:
+    """Attach the routing policy for `source` to a BrowserContext; returns its stats collector."""
+    policy = policy or await resolve_policy(source)
+    if not policy:
+        return None
+
+    stats = RouteStats(source)
+    first_party = policy.get('first_party') or []
+    block_types = set(policy.get('block_types') or [])
+    block_third_party_types = set(policy.get('block_third_party_types') or [])
+
+    async def handle(route):
+        request = route.request
+        url = request.url
+        resource_type = request.resource_type
+        host = (urlparse(url).hostname or '').lower()
+
+        if _is_captcha(url) or url.startswith('data:'):
+            await route.continue_()
+            return
+
+        blocked = (
+            _host_matches(host, TRACKER_HOSTS)
+            or resource_type in block_types
+            or (resource_type in block_third_party_types and not _host_matches(host, first_party))
+        )
+        if blocked:
+            stats.record_blocked(resource_type)
+            await route.abort('blockedbyclient')
+            return
+        await route.continue_()
+
+    async def on_finished(request):
+        try:
+            response = await request.response()
+            size = int(((response.headers if response else None) or {}).get('content-length') or 0)
+            timing = request.timing or {}
+            duration = float(timing.get('responseEnd', -1)) - max(float(timing.get('requestStart', 0)), 0.0)
+            stats.record_response(request.resource_type, size, duration)
+        except Exception:
+            pass
+
+    await context.route('**/*', handle)
+    context.on('requestfinished', on_finished)
+    return stats
+
+
+def route_stats() -> Dict:
+    return {
+        'enabled': RESOURCE_BLOCKING_ENABLED,
+        'sources': {source: dict(totals) for source, totals in _totals.items()},
+        'policies': ROUTE_POLICIES,
+    }
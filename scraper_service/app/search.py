@@ -0,0 +1,168 @@
+"""
+Indexed search over videos and channels.
+
+Channel search used to run an unanchored `$regex` over `name` and
+`channelId`: a full collection scan that also treats 'hai' and 'hài' as
+different words. Now every write keeps two derived fields in sync:
+
+- `searchKeys`: the distinct tokens of the title / tags / topics / category
+  (videos) or name / channelId (channels), lower-cased and accent-folded
+  with `normalize_text`. CJK runs have no word breaks and are stored as
+  character bigrams.
+- `searchTitle`: the folded title (or channel name), used only for ranking.
+
+`searchKeys` has a multikey index. A query matches when every query token is
+a key, except the last one, which only has to be a key prefix (an anchored
+`^...` regex is an index range scan). That gives search-as-you-type without
+storing n-grams. Matches are ranked by phrase and token hits in the title
+first, then whole-token hits in the keys (tags), then views / priority.
+"""
+
+import re
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from .db import channels, videos
+from .utils import normalize_text
+
+# Letters NFKD does not decompose (Vietnamese đ among them)
+FOLD = str.maketrans({'đ': 'd', 'ð': 'd', 'ø': 'o', 'ł': 'l', 'ß': 'ss', 'æ': 'ae', 'œ': 'oe'})
+WORD_RE = re.compile(r'[^\W_]+')
+# Hangul jamo (NFKD splits syllables into them), kana, CJK ideographs, Hangul syllables
+CJK = '\u1100-\u11ff\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af'
+CJK_SPLIT_RE = re.compile(f'[{CJK}]+|[^{CJK}]+')
+CJK_RE = re.compile(f'[{CJK}]')
+
+MAX_KEYS = 64
+MAX_KEY_LEN = 40
+MAX_TITLE_LEN = 300
+# Shorter prefixes match too much of the collection to be worth an index scan
+MIN_PREFIX_LEN = 2
+# Matches scored per query; the rest of a very broad match is not ranked
+CANDIDATE_LIMIT = 2000
+BACKFILL_BATCH = 500
+# Filter for a query without searchable tokens: an empty index range, not the whole collection
+NO_MATCH = {'searchKeys': {'$in': []}}
+
+
+def fold(text) -> str:
+    return ' '.join(normalize_text(str(text or '')).translate(FOLD).split())
+
+
+def _words(text: str) -> Iterable[str]:
+    for word in WORD_RE.findall(fold(text)):
+        for part in CJK_SPLIT_RE.findall(word):
+            if CJK_RE.match(part) and len(part) > 1:
+                yield from (part[i:i + 2] for i in range(len(part) - 1))
+            else:
+                yield part[:MAX_KEY_LEN]
+
+
+def tokenize(*values) -> List[str]:
+    """Distinct folded tokens of `values` (strings or lists of strings), in order."""
+    seen: Dict[str, None] = {}
+    for value in values:
+        for text in (value if isinstance(value, (list, tuple)) else [value]):
+            for word in _words(text):
+                seen.setdefault(word, None)
+    return list(seen)[:MAX_KEYS]
+
+
+def video_search_fields(doc: Dict) -> Dict:
+    return {
+        'searchTitle': fold(doc.get('title'))[:MAX_TITLE_LEN],
+        'searchKeys': tokenize(doc.get('title'), doc.get('tags') or [], doc.get('topics') or [], doc.get('category')),
+    }
+
+
+def channel_search_fields(doc: Dict) -> Dict:
+    return {
+        'searchTitle': fold(doc.get('name'))[:MAX_TITLE_LEN],
+        'searchKeys': tokenize(doc.get('name'), doc.get('channelId')),
+    }
+
+
+def search_filter(q: str) -> Optional[Dict]:
+    """Mongo filter for `q` on searchKeys; None when `q` has no searchable token."""
+    tokens = tokenize(q)
+    if not tokens:
+        return None
+    *exact, last = tokens
+    # A trailing space means the last word is complete; a single CJK character is a word on its own
+    as_prefix = not (q or '').endswith(' ') and (len(last) >= MIN_PREFIX_LEN or CJK_RE.match(last))
+    last_clause = {'searchKeys': {'$regex': f'^{re.escape(last)}'} if as_prefix else last}
+    if not exact:
+        return last_clause
+    return {'$and': [{'searchKeys': {'$all': exact}}, last_clause]}
+
+
+def _in_title(needle: str, points: int) -> Dict:
+    return {'$cond': [{'$gte': [{'$indexOfCP': ['$searchTitle', needle]}, 0]}, points, 0]}
+
+
+def _score(q: str) -> Dict:
+    # Whole phrase in the title > title starting with it > each token in the title > whole-token key hits
+    phrase = fold(q)
+    tokens = tokenize(q)
+    return {'$add': [
+        _in_title(phrase, 6),
+        {'$cond': [{'$eq': [{'$indexOfCP': ['$searchTitle', phrase]}, 0]}, 2, 0]},
+        *[_in_title(token, 2) for token in tokens],
+        {'$size': {'$setIntersection': [{'$ifNull': ['$searchKeys', []]}, tokens]}},
+    ]}
+
+
+async def _search(collection, q: str, tiebreak: Dict, limit: int, projection: Optional[Dict]) -> List[Dict]:
+    match = search_filter(q)
+    if match is None:
+        return []
+    pipeline = [
+        {'$match': match},
+        {'$limit': CANDIDATE_LIMIT},
+        {'$addFields': {'score': _score(q)}},
+        {'$sort': {'score': -1, **tiebreak, '_id': -1}},
+        {'$limit': limit},
+    ]
+    if projection:
+        pipeline.append({'$project': {**projection, 'score': 1}})
+    else:
+        pipeline.append({'$project': {'searchKeys': 0, 'searchTitle': 0}})
+    cursor = await collection.aggregate(pipeline)
+    return await cursor.to_list()
+
+
+async def search_videos(q: str, limit: int = 20, projection: Optional[Dict] = None) -> List[Dict]:
+    return await _search(videos, q, {'views': -1}, limit, projection)
+
+
+async def search_channels(q: str, limit: int = 20, projection: Optional[Dict] = None) -> List[Dict]:
+    return await _search(channels, q, {'priority': -1, 'totalVideos': -1}, limit, projection)
+
+
+async def _backfill(collection, fields_fn, source_fields: List[str]) -> int:
+    updated = 0
+    while True:
+        batch = await collection.find(
+            {'searchKeys': {'$exists': False}}, {name: 1 for name in source_fields}
+        ).limit(BACKFILL_BATCH).to_list()
+        if not batch:
+            return updated
+        result = await collection.bulk_write(
+            [UpdateOne({'_id': doc['_id']}, {'$set': fields_fn(doc)}) for doc in batch],
+            ordered=False,
+        )
+        updated += result.modified_count
+        if len(batch) < BACKFILL_BATCH:
+            return updated
+
+
+async def backfill_search_keys() -> Dict:
+    """Add search fields to documents written before they were maintained."""
+    result = {
+        'videos': await _backfill(videos, video_search_fields, ['title', 'tags', 'topics', 'category']),
+        'channels': await _backfill(channels, channel_search_fields, ['name', 'channelId']),
+    }
+    if result['videos'] or result['channels']:
+        print(f'[search] indexed existing documents: {result}')
+    return result
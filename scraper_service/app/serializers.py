@@ -0,0 +1,69 @@
+"""
+orjson-based serialization of Mongo documents.
+
+`store.normalize()` used to walk every document in Python, converting
+ObjectIds and datetimes value by value (including big nested sub-documents
+like `transcript.srt` and `voiceover`). Here orjson converts them natively:
+
+- datetimes: naive values are UTC (pymongo default) and come out as
+  `...Z`, the same as before
+- ObjectId (and other BSON scalars) go through `_default` and become strings
+
+List endpoints return `MongoJSONResponse` with the raw documents, so rows are
+encoded once in C. That skips both `normalize()` and FastAPI's
+`jsonable_encoder` pass. `to_jsonable()` gives the same conversion as Python
+data for callers that need dicts, e.g. to read `_id` as a string.
+"""
+
+from datetime import datetime, timezone
+from typing import Any
+
+import orjson
+from bson import ObjectId
+from fastapi.responses import ORJSONResponse
+
+ORJSON_OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_UTC_Z
+
+
+def _default(value: Any):
+    if isinstance(value, ObjectId):
+        return str(value)
+    # Decimal128
+    if hasattr(value, 'to_decimal'):
+        return str(value.to_decimal())
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(content: Any) -> bytes:
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+def _walk(value):
+    # Slow path for values orjson rejects (non-str keys, ints over 64 bits)
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        utc_value = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+        return utc_value.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
+    if isinstance(value, list):
+        return [_walk(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _walk(item) for key, item in value.items()}
+    return value
+
+
+def to_jsonable(doc: Any) -> Any:
+    """`doc` with ObjectIds as str and datetimes as ISO-8601 UTC strings."""
+    try:
+        return orjson.loads(dumps(doc))
+    except (TypeError, orjson.JSONEncodeError):
+        return _walk(doc)
+
+
+class MongoJSONResponse(ORJSONResponse):
+    """JSON response that encodes Mongo documents (ObjectId, naive UTC datetimes) directly."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
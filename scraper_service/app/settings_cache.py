@@ -0,0 +1,120 @@
+"""
+In-memory cache of the `default` settings document.
+
+`get_or_create_settings()` used to upsert and normalize the settings document
+on every call (every discover/scan function, the worker pool, several
+endpoints). Now the normalized document is loaded once and served from memory:
+
+- every `update_settings` bumps a `version` field and refreshes the cache
+- with a replica set, a change stream on the settings collection invalidates
+  the cache as soon as another replica writes
+- without one (standalone mongod), the cached version is re-checked with a
+  projected read at most every SETTINGS_CACHE_TTL_SEC
+"""
+
+import asyncio
+import copy
+import time
+from typing import Dict, Optional
+
+from pymongo.errors import OperationFailure
+
+from .config import SETTINGS_CACHE_TTL_SEC, SETTINGS_CHANGE_STREAM
+from .db import settings
+
+SETTINGS_KEY = 'default'
+# Mongo error codes meaning "change streams are not available on this deployment"
+CHANGE_STREAM_UNSUPPORTED = {40573, 40324, 136}
+
+
+class SettingsCache:
+    def __init__(self):
+        self.doc: Optional[Dict] = None
+        self.version: Optional[int] = None
+        self.checked_at = 0.0
+        self.watching = False
+        self._task: Optional[asyncio.Task] = None
+        self.counters = {'hits': 0, 'loads': 0, 'revalidations': 0, 'invalidations': 0}
+
+    async def get(self) -> Optional[Dict]:
+        """A private copy of the cached settings; None when they must be (re)loaded."""
+        if self.doc is None:
+            return None
+        now = time.time()
+        if not self.watching and now - self.checked_at >= SETTINGS_CACHE_TTL_SEC:
+            self.counters['revalidations'] += 1
+            latest = await settings.find_one({'key': SETTINGS_KEY}, {'version': 1})
+            if not latest or int(latest.get('version') or 0) != self.version:
+                self.invalidate()
+                return None
+            self.checked_at = now
+        self.counters['hits'] += 1
+        # Callers edit lists like playboardConfigs in place before saving
+        return copy.deepcopy(self.doc)
+
+    def put(self, doc: Optional[Dict]) -> Optional[Dict]:
+        if doc is None:
+            return None
+        self.doc = doc
+        self.version = int(doc.get('version') or 0)
+        self.checked_at = time.time()
+        self.counters['loads'] += 1
+        return copy.deepcopy(doc)
+
+    def invalidate(self) -> None:
+        if self.doc is not None:
+            self.counters['invalidations'] += 1
+        self.doc = None
+        self.version = None
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                async with await settings.watch(full_document='default') as stream:
+                    self.watching = True
+                    # Writes that happened before the stream opened
+                    self.invalidate()
+                    print('[settings] watching settings changes')
+                    async for change in stream:
+                        if (change.get('fullDocument') or {}).get('version') == self.version:
+                            continue  # our own update_settings, already cached
+                        self.invalidate()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                self.watching = False
+                if e.code in CHANGE_STREAM_UNSUPPORTED:
+                    print(f'[settings] change streams unavailable ({e.code}); re-checking version every {SETTINGS_CACHE_TTL_SEC}s')
+                    return
+                print(f'[settings] change stream failed: {e}')
+            except Exception as e:
+                self.watching = False
+                print(f'[settings] change stream failed: {e}')
+            self.invalidate()
+            await asyncio.sleep(30)
+
+    async def start(self) -> None:
+        if SETTINGS_CHANGE_STREAM and not self._task:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except BaseException:
+                pass
+            self._task = None
+        self.watching = False
+
+    def stats(self) -> Dict:
+        return {
+            'cached': self.doc is not None,
+            'version': self.version,
+            'watching': self.watching,
+            'ttlSec': SETTINGS_CACHE_TTL_SEC,
+            **self.counters,
+        }
+
+
+settings_cache = SettingsCache()
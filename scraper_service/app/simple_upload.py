@@ -11,6 +11,8 @@ from datetime import datetime
 from typing import Optional, Dict, Any
 
 from .config import PEXELS_DRIVE_FOLDER_ID
+from .utils import primary_topic
+from .video_state import video_state
 
 BACKEND_URL = os.getenv('BACKEND_URL', 'http://localhost:5000')
 SCRAPER_ADMIN_TOKEN = os.getenv('SCRAPER_ADMIN_TOKEN', '').strip()
@@ -110,8 +112,8 @@ async def upload_video_after_download(video_id: str, file_path: str, platform: s
     
     try:
         # Call backend API for upload
-        video_doc = videos.find_one({'_id': video_id})
-        category = (video_doc or {}).get('category') or (video_doc or {}).get('topics') or ''
+        video_doc = await videos.find_one({'_id': video_id})
+        category = (video_doc or {}).get('category') or primary_topic((video_doc or {}).get('topics'), '')
         tags = (video_doc or {}).get('tags') or []
 
         upload_result = await upload_video_to_backend_api(
@@ -127,43 +129,21 @@ async def upload_video_after_download(video_id: str, file_path: str, platform: s
             drive_file_id = upload_result.get('fileId') or upload_result.get('id')
             drive_web_link = upload_result.get('webViewLink') or upload_result.get('weblink')
             
-            # Update video record with Drive info
-            try:
-                videos.update_one(
-                    {'_id': video_id},
-                    {
-                        '$set': {
-                            'driveUploadStatus': 'done',
-                            'driveFileId': drive_file_id,
-                            'driveWebLink': drive_web_link,
-                            'driveUploadedAt': datetime.utcnow()
-                        }
-                    }
-                )
-                print(f"✅ Updated video with Drive file ID: {drive_file_id}")
-            except Exception as e:
-                print(f"⚠️  Could not update video record: {e}")
+            # Update video record with Drive info (written with the download's state flush)
+            video_state.update(video_id, {
+                'driveUploadStatus': 'done',
+                'driveFileId': drive_file_id,
+                'driveWebLink': drive_web_link,
+                'driveUploadedAt': datetime.utcnow()
+            })
+            print(f"✅ Updated video with Drive file ID: {drive_file_id}")
         else:
             # Mark as skipped if upload failed
-            try:
-                videos.update_one(
-                    {'_id': video_id},
-                    {
-                        '$set': {
-                            'driveUploadStatus': 'skipped',
-                            'driveUploadSkipReason': 'Backend API upload failed'
-                        }
-                    }
-                )
-            except Exception as e:
-                print(f"⚠️  Error updating skip status: {e}")
+            video_state.update(video_id, {
+                'driveUploadStatus': 'skipped',
+                'driveUploadSkipReason': 'Backend API upload failed'
+            })
                 
     except Exception as e:
         print(f"❌ Error in upload_video_after_download: {e}")
-        try:
-            videos.update_one(
-                {'_id': video_id},
-                {'$set': {'driveUploadStatus': 'failed', 'driveUploadFailReason': str(e)}}
-            )
-        except Exception as update_err:
-            print(f"⚠️  Could not update failure status: {update_err}")
+        video_state.update(video_id, {'driveUploadStatus': 'failed', 'driveUploadFailReason': str(e)})
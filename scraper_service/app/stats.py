@@ -0,0 +1,126 @@
+"""
+Materialized dashboard stats.
+
+`/stats/overview` used to run six count_documents and a recent-items query
+on every request. Now one `$facet` aggregation computes every breakdown in a
+single pass over `trendvideos`:
+
+- status, platform, platform x status, topic x status
+- queue state and Drive upload state
+- views buckets and discovered-per-day for the last 14 days
+- the 10 most recent videos (summary shape)
+
+`$merge` writes the result into `trendstats` (`_id: 'videos-overview'`)
+without sending it back to the process. Reads serve that document and
+re-run the aggregation when it is older than STATS_REFRESH_SEC. A lock
+keeps concurrent dashboard requests from all refreshing at once.
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from .config import STATS_REFRESH_SEC
+from .db import videos, stats
+from .store import VIDEO_SUMMARY_FIELDS
+
+OVERVIEW_ID = 'videos-overview'
+VIEWS_BUCKETS = [0, 10_000, 100_000, 1_000_000, 10_000_000, 10 ** 15]
+DAILY_WINDOW_DAYS = 14
+
+_refresh_lock = asyncio.Lock()
+
+
+def _group_count(key) -> List[Dict]:
+    return [{'$group': {'_id': key, 'count': {'$sum': 1}}}, {'$sort': {'count': -1}}]
+
+
+def overview_pipeline(now: datetime) -> List[Dict]:
+    return [
+        {'$facet': {
+            'total': [{'$count': 'count'}],
+            'byStatus': _group_count('$downloadStatus'),
+            'byPlatform': _group_count('$platform'),
+            'byPlatformStatus': _group_count({'platform': '$platform', 'status': '$downloadStatus'}),
+            'byTopicStatus': [
+                {'$unwind': '$topics'},
+                *_group_count({'topic': '$topics', 'status': '$downloadStatus'}),
+            ],
+            'byQueueState': _group_count('$queueState'),
+            'byDriveUpload': _group_count('$driveUploadStatus'),
+            'viewsBuckets': [
+                {'$bucket': {'groupBy': '$views', 'boundaries': VIEWS_BUCKETS, 'default': 'other', 'output': {'count': {'$sum': 1}}}},
+            ],
+            'discoveredDaily': [
+                {'$match': {'discoveredAt': {'$gte': now - timedelta(days=DAILY_WINDOW_DAYS)}}},
+                *_group_count({'$dateToString': {'format': '%Y-%m-%d', 'date': '$discoveredAt'}}),
+                {'$sort': {'_id': 1}},
+            ],
+            'recent': [
+                {'$sort': {'discoveredAt': -1}},
+                {'$limit': 10},
+                {'$project': {name: 1 for name in VIDEO_SUMMARY_FIELDS}},
+            ],
+        }},
+        {'$addFields': {'_id': OVERVIEW_ID, 'refreshedAt': now}},
+        {'$merge': {'into': stats.name, 'on': '_id', 'whenMatched': 'replace', 'whenNotMatched': 'insert'}},
+    ]
+
+
+async def refresh_overview() -> None:
+    # $merge returns no documents; the cursor only has to be drained
+    cursor = await videos.aggregate(overview_pipeline(datetime.utcnow()))
+    await cursor.to_list()
+
+
+def _counts(rows: List[Dict]) -> Dict:
+    return {str(row['_id']) if row['_id'] is not None else 'none': row['count'] for row in rows or []}
+
+
+def _nested(rows: List[Dict], outer: str, inner: str) -> Dict:
+    out: Dict = {}
+    for row in rows or []:
+        key = row['_id'] or {}
+        out.setdefault(str(key.get(outer) or 'none'), {})[str(key.get(inner) or 'none')] = row['count']
+    return out
+
+
+def shape_overview(doc: Dict) -> Dict:
+    by_status = _counts(doc.get('byStatus'))
+    by_platform = _counts(doc.get('byPlatform'))
+    by_queue_state = _counts(doc.get('byQueueState'))
+    return {
+        'videos': ((doc.get('total') or [{}])[0]).get('count', 0),
+        'pexelsSubVideos': by_platform.get('pexels', 0),
+        'pending': by_status.get('pending', 0),
+        'failed': by_status.get('failed', 0),
+        'done': by_status.get('done', 0),
+        'persistedQueued': by_queue_state.get('queued', 0),
+        'persistedRunning': by_queue_state.get('downloading', 0),
+        'recent': doc.get('recent') or [],
+        'breakdown': {
+            'byStatus': by_status,
+            'byPlatform': by_platform,
+            'byPlatformStatus': _nested(doc.get('byPlatformStatus'), 'platform', 'status'),
+            'byTopicStatus': _nested(doc.get('byTopicStatus'), 'topic', 'status'),
+            'byQueueState': by_queue_state,
+            'byDriveUpload': _counts(doc.get('byDriveUpload')),
+            'viewsBuckets': _counts(doc.get('viewsBuckets')),
+            'discoveredDaily': _counts(doc.get('discoveredDaily')),
+        },
+        'refreshedAt': doc.get('refreshedAt'),
+    }
+
+
+async def get_overview(fresh: bool = False) -> Dict:
+    """Shaped overview from the materialized document, refreshed when stale or on `fresh`."""
+    doc = await stats.find_one({'_id': OVERVIEW_ID})
+    stale = not doc or not doc.get('refreshedAt') or doc['refreshedAt'] < datetime.utcnow() - timedelta(seconds=STATS_REFRESH_SEC)
+    if fresh or stale:
+        async with _refresh_lock:
+            # Another request may have refreshed it while this one waited
+            doc = await stats.find_one({'_id': OVERVIEW_ID})
+            if fresh or not doc or doc['refreshedAt'] < datetime.utcnow() - timedelta(seconds=STATS_REFRESH_SEC):
+                await refresh_overview()
+                doc = await stats.find_one({'_id': OVERVIEW_ID})
+    return shape_overview(doc or {})
@@ -1,7 +1,13 @@
-from datetime import datetime, timezone
+import re
 from bson import ObjectId
 from pymongo import ReturnDocument
-from .db import channels, videos, logs, settings
+from .archive import is_archived
+from .db import channels, videos, settings
+from .log_sink import log_sink, needs_resolution
+from .search import channel_search_fields, video_search_fields
+from .serializers import to_jsonable
+from .settings_cache import settings_cache
+from .transcripts import parse_srt, transcript_store
 from .utils import now_utc
 
 
@@ -9,6 +15,38 @@ def oid(v):
     return ObjectId(v) if isinstance(v, str) else v
 
 
+# Default list shapes: what the dashboards render. Detail-only fields (transcript, voiceover,
+# Drive metadata, local paths) come from the per-document endpoints or an explicit `fields=`.
+VIDEO_SUMMARY_FIELDS = [
+    'platform', 'videoId', 'title', 'views', 'url', 'thumbnail', 'topics', 'category', 'channel',
+    'downloadStatus', 'queueState', 'failReason', 'driveUploadStatus', 'discoveredAt', 'downloadedAt', 'updatedAt',
+]
+FIELD_NAME_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z0-9_]+)*$')
+MAX_PROJECTED_FIELDS = 50
+
+
+def projection(fields: str | None, summary: list | None = None) -> dict | None:
+    """
+    Mongo projection for a `fields=` query value: comma-separated (dotted) names, `summary`
+    (the default when `summary` is given) or `all` for whole documents. None means no projection.
+    """
+    requested = [f.strip() for f in (fields or '').split(',') if f.strip()]
+    if not requested or requested == ['summary']:
+        return {name: 1 for name in summary} if summary else None
+    if requested in (['all'], ['*']):
+        return None
+    bad = [f for f in requested if not FIELD_NAME_RE.match(f)]
+    if bad or len(requested) > MAX_PROJECTED_FIELDS:
+        raise ValueError(f'invalid fields: {", ".join(bad) or "too many"}')
+    names = set(requested)
+    if 'summary' in names and summary:
+        names.discard('summary')
+        names.update(summary)
+    # 'transcript' already covers 'transcript.language'; Mongo rejects the path collision
+    names = {n for n in names if not any(n.startswith(f'{other}.') for other in names)}
+    return {name: 1 for name in sorted(names)}
+
+
 # Default playboard configs matching the backend
 DEFAULT_PLAYBOARD_CONFIGS = [
     {"dimension": "most-viewed", "category": "All", "country": "Worldwide", "period": "weekly", "isActive": True, "priority": 10},
@@ -18,15 +56,21 @@ DEFAULT_PLAYBOARD_CONFIGS = [
 ]
 
 
-def get_or_create_settings():
+async def get_or_create_settings():
+    cached = await settings_cache.get()
+    if cached is not None:
+        return cached
+
     defaults = {
         'key': 'default',
+        # Bumped by every update_settings; the settings cache compares it to detect changes
+        'version': 0,
         'keywords': {
             'hai': ['hài', 'funny', 'comedy'],
             'dance': ['dance', 'nhảy', 'choreography'],
             'cooking': ['cooking', 'nấu ăn', 'recipe'],
         },
-        'cronTimes': {'discover': '0 7 * * *', 'scan': '30 8 * * *', 'pexels': '15 7 * * *'},
+        'cronTimes': {'discover': '0 7 * * *', 'scan': '30 8 * * *', 'pexels': '15 7 * * *', 'archive': '45 3 * * *'},
         'maxConcurrentDownload': 3,
         'minViewsFilter': 100000,
         'proxyList': [],
@@ -40,6 +84,8 @@ def get_or_create_settings():
             'pexels': True,
             'kuaishou': True,
         },
+        # Collect YouTube/DailyHaha/Douyin once per run and classify cards against all TOPICS
+        'discoverFanout': True,
         'pexelsSettings': {
             'isEnabled': True,
             'startUrl': 'https://www.pexels.com/vi-vn/video/',
@@ -54,27 +100,31 @@ def get_or_create_settings():
             'scrollTimes': 4,
         },
         'playboardConfigs': DEFAULT_PLAYBOARD_CONFIGS,
+        # Per-source request blocking overrides, merged over app/request_router.py ROUTE_POLICIES
+        # e.g. {'pexels': {'block_types': ['media', 'font']}, 'douyin': {'enabled': False}}
+        'resourceBlocking': {'enabled': True, 'policies': {}},
     }
-    doc = settings.find_one_and_update(
+    doc = await settings.find_one_and_update(
         {'key': 'default'},
         {'$setOnInsert': defaults},
         upsert=True,
         return_document=ReturnDocument.AFTER,
     )
-    return normalize(doc)
+    return settings_cache.put(normalize(doc))
 
 
-def update_settings(payload):
-    doc = settings.find_one_and_update(
+async def update_settings(payload):
+    payload = {k: v for k, v in payload.items() if k not in {'_id', 'key', 'version'}}
+    doc = await settings.find_one_and_update(
         {'key': 'default'},
-        {'$set': payload, '$setOnInsert': {'key': 'default'}},
+        {'$set': payload, '$inc': {'version': 1}, '$setOnInsert': {'key': 'default'}},
         upsert=True,
         return_document=ReturnDocument.AFTER,
     )
-    return normalize(doc)
+    return settings_cache.put(normalize(doc))
 
 
-def upsert_channel(platform, channel_id, name, topic):
+async def upsert_channel(platform, channel_id, name, topic):
     # First upsert without topics field
     update_doc = {
         '$set': {
@@ -83,29 +133,36 @@ def upsert_channel(platform, channel_id, name, topic):
             'name': name,
             'isActive': True,
             'updatedAt': now_utc(),
+            **channel_search_fields({'name': name, 'channelId': channel_id}),
         },
         '$setOnInsert': {'createdAt': now_utc(), 'priority': 5, 'totalVideos': 0, 'topics': []},
     }
     
-    doc = channels.find_one_and_update(
+    doc = await channels.find_one_and_update(
         {'platform': platform, 'channelId': channel_id},
         update_doc,
         upsert=True,
         return_document=ReturnDocument.AFTER,
     )
     
-    # Separately add topic if provided (avoids MongoDB operator conflict)
+    # Separately add topic(s) if provided (avoids MongoDB operator conflict)
     if topic:
-        doc = channels.find_one_and_update(
+        topic_update = {'$each': topic} if isinstance(topic, list) else topic
+        doc = await channels.find_one_and_update(
             {'_id': doc['_id']},
-            {'$addToSet': {'topics': topic}},
+            {'$addToSet': {'topics': topic_update}},
             return_document=ReturnDocument.AFTER,
         )
     
     return normalize(doc)
 
 
-def upsert_video(payload):
+async def upsert_video(payload):
+    """Insert or refresh a discovered video; None when it is archived (already discovered and handled)."""
+    # Archived videos are not re-inserted, and callers do not count or enqueue them
+    if await is_archived(payload['platform'], payload['videoId']):
+        return None
+
     thumbnail_value = payload.get('thumbnail', '') or ''
     if not thumbnail_value and payload.get('platform') == 'youtube' and payload.get('videoId'):
         thumbnail_value = f'https://img.youtube.com/vi/{payload["videoId"]}/hqdefault.jpg'
@@ -114,7 +171,7 @@ def upsert_video(payload):
         'title': payload.get('title', ''),
         'views': payload.get('views', 0),
         'url': payload.get('url', ''),
-        'topics': payload.get('topic'),
+        'topics': payload.get('topics') or payload.get('topic'),
         'channel': oid(payload['channelId']),
         'updatedAt': now_utc(),
     }
@@ -126,8 +183,9 @@ def upsert_video(payload):
         set_doc['detailUrl'] = payload.get('detailUrl')
     if thumbnail_value:
         set_doc['thumbnail'] = thumbnail_value
+    set_doc.update(video_search_fields(set_doc))
 
-    doc = videos.find_one_and_update(
+    doc = await videos.find_one_and_update(
         {'platform': payload['platform'], 'videoId': payload['videoId']},
         {
             '$set': set_doc,
@@ -140,68 +198,73 @@ def upsert_video(payload):
         upsert=True,
         return_document=ReturnDocument.AFTER,
     )
-    channels.update_one({'_id': oid(payload['channelId'])}, {'$inc': {'totalVideos': 1}})
+    # Tags / category kept from an earlier upsert when this payload has none
+    search_fields = video_search_fields(doc)
+    if search_fields['searchKeys'] != doc.get('searchKeys'):
+        await videos.update_one({'_id': doc['_id']}, {'$set': search_fields})
+        doc.update(search_fields)
+    await channels.update_one({'_id': oid(payload['channelId'])}, {'$inc': {'totalVideos': 1}})
     return normalize(doc)
 
 
-def update_video_transcript(video_id, transcript_srt, transcript_language='mixed'):
+async def transcript_fields(video_id, transcript, transcript_language='mixed'):
     """
-    Update video with fetched transcript
-    
+    Store a fetched transcript; returns the video fields that reference it
+
     Args:
         video_id: MongoDB ObjectId of video
-        transcript_srt: SRT formatted transcript text
+        transcript: list of {'text', 'start', 'duration'} segments, or an SRT string
         transcript_language: Language of transcript (default: 'mixed' for vi/en)
-    
+    """
+    segments = parse_srt(transcript) if isinstance(transcript, str) else (transcript or [])
+    return {'transcript': await transcript_store.save(oid(video_id), segments, transcript_language)}
+
+
+def transcript_error_fields(error_message):
+    """Video fields recording a transcript fetch error (truncated to 500 chars) for later retry/debugging"""
+    return {
+        'transcript.fetchError': error_message[:500] if error_message else None,
+        'transcript.fetchedAt': now_utc(),
+    }
+
+
+async def update_video_transcript(video_id, transcript, transcript_language='mixed'):
+    """
+    Store a fetched transcript and its summary on the video
+
     Returns:
-        Normalized video document
+        Normalized video document (segments live in the transcript collection)
     """
-    doc = videos.find_one_and_update(
+    fields = await transcript_fields(video_id, transcript, transcript_language)
+    doc = await videos.find_one_and_update(
         {'_id': oid(video_id)},
-        {
-            '$set': {
-                'transcript.srt': transcript_srt if transcript_srt else None,
-                'transcript.language': transcript_language,
-                'transcript.fetchedAt': now_utc(),
-                'transcript.fetchError': None,
-                'updatedAt': now_utc(),
-            }
-        },
+        {'$set': {**fields, 'updatedAt': now_utc()}},
         return_document=ReturnDocument.AFTER,
     )
     return normalize(doc)
 
 
-def update_video_transcript_error(video_id, error_message):
+async def update_video_transcript_error(video_id, error_message):
     """
     Store transcript fetch error for later retry/debugging
-    
-    Args:
-        video_id: MongoDB ObjectId of video
-        error_message: Error string (truncated to 500 chars)
-    
+
     Returns:
         Normalized video document
     """
-    doc = videos.find_one_and_update(
+    doc = await videos.find_one_and_update(
         {'_id': oid(video_id)},
-        {
-            '$set': {
-                'transcript.fetchError': error_message[:500] if error_message else None,
-                'transcript.fetchedAt': now_utc(),
-                'updatedAt': now_utc(),
-            }
-        },
+        {'$set': {**transcript_error_fields(error_message), 'updatedAt': now_utc()}},
         return_document=ReturnDocument.AFTER,
     )
     return normalize(doc)
 
 
-def log_job(job_type, status, **kwargs):
+async def log_job(job_type, status, **kwargs):
     base_keys = {'topic', 'platform', 'itemsFound', 'itemsDownloaded', 'duration', 'error'}
     extra = {k: v for k, v in kwargs.items() if k not in base_keys}
 
-    logs.insert_one({
+    doc = {
+        '_id': ObjectId(),
         'jobType': job_type,
         'status': status,
         'topic': kwargs.get('topic'),
@@ -214,23 +277,16 @@ def log_job(job_type, status, **kwargs):
         'ranAt': now_utc(),
         'createdAt': now_utc(),
         'updatedAt': now_utc(),
-    })
+    }
+    if needs_resolution(doc):
+        # Resolved and updated through the API right away; must not sit in the buffer
+        await log_sink.write(doc)
+    else:
+        log_sink.add(doc)
+    return doc['_id']
 
 
 def normalize(doc):
     if not doc:
         return None
-
-    def serialize(value):
-        if isinstance(value, ObjectId):
-            return str(value)
-        if isinstance(value, datetime):
-            utc_value = value if value.tzinfo else value.replace(tzinfo=timezone.utc)
-            return utc_value.astimezone(timezone.utc).isoformat().replace('+00:00', 'Z')
-        if isinstance(value, list):
-            return [serialize(item) for item in value]
-        if isinstance(value, dict):
-            return {key: serialize(item) for key, item in value.items()}
-        return value
-
-    return serialize(dict(doc))
+    return to_jsonable(dict(doc))
@@ -8,6 +8,7 @@ Note: YouTube's API enforces strict rate limiting (429 errors).
 For production use at scale, consider using a dedicated proxy service.
 """
 
+import asyncio
 import re
 import time
 from datetime import timedelta, datetime
@@ -30,25 +31,25 @@ class TranscriptService:
         TranscriptService._db_collection = db_collection
     
     @staticmethod
-    def _get_rate_limit_record():
+    async def _get_rate_limit_record():
         """Get global rate limit record from DB"""
-        if not TranscriptService._db_collection:
+        if TranscriptService._db_collection is None:
             return None
         try:
             # Use a single document to track overall rate limiting status
-            record = TranscriptService._db_collection.find_one({'_id': 'transcript_rate_limit_state'})
+            record = await TranscriptService._db_collection.find_one({'_id': 'transcript_rate_limit_state'})
             return record
         except Exception as e:
             print(f'[TranscriptService] Error reading rate limit record: {e}')
             return None
     
     @staticmethod
-    def _set_rate_limit_record(timestamp):
+    async def _set_rate_limit_record(timestamp):
         """Save rate limit timestamp to DB"""
-        if not TranscriptService._db_collection:
+        if TranscriptService._db_collection is None:
             return False
         try:
-            TranscriptService._db_collection.update_one(
+            await TranscriptService._db_collection.update_one(
                 {'_id': 'transcript_rate_limit_state'},
                 {
                     '$set': {
@@ -65,7 +66,7 @@ class TranscriptService:
             return False
     
     @staticmethod
-    def _is_rate_limited():
+    async def _is_rate_limited():
         """
         Check if we're currently in rate limit cooldown.
         Checks both in-memory cache (fast) and DB (persistent)
@@ -76,7 +77,7 @@ class TranscriptService:
         now = time.time()
         
         # Get from DB for persistent state
-        db_record = TranscriptService._get_rate_limit_record()
+        db_record = await TranscriptService._get_rate_limit_record()
         if db_record:
             expires_at = db_record.get('cooldownExpiresAt')
             if expires_at:
@@ -87,7 +88,7 @@ class TranscriptService:
                 else:
                     # Cooldown expired, clean up DB record
                     try:
-                        TranscriptService._db_collection.update_one(
+                        await TranscriptService._db_collection.update_one(
                             {'_id': 'transcript_rate_limit_state'},
                             {'$unset': {'lastRateLimitedAt': '', 'cooldownExpiresAt': ''}}
                         )
@@ -108,7 +109,7 @@ class TranscriptService:
         return f'{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}'
     
     @staticmethod
-    def _fetch_raw_transcript(video_id: str, languages: list = None, retry_count: int = 0):
+    async def _fetch_raw_transcript(video_id: str, languages: list = None, retry_count: int = 0):
         """
         Fetch raw transcript from YouTube using list_transcripts + find methods
         
@@ -129,7 +130,7 @@ class TranscriptService:
             languages = TranscriptService.DEFAULT_LANGUAGES
 
         # ⚠️ Check if we're in rate-limit cooldown (persistent check)
-        is_limited, expires_at = TranscriptService._is_rate_limited()
+        is_limited, expires_at = await TranscriptService._is_rate_limited()
         if is_limited:
             minutes_left = int((expires_at - time.time()) / 60) if expires_at else 120
             print(f'[TranscriptService] Rate-limit cooldown active - skipping transcript fetch for {video_id} ({minutes_left}min remaining)')
@@ -138,8 +139,8 @@ class TranscriptService:
         try:
             print(f'[TranscriptService] Listing available transcripts for {video_id}...')
             
-            # Get available transcripts
-            transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+            # Get available transcripts (the API client is blocking, keep it off the event loop)
+            transcript_list = await asyncio.to_thread(YouTubeTranscriptApi.list_transcripts, video_id)
             
             # Try each language in order
             for lang_code in languages:
@@ -151,7 +152,7 @@ class TranscriptService:
                     print(f'[TranscriptService] ✅ Found {lang_code}: {transcript_obj.language}')
                     
                     # Fetch the actual transcript
-                    transcript_data = transcript_obj.fetch()
+                    transcript_data = await asyncio.to_thread(transcript_obj.fetch)
                     print(f'[TranscriptService] ✅ Fetched {lang_code} - {len(transcript_data)} snippets')
                     
                     return TranscriptService._normalize_snippets(transcript_data), None
@@ -163,7 +164,7 @@ class TranscriptService:
                     if '429' in error_str or 'Too Many Requests' in error_str:
                         timestamp = time.time()
                         TranscriptService._rate_limit_cache['_global_'] = timestamp
-                        TranscriptService._set_rate_limit_record(timestamp)
+                        await TranscriptService._set_rate_limit_record(timestamp)
                         print(f'[TranscriptService] 🛑 Rate limited (429). Starting 2-hour cooldown.')
                         return [], 'rate_limited'
                     
@@ -178,7 +179,7 @@ class TranscriptService:
             if '429' in error_str or 'Too Many Requests' in error_str:
                 timestamp = time.time()
                 TranscriptService._rate_limit_cache['_global_'] = timestamp
-                TranscriptService._set_rate_limit_record(timestamp)
+                await TranscriptService._set_rate_limit_record(timestamp)
                 print(f'[TranscriptService] 🛑 Rate limited (429) from list_transcripts. Starting 2-hour cooldown.')
                 return [], 'rate_limited'
             print(f'[TranscriptService] Fatal error: {error_str[:200]}')
@@ -256,6 +257,7 @@ class TranscriptService:
                 'success': bool,
                 'videoId': str,
                 'transcript': str or None,
+                'segments': [{'text', 'start', 'duration'}] (on success),
                 'format': 'srt' | 'text',
                 'language': str,
                 'error': str or None,
@@ -279,7 +281,7 @@ class TranscriptService:
         
         try:
             # Fetch raw transcript
-            raw_transcript, error_code = TranscriptService._fetch_raw_transcript(video_id, languages)
+            raw_transcript, error_code = await TranscriptService._fetch_raw_transcript(video_id, languages)
             
             if not raw_transcript:
                 if error_code == 'rate_limited':
@@ -313,6 +315,7 @@ class TranscriptService:
                 'success': True,
                 'videoId': video_id,
                 'transcript': transcript_text,
+                'segments': raw_transcript,  # stored structured (app/transcripts.py)
                 'format': output_format,
                 'language': 'mixed',  # We don't track exact language, could be vi or en
                 'error': None,
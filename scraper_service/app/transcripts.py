@@ -0,0 +1,230 @@
+"""
+Compressed transcript storage.
+
+`update_video_transcript()` used to write the whole SRT string into
+`trendvideos.transcript.srt`. Every list query, `normalize()` call and
+working-set page then carried that payload. Now transcripts live in
+`trendtranscripts`, one document per video:
+
+- segments are stored as columns (`start` / `duration` in ms, `text`),
+  encoded with orjson and compressed with zstd (zlib when `zstandard` is not
+  installed; the codec is recorded per document)
+- the video keeps only `transcript.ref` plus summary fields (language,
+  segment count, duration, characters, a short preview)
+
+SRT and plain text are rendered from the segments on request. The last
+TRANSCRIPT_CACHE_SIZE renderings are kept in an in-memory LRU. Other readers
+of `trendvideos` use `GET /api/shorts-reels/videos/{id}/transcript`, never
+`transcript.srt`. The Node backend (backend/services/videoPipelineService.js)
+is one of them.
+"""
+
+import re
+import zlib
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, List, Tuple
+
+import orjson
+from bson import Binary, ObjectId
+from pymongo import ReturnDocument
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
+
+from .config import TRANSCRIPT_CACHE_SIZE, TRANSCRIPT_ZSTD_LEVEL
+from .db import transcripts, videos
+from .utils import now_utc
+
+FORMATS = {'srt', 'text', 'segments'}
+PREVIEW_CHARS = 200
+MIGRATE_BATCH = 200
+SRT_TIMING_RE = re.compile(r'(\d+):(\d{2}):(\d{2})[,.](\d{3})\s*-->\s*(\d+):(\d{2}):(\d{2})[,.](\d{3})')
+
+
+def _compress(raw: bytes) -> Tuple[str, bytes]:
+    if zstandard is not None:
+        return 'zstd', zstandard.ZstdCompressor(level=TRANSCRIPT_ZSTD_LEVEL).compress(raw)
+    return 'zlib', zlib.compress(raw, 9)
+
+
+def _decompress(codec: str, data: bytes) -> bytes:
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('transcript is zstd-compressed but zstandard is not installed')
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == 'zlib':
+        return zlib.decompress(data)
+    raise ValueError(f'unknown transcript codec: {codec}')
+
+
+def encode_segments(segments: List[Dict]) -> Dict:
+    columns = {'start': [], 'duration': [], 'text': []}
+    for seg in segments:
+        text = str(seg.get('text') or '').strip()
+        if not text:
+            continue
+        columns['start'].append(round(float(seg.get('start') or 0) * 1000))
+        columns['duration'].append(round(float(seg.get('duration') or 0) * 1000))
+        columns['text'].append(text)
+    raw = orjson.dumps(columns)
+    codec, data = _compress(raw)
+    return {'codec': codec, 'data': Binary(data), 'rawBytes': len(raw), 'storedBytes': len(data), 'columns': columns}
+
+
+def decode_segments(doc: Dict) -> List[Dict]:
+    columns = orjson.loads(_decompress(doc.get('codec'), bytes(doc['data'])))
+    return [
+        {'start': start / 1000, 'duration': duration / 1000, 'text': text}
+        for start, duration, text in zip(columns['start'], columns['duration'], columns['text'])
+    ]
+
+
+def format_timestamp(seconds: float) -> str:
+    """Seconds as an SRT timestamp (HH:MM:SS,mmm)."""
+    total_seconds = int(timedelta(seconds=seconds).total_seconds())
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    secs = total_seconds % 60
+    millis = int((seconds % 1) * 1000)
+    return f'{hours:02d}:{minutes:02d}:{secs:02d},{millis:03d}'
+
+
+def render_srt(segments: List[Dict]) -> str:
+    lines = []
+    for idx, seg in enumerate(segments, start=1):
+        text = str(seg.get('text') or '').strip()
+        if not text:
+            continue
+        start = float(seg.get('start') or 0)
+        end = start + float(seg.get('duration') or 0)
+        lines.extend([f'{idx}', f'{format_timestamp(start)} --> {format_timestamp(end)}', text, ''])
+    return '\n'.join(lines)
+
+
+def render_text(segments: List[Dict]) -> str:
+    return ' '.join(seg['text'] for seg in segments if seg.get('text'))
+
+
+def parse_srt(srt: str) -> List[Dict]:
+    """Segments of an SRT string (the format stored inline before this module)."""
+    segments = []
+    for block in re.split(r'\n\s*\n', (srt or '').replace('\r\n', '\n').strip()):
+        lines = block.split('\n')
+        for i, line in enumerate(lines):
+            m = SRT_TIMING_RE.search(line)
+            if not m:
+                continue
+            h1, m1, s1, ms1, h2, m2, s2, ms2 = (int(x) for x in m.groups())
+            start = h1 * 3600 + m1 * 60 + s1 + ms1 / 1000
+            end = h2 * 3600 + m2 * 60 + s2 + ms2 / 1000
+            text = '\n'.join(lines[i + 1:]).strip()
+            if text:
+                segments.append({'start': start, 'duration': max(end - start, 0), 'text': text})
+            break
+    return segments
+
+
+class TranscriptStore:
+    def __init__(self):
+        self.cache: 'OrderedDict[Tuple[ObjectId, str], object]' = OrderedDict()
+        self.counters = {'saved': 0, 'rendered': 0, 'cacheHits': 0, 'migrated': 0, 'rawBytes': 0, 'storedBytes': 0}
+
+    def _invalidate(self, video_oid: ObjectId) -> None:
+        for key in [key for key in self.cache if key[0] == video_oid]:
+            del self.cache[key]
+
+    async def save(self, video_oid: ObjectId, segments: List[Dict], language: str) -> Dict:
+        """Store `segments` for the video; returns the summary fields for `videos.transcript`."""
+        encoded = encode_segments(segments)
+        columns = encoded.pop('columns')
+        fetched_at = now_utc()
+        doc = await transcripts.find_one_and_update(
+            {'video': video_oid},
+            {
+                '$set': {**encoded, 'language': language, 'segmentCount': len(columns['text']), 'fetchedAt': fetched_at},
+                '$setOnInsert': {'createdAt': fetched_at},
+            },
+            upsert=True,
+            projection={'_id': 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        self._invalidate(video_oid)
+        self.counters['saved'] += 1
+        self.counters['rawBytes'] += encoded['rawBytes']
+        self.counters['storedBytes'] += encoded['storedBytes']
+        text = ' '.join(columns['text'])
+        ends = [start + duration for start, duration in zip(columns['start'], columns['duration'])]
+        return {
+            'ref': doc['_id'],
+            'language': language,
+            'segmentCount': len(columns['text']),
+            'durationSec': round(max(ends, default=0) / 1000, 3),
+            'chars': len(text),
+            'preview': text[:PREVIEW_CHARS],
+            'fetchedAt': fetched_at,
+            'fetchError': None,
+        }
+
+    async def render(self, video_oid: ObjectId, fmt: str = 'srt'):
+        """The video's transcript as `srt` / `text` (str) or `segments` (list); None when it has none."""
+        if fmt not in FORMATS:
+            raise ValueError(f'format must be one of {", ".join(sorted(FORMATS))}')
+        key = (video_oid, fmt)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            self.counters['cacheHits'] += 1
+            return self.cache[key]
+        doc = await transcripts.find_one({'video': video_oid})
+        if not doc:
+            return None
+        segments = decode_segments(doc)
+        rendered = render_srt(segments) if fmt == 'srt' else render_text(segments) if fmt == 'text' else segments
+        self.counters['rendered'] += 1
+        if TRANSCRIPT_CACHE_SIZE > 0:
+            self.cache[key] = rendered
+            while len(self.cache) > TRANSCRIPT_CACHE_SIZE:
+                self.cache.popitem(last=False)
+        return rendered
+
+    async def delete(self, video_oids: List[ObjectId]) -> int:
+        for video_oid in video_oids:
+            self._invalidate(video_oid)
+        result = await transcripts.delete_many({'video': {'$in': list(video_oids)}})
+        return result.deleted_count
+
+    async def migrate_inline(self) -> int:
+        """Move `transcript.srt` strings left in video documents into the transcript collection."""
+        migrated = 0
+        while True:
+            batch = await videos.find(
+                {'transcript.srt': {'$type': 'string'}}, {'transcript': 1}
+            ).limit(MIGRATE_BATCH).to_list()
+            if not batch:
+                break
+            for video in batch:
+                transcript = video.get('transcript') or {}
+                summary = await self.save(video['_id'], parse_srt(transcript['srt']), transcript.get('language') or 'mixed')
+                # Keep the original fetch time rather than the migration time
+                if transcript.get('fetchedAt'):
+                    summary['fetchedAt'] = transcript['fetchedAt']
+                summary['fetchError'] = transcript.get('fetchError')
+                await videos.update_one({'_id': video['_id']}, {'$set': {'transcript': summary}})
+                migrated += 1
+        if migrated:
+            self.counters['migrated'] += migrated
+            print(f'[transcripts] moved {migrated} inline transcripts to {transcripts.name}')
+        return migrated
+
+    def stats(self) -> Dict:
+        return {
+            'codec': 'zstd' if zstandard is not None else 'zlib',
+            'cached': len(self.cache),
+            'cacheSize': TRANSCRIPT_CACHE_SIZE,
+            **self.counters,
+        }
+
+
+transcript_store = TranscriptStore()
@@ -1,4 +1,5 @@
 import re
+import unicodedata
 from datetime import datetime
 
 TOPICS = ['funny', 'hai', 'dance', 'sexy dance', 'cooking']
@@ -8,6 +9,23 @@ def now_utc():
     return datetime.utcnow()
 
 
+def cron_to_args(expr):
+    parts = (expr or '').split()
+    if len(parts) != 5:
+        parts = ['0', '7', '*', '*', '*']
+    minute, hour, day, month, dow = parts
+    return {'minute': minute, 'hour': hour, 'day': day, 'month': month, 'day_of_week': dow}
+
+
+def normalize_text(value: str) -> str:
+    """Lower-cased and accent-folded: 'Hài Hước' -> 'hai huoc'."""
+    try:
+        text = unicodedata.normalize('NFKD', (value or '').lower())
+        return ''.join([c for c in text if not unicodedata.combining(c)])
+    except Exception:
+        return (value or '').lower()
+
+
 def parse_views(text: str) -> int:
     s = (text or '').replace(',', '').upper()
     m = re.search(r'([0-9]*\.?[0-9]+)\s*([KMB])?', s)
@@ -69,6 +87,19 @@ def match_topic(text: str, topic: str, keywords: list[str]) -> bool:
     return False
 
 
+def classify_topics(text: str, topics: list[str], keywords_by_topic: dict | None = None) -> list[str]:
+    """Match one card text against every topic in a single pass (fan-out discovery)."""
+    keyword_map = keywords_by_topic or {}
+    return [topic for topic in topics if match_topic(text, topic, keyword_map.get(topic, [topic]))]
+
+
+def primary_topic(value, default: str = 'misc') -> str:
+    """Video `topics` may be a single string or a list of fan-out matches."""
+    if isinstance(value, list):
+        return str(value[0]) if value else default
+    return str(value) if value else default
+
+
 
 
 def extract_douyin_id(url: str) -> str:
@@ -0,0 +1,289 @@
+"""
+Download state machine with coalesced, batched video writes.
+
+A single download used to write its video document four or five times:
+`enqueue` (queued), `process_download` (downloading, then done / failed),
+the Drive upload result and the transcript. Each write re-set overlapping
+fields like `updatedAt` / `queueState`. Now those writes go through
+`video_state`:
+
+- `transition()` moves a video along `TRANSITIONS` (queueState values) and
+  rejects moves the table does not allow (e.g. a stale queue entry trying to
+  download a video that is already done). It records `{from, to, at, ms}` in
+  `stateHistory`, keeping the last VIDEO_STATE_HISTORY entries. `ms` is the
+  time spent in the previous state.
+- `update()` adds plain fields (Drive, transcript) to the same pending write.
+- pending changes are merged per video in memory and written with one
+  unordered `bulk_write` once VIDEO_STATE_FLUSH_BATCH videos are dirty, or
+  VIDEO_STATE_FLUSH_INTERVAL_SEC after the first change
+
+Until a flush, the document lags the in-memory state. `current()` exposes
+the unflushed state so `enqueue` checks are not fooled by it. After a
+successful flush the overlay is dropped and the document is authoritative
+again. So callers pass the document they hold, not a bare id, and
+`transition()` updates that dict in place. That keeps it current for the
+next transition of the same job, whether or not a flush happened in between.
+
+A failed flush re-queues only what can still succeed: ops that fail
+transiently (network errors, step-downs, write conflicts), up to
+MAX_FLUSH_ATTEMPTS times. Ops that were written, or that failed for good,
+are not retried.
+"""
+
+import asyncio
+from collections import deque
+from datetime import datetime
+from typing import Dict, Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, ConnectionFailure
+
+from .config import VIDEO_STATE_FLUSH_BATCH, VIDEO_STATE_FLUSH_INTERVAL_SEC, VIDEO_STATE_HISTORY
+from .db import videos
+
+# queueState -> allowed next queueStates (staying in the same state is always allowed)
+TRANSITIONS = {
+    'pending': {'queued', 'failed'},
+    'queued': {'downloading', 'retry-pending', 'failed', 'pending'},
+    'downloading': {'done', 'retry-pending', 'failed', 'pending'},
+    'retry-pending': {'queued', 'pending', 'failed'},
+    'done': {'pending', 'queued'},
+    'failed': {'pending', 'queued'},
+}
+# downloadStatus written with each queueState (None: left as is)
+DOWNLOAD_STATUS = {
+    'pending': 'pending',
+    'queued': None,
+    'downloading': 'downloading',
+    'done': 'done',
+    'retry-pending': 'pending',
+    'failed': 'failed',
+}
+# Server error codes worth retrying: elections / shutdown, timeouts, write conflicts
+TRANSIENT_WRITE_CODES = {6, 7, 50, 89, 91, 112, 189, 262, 9001, 10107, 11600, 11602, 13435, 13436}
+MAX_FLUSH_ATTEMPTS = 5
+
+
+def state_of(doc: Dict) -> str:
+    """queueState of a stored document; older documents only have downloadStatus."""
+    state = doc.get('queueState')
+    if state in TRANSITIONS:
+        return state
+    status = doc.get('downloadStatus')
+    return status if status in ('done', 'failed', 'downloading') else 'pending'
+
+
+def _merge(target: Dict, fields: Dict) -> None:
+    # Mongo rejects 'transcript' and 'transcript.fetchError' in the same $set: fold them together
+    for key, value in fields.items():
+        parent = next((p for p in target if key.startswith(f'{p}.')), None)
+        if parent is not None and isinstance(target[parent], dict):
+            node = target[parent]
+            *path, leaf = key[len(parent) + 1:].split('.')
+            for part in path:
+                node = node.setdefault(part, {})
+            node[leaf] = value
+            continue
+        for child in [c for c in target if c.startswith(f'{key}.')]:
+            del target[child]
+        target[key] = value
+
+
+class VideoStateWriter:
+    def __init__(self):
+        self.pending: Dict[str, Dict] = {}
+        self.states: Dict[str, str] = {}
+        self.changed_at: Dict[str, datetime] = {}
+        self._wake = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.rejections = deque(maxlen=20)
+        self.counters = {
+            'transitions': 0, 'rejected': 0, 'updates': 0, 'coalesced': 0,
+            'flushes': 0, 'written': 0, 'flushErrors': 0, 'retried': 0, 'dropped': 0,
+        }
+
+    def current(self, video_id) -> Optional[str]:
+        """Unflushed queueState of the video, if any."""
+        return self.states.get(str(video_id))
+
+    def _entry(self, key: str) -> Dict:
+        entry = self.pending.get(key)
+        if entry is None:
+            entry = self.pending[key] = {'set': {}, 'history': [], 'attempts': 0}
+        else:
+            self.counters['coalesced'] += 1
+        return entry
+
+    def transition(self, doc: Dict, to: str, fields: Optional[Dict] = None) -> bool:
+        """
+        Move the video `doc` to queueState `to`; `doc` is updated in place to the new state.
+        Returns False, writing nothing, when the transition is not allowed.
+        """
+        if not isinstance(doc, dict):
+            # A bare id has no state once its overlay is flushed: it would read as 'pending'
+            raise TypeError(f'transition() needs the video document, got {type(doc).__name__}')
+        key = str(doc['_id'])
+        previous = self.states.get(key) or state_of(doc)
+        if to != previous and to not in TRANSITIONS.get(previous, ()):
+            self.counters['rejected'] += 1
+            self.rejections.append({'video': key, 'from': previous, 'to': to, 'at': datetime.utcnow()})
+            print(f'[video-state] ⚠️ rejected {previous} -> {to} for {key}')
+            return False
+
+        now = datetime.utcnow()
+        since = self.changed_at.get(key) or doc.get('stateChangedAt')
+        entry = self._entry(key)
+        changes = {'queueState': to, 'stateChangedAt': now, 'updatedAt': now, **(fields or {})}
+        if DOWNLOAD_STATUS.get(to):
+            changes['downloadStatus'] = DOWNLOAD_STATUS[to]
+        _merge(entry['set'], changes)
+        entry['history'].append({
+            'from': previous,
+            'to': to,
+            'at': now,
+            'ms': int((now - since).total_seconds() * 1000) if isinstance(since, datetime) else None,
+        })
+        self.states[key] = to
+        self.changed_at[key] = now
+        doc.update({'queueState': to, 'stateChangedAt': now})
+        if DOWNLOAD_STATUS.get(to):
+            doc['downloadStatus'] = DOWNLOAD_STATUS[to]
+        self.counters['transitions'] += 1
+        self._schedule()
+        return True
+
+    def update(self, video_id, fields: Dict) -> None:
+        """Set non-state fields with the video's next flush."""
+        entry = self._entry(str(video_id))
+        _merge(entry['set'], {**fields, 'updatedAt': datetime.utcnow()})
+        self.counters['updates'] += 1
+        self._schedule()
+
+    def _schedule(self) -> None:
+        if self._task is None:
+            # Not started (scripts, tests): no background flusher, so write through
+            asyncio.get_running_loop().create_task(self.flush())
+        elif len(self.pending) >= VIDEO_STATE_FLUSH_BATCH or len(self.pending) == 1:
+            self._wake.set()
+
+    @staticmethod
+    def _operation(key: str, entry: Dict) -> UpdateOne:
+        update = {'$set': entry['set']}
+        if entry['history']:
+            update['$push'] = {'stateHistory': {'$each': entry['history'], '$slice': -VIDEO_STATE_HISTORY}}
+        return UpdateOne({'_id': ObjectId(key)}, update)
+
+    def _requeue(self, key: str, entry: Dict) -> bool:
+        entry['attempts'] += 1
+        if entry['attempts'] >= MAX_FLUSH_ATTEMPTS:
+            return False
+        # Anything recorded for the video during the flush is newer: apply it on top
+        newer = self.pending.get(key)
+        if newer:
+            _merge(entry['set'], newer['set'])
+            entry['history'].extend(newer['history'])
+        self.pending[key] = entry
+        self.counters['retried'] += 1
+        return True
+
+    async def _write_each(self, keys, batch: Dict) -> Dict:
+        errors = {}
+        for key in keys:
+            try:
+                await videos.bulk_write([self._operation(key, batch[key])])
+            except ConnectionFailure as e:
+                errors[key] = {'errmsg': str(e), 'transient': True}
+            except BulkWriteError as e:
+                errors[key] = (e.details.get('writeErrors') or [{'errmsg': str(e)}])[0]
+            except Exception as e:
+                errors[key] = {'errmsg': str(e)}
+        return errors
+
+    async def flush(self) -> int:
+        async with self._flush_lock:
+            batch, self.pending = self.pending, {}
+            if not batch:
+                return 0
+            self.counters['flushes'] += 1
+            keys = list(batch)
+            errors = {}
+            try:
+                await videos.bulk_write([self._operation(key, batch[key]) for key in keys], ordered=False)
+            except BulkWriteError as e:
+                # Unordered: every op not listed in writeErrors was applied and must not be re-sent
+                errors = {keys[err['index']]: err for err in e.details.get('writeErrors', [])}
+            except ConnectionFailure as e:
+                # Nothing is known to be written: retry the whole batch
+                errors = {key: {'errmsg': str(e), 'transient': True} for key in keys}
+            except Exception:
+                # Not attributable to one op (e.g. a value BSON cannot encode): isolate it
+                errors = await self._write_each(keys, batch)
+
+            dropped = 0
+            for key, err in errors.items():
+                transient = err.get('transient') or err.get('code') in TRANSIENT_WRITE_CODES
+                if not (transient and self._requeue(key, batch[key])):
+                    dropped += 1
+                    reason = f'gave up after {MAX_FLUSH_ATTEMPTS} attempts' if transient else 'not retryable'
+                    print(f'[video-state] ⚠️ dropped write for {key} ({reason}): {err.get("errmsg")}')
+            if errors:
+                self.counters['flushErrors'] += 1
+                self.counters['dropped'] += dropped
+                print(f'[video-state] flush: {len(errors)} of {len(batch)} writes failed, {len(errors) - dropped} will retry')
+
+            # The documents are current again unless the video changed (or was re-queued) during the flush
+            for key in batch:
+                if key not in self.pending:
+                    self.states.pop(key, None)
+                    self.changed_at.pop(key, None)
+            written = len(batch) - len(errors)
+            self.counters['written'] += written
+            return written
+
+    async def _loop(self) -> None:
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            if len(self.pending) < VIDEO_STATE_FLUSH_BATCH:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=VIDEO_STATE_FLUSH_INTERVAL_SEC)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+            await self.flush()
+            if self.pending:
+                self._wake.set()
+
+    async def start(self) -> None:
+        if not self._task:
+            self._task = asyncio.create_task(self._loop())
+            if self.pending:
+                self._wake.set()
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except BaseException:
+                pass
+            self._task = None
+        await self.flush()
+
+    def stats(self) -> Dict:
+        requested = self.counters['transitions'] + self.counters['updates']
+        return {
+            'dirtyVideos': len(self.pending),
+            'trackedStates': len(self.states),
+            'flushBatch': VIDEO_STATE_FLUSH_BATCH,
+            'flushIntervalSec': VIDEO_STATE_FLUSH_INTERVAL_SEC,
+            # Individual update_one calls the batching replaced
+            'writesSaved': max(requested - self.counters['written'] - len(self.pending), 0),
+            'recentRejections': list(self.rejections),
+            **self.counters,
+        }
+
+
+video_state = VideoStateWriter()
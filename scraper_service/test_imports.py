@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Import smoke check for every module in app/
+
+compileall only catches syntax errors; a name that is undefined at import
+time (an annotation, a default argument, a decorator) only fails when the
+module is imported. Importing `app.main` is what `run.py` does, so a failure
+here means the service cannot start.
+
+    python test_imports.py
+"""
+
+import importlib
+import pkgutil
+import sys
+import traceback
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent / 'app'
+
+
+def main() -> int:
+    sys.path.insert(0, str(APP_DIR.parent))
+    names = [f'app.{m.name}' for m in pkgutil.iter_modules([str(APP_DIR)])]
+    failures = []
+    missing = set()
+    skipped = []
+    for name in names:
+        try:
+            importlib.import_module(name)
+        except ModuleNotFoundError as e:
+            # A third-party package not installed in this environment is not a code error
+            if e.name and not e.name.startswith('app'):
+                missing.add(e.name)
+                skipped.append(name)
+                print(f'⚠️  {name}: missing dependency {e.name}')
+                continue
+            failures.append(name)
+            print(f'❌ {name}')
+            traceback.print_exc()
+        except Exception:
+            failures.append(name)
+            print(f'❌ {name}')
+            traceback.print_exc()
+        else:
+            print(f'✅ {name}')
+
+    if failures:
+        print(f'\n❌ {len(failures)} module(s) fail to import: {", ".join(failures)}')
+        return 1
+    if 'app.main' in skipped:
+        print(f'\n⚠️  app.main not checked, install requirements.txt first (missing: {", ".join(sorted(missing))})')
+        return 1
+    if skipped:
+        # Modules app.main does not load (e.g. drive_service) may need extra packages
+        print(f'\n⚠️  Skipped {", ".join(skipped)} (missing: {", ".join(sorted(missing))})')
+    print(f'\n✅ {len(names) - len(skipped)} modules import, including app.main')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Explain every query shape in app/query_shapes.py against a local mongod
+
+Builds the index set from app/db.py in a scratch database, seeds a few
+documents, runs `explain` for each shape and exits with status 1 when a hot
+shape is planned as a COLLSCAN.
+
+    MONGO_URI=mongodb://localhost:27017 python test_query_shapes.py
+"""
+
+import asyncio
+import random
+import sys
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.config import TREND_DB_NAME
+from app.db import client, ensure_indexes, channels, logs, videos
+from app.query_shapes import explain_shape, shapes
+
+SCRATCH_DB = f'{TREND_DB_NAME}_query_shapes'
+
+
+async def seed(database):
+    now = datetime.utcnow()
+    statuses = ['pending', 'pending', 'done', 'failed', 'downloading']
+    platforms = ['youtube', 'douyin', 'pexels', 'kuaishou', 'dailyhaha']
+    await database[videos.name].insert_many([
+        {
+            'platform': random.choice(platforms),
+            'videoId': f'vid{i:08d}',
+            'title': f'video {i}',
+            'views': random.randint(0, 5_000_000),
+            'topics': [random.choice(['funny', 'dance', 'cooking'])],
+            'downloadStatus': random.choice(statuses),
+            'queueState': random.choice(['pending', 'queued', 'done', 'failed']),
+            'discoveredAt': now - timedelta(hours=i),
+            'searchKeys': ['video', str(i)],
+        }
+        for i in range(500)
+    ])
+    await database[channels.name].insert_many([
+        {'platform': 'youtube', 'channelId': f'UC{i}', 'name': f'channel {i}', 'isActive': i % 3 != 0,
+         'priority': i % 10, 'updatedAt': now, 'searchKeys': ['channel', str(i)]}
+        for i in range(100)
+    ])
+    await database[logs.name].insert_many([
+        {'_id': ObjectId(), 'jobType': random.choice(['download', 'discover', 'captcha']), 'status': 'success',
+         'ranAt': now - timedelta(minutes=i)}
+        for i in range(300)
+    ])
+
+
+async def main() -> int:
+    print('\n' + '═' * 80)
+    print(f'🔎 EXPLAIN QUERY SHAPES ({SCRATCH_DB})')
+    print('═' * 80)
+
+    await client.drop_database(SCRATCH_DB)
+    database = client[SCRATCH_DB]
+    failures = []
+    try:
+        await ensure_indexes(database)
+        await seed(database)
+        for shape in shapes():
+            result = await explain_shape(database, shape)
+            if result['collscan']:
+                mark = '❌' if result['hot'] else '⚠️ '
+                if result['hot']:
+                    failures.append(result['name'])
+            else:
+                mark = '✅'
+            sort_note = ' (in-memory sort)' if result['blockingSort'] else ''
+            print(f"{mark} {result['name']:<36} {'/'.join(result['stages'])}{sort_note}  {', '.join(result['indexes'])}")
+    finally:
+        await client.drop_database(SCRATCH_DB)
+        await client.close()
+
+    if failures:
+        print(f'\n❌ Hot query shapes without an index: {", ".join(failures)}')
+        return 1
+    print('\n✅ Every hot query shape uses an index')
+    return 0
+
+
+if __name__ == '__main__':
+    try:
+        sys.exit(asyncio.run(main()))
+    except KeyboardInterrupt:
+        print('\n\n👋 Stopped')